@@ -0,0 +1,167 @@
+"""
+Compare decoding a page of Danbooru posts with json.loads against the typed msgspec decoders.
+
+Run from the repository root with `python -m benchmarks.danbooru_decode`.
+"""
+
+from __future__ import annotations
+
+import gc
+import json
+import sys
+import timeit
+import tracemalloc
+from dataclasses import dataclass
+from typing import Any
+
+from extensions.animanga.danbooru import POSTS_DECODER
+from utilities.types import WaifuResult
+
+PAGE_SIZE = 200
+RUNS = 200
+
+
+@dataclass
+class DictWaifuResult:
+    # WaifuResult as it was before, without slots
+    image_id: str | int
+    url: str
+    characters: str
+    copyright: str
+    name: str | None = None
+    source: str | None = None
+    rating: str | None = None
+    preview_url: str | None = None
+    stale: bool = False
+
+
+def make_post(post_id: int) -> dict[str, Any]:
+    # Shaped like a real /posts.json entry, which carries far more than we use
+    md5 = f'{post_id:032x}'
+    return {
+        'id': post_id,
+        'created_at': '2024-05-01T12:00:00.000-04:00',
+        'uploader_id': 123456,
+        'score': 42,
+        'source': f'https://www.pixiv.net/artworks/{post_id * 7}',
+        'md5': md5,
+        'last_comment_bumped_at': None,
+        'rating': 'g',
+        'image_width': 2480,
+        'image_height': 3508,
+        'tag_string': 'solo 1girl long_hair blue_eyes smile looking_at_viewer hatsune_miku vocaloid ' * 3,
+        'fav_count': 120,
+        'file_ext': 'jpg',
+        'last_noted_at': None,
+        'parent_id': None,
+        'has_children': False,
+        'approver_id': None,
+        'tag_count_general': 30,
+        'tag_count_artist': 1,
+        'tag_count_character': 1,
+        'tag_count_copyright': 1,
+        'file_size': 1843200,
+        'up_score': 45,
+        'down_score': -3,
+        'is_pending': False,
+        'is_flagged': False,
+        'is_deleted': False,
+        'tag_count': 33,
+        'updated_at': '2024-05-02T08:30:00.000-04:00',
+        'is_banned': False,
+        'pixiv_id': post_id * 7,
+        'last_commented_at': None,
+        'has_active_children': False,
+        'bit_flags': 0,
+        'tag_count_meta': 2,
+        'has_large': True,
+        'has_visible_children': False,
+        'media_asset': {
+            'id': post_id + 1000,
+            'created_at': '2024-05-01T12:00:00.000-04:00',
+            'updated_at': '2024-05-01T12:00:00.000-04:00',
+            'md5': md5,
+            'file_ext': 'jpg',
+            'file_size': 1843200,
+            'image_width': 2480,
+            'image_height': 3508,
+            'duration': None,
+            'status': 'active',
+            'file_key': 'abcdefghi',
+            'is_public': True,
+            'pixel_hash': md5,
+            'variants': [
+                {
+                    'type': size,
+                    'url': f'https://cdn.donmai.us/{size}/{md5[:2]}/{md5[2:4]}/{md5}.jpg',
+                    'width': 180,
+                    'height': 255,
+                    'file_ext': 'jpg',
+                }
+                for size in ('180x180', '360x360', '720x720', 'sample', 'original')
+            ],
+        },
+        'tag_string_general': 'solo 1girl long_hair blue_eyes smile looking_at_viewer ' * 3,
+        'tag_string_character': 'hatsune_miku',
+        'tag_string_copyright': 'vocaloid',
+        'tag_string_artist': 'some_artist',
+        'tag_string_meta': 'highres absurdres',
+        'file_url': f'https://cdn.donmai.us/original/{md5[:2]}/{md5[2:4]}/{md5}.jpg',
+        'large_file_url': f'https://cdn.donmai.us/sample/{md5[:2]}/{md5[2:4]}/sample-{md5}.jpg',
+        'preview_file_url': f'https://cdn.donmai.us/180x180/{md5[:2]}/{md5[2:4]}/{md5}.jpg',
+    }
+
+
+def decode_dicts(body: bytes) -> list[DictWaifuResult]:
+    return [
+        DictWaifuResult(
+            image_id=entry['id'],
+            url=entry['file_url'],
+            source=entry['source'],
+            characters=entry['tag_string_character'],
+            copyright=entry['tag_string_copyright'],
+            rating=entry['rating'],
+            preview_url=entry.get('preview_file_url'),
+        )
+        for entry in json.loads(body)
+        if entry.get('file_url')
+    ]
+
+
+def decode_typed(body: bytes) -> list[WaifuResult]:
+    return [WaifuResult.from_post(post) for post in POSTS_DECODER.decode(body) if post.file_url]
+
+
+def measure_memory(func: Any, body: bytes) -> tuple[int, int]:  # ruff: ignore[any-type]
+    gc.collect()
+    tracemalloc.start()
+    results = func(body)
+    retained, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del results
+    return peak, retained
+
+
+def main() -> None:
+    body = json.dumps([make_post(7_000_000 + i) for i in range(PAGE_SIZE)]).encode()
+    print(f'Page of {PAGE_SIZE} posts, {len(body) / 1024:.0f} KiB')  # ruff: ignore[print]
+
+    for name, func in (('json.loads + dicts', decode_dicts), ('msgspec structs', decode_typed)):
+        seconds = min(timeit.repeat(lambda func=func: func(body), number=RUNS, repeat=5)) / RUNS
+        peak, retained = measure_memory(func, body)
+        sample = func(body)[0]
+        size = sys.getsizeof(sample)
+        if hasattr(sample, '__dict__'):
+            size += sys.getsizeof(sample.__dict__)
+        columns = [
+            f'{name:<20}',
+            f'{seconds * 1000:7.3f} ms/page',
+            f'peak {peak / 1024:5.0f} KiB',
+            f'retained {retained / PAGE_SIZE:4.0f} B/post',
+            f'object {size} B',
+        ]
+        print('  '.join(columns))  # ruff: ignore[print]
+
+
+if __name__ == '__main__':
+    main()
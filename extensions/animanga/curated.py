@@ -0,0 +1,224 @@
+from __future__ import annotations
+
+import operator
+import random
+from dataclasses import dataclass
+from typing import TYPE_CHECKING
+
+from utilities.imaging import HASH_BITS, hamming, to_unsigned
+
+if TYPE_CHECKING:
+    from collections.abc import Iterable
+
+    from asyncpg import Record
+
+
+__all__ = (
+    'CuratedEntry',
+    'CuratedIndex',
+    'HashIndex',
+)
+
+
+@dataclass(slots=True)
+class CuratedEntry:
+    file_url: str
+    added_by: int
+    nsfw: bool
+    dhash: int | None = None
+
+
+class HashIndex:
+    """
+    A multi-index hash table for finding perceptual hashes within a small Hamming distance.
+
+    Every hash is split into `chunks` equal substrings, each with its own table. Two hashes which differ
+    in fewer bits than there are chunks must share at least one chunk exactly, so a search only compares
+    against the hashes in the matching buckets instead of every hash.
+    """
+
+    def __init__(self, *, chunks: int = 8) -> None:
+        self.chunks = chunks
+        self._width = HASH_BITS // chunks
+        self._mask = (1 << self._width) - 1
+
+        self._tables: list[dict[int, set[str]]] = [{} for _ in range(chunks)]
+        self._hashes: dict[str, int] = {}
+
+        super().__init__()
+
+    def __len__(self) -> int:
+        return len(self._hashes)
+
+    def _split(self, value: int) -> list[int]:
+        return [(value >> (i * self._width)) & self._mask for i in range(self.chunks)]
+
+    def add(self, key: str, value: int) -> None:
+        self.remove(key)
+        self._hashes[key] = value
+        for table, chunk in zip(self._tables, self._split(value), strict=True):
+            table.setdefault(chunk, set()).add(key)
+
+    def remove(self, key: str) -> None:
+        value = self._hashes.pop(key, None)
+        if value is None:
+            return
+
+        for table, chunk in zip(self._tables, self._split(value), strict=True):
+            bucket = table[chunk]
+            bucket.discard(key)
+            if not bucket:
+                del table[chunk]
+
+    def search(self, value: int, *, distance: int) -> list[tuple[str, int]]:
+        """
+        Find the hashes within a Hamming distance of a hash.
+
+        Parameters
+        ----------
+        value : int
+            The hash to search for
+        distance : int
+            The maximum Hamming distance, which has to be less than the number of chunks
+
+        Returns
+        -------
+        list[tuple[str, int]]
+            The keys and distances of the matching hashes, closest first
+
+        Raises
+        ------
+        ValueError
+            Raised when the distance is too large for the search to be exact
+
+        """
+        if distance >= self.chunks:
+            msg = f'Distance must be less than {self.chunks}'
+            raise ValueError(msg)
+
+        candidates: set[str] = set()
+        for table, chunk in zip(self._tables, self._split(value), strict=True):
+            candidates.update(table.get(chunk, ()))
+
+        matches = [(key, hamming(value, self._hashes[key])) for key in candidates]
+        return sorted((match for match in matches if match[1] <= distance), key=operator.itemgetter(1))
+
+
+class CuratedIndex:
+    """
+    An in-memory index of the WaifuAPIEntries table for picking random images.
+
+    Entries are kept in one array per rating with a mapping of URLs to their position, so picking,
+    adding and removing entries are all O(1). Removing swaps the entry with the last one of its array.
+    The perceptual hashes of the images are kept in a HashIndex to catch duplicate submissions.
+    """
+
+    def __init__(self) -> None:
+        self._entries: dict[bool, list[CuratedEntry]] = {False: [], True: []}
+        self._positions: dict[str, tuple[bool, int]] = {}
+        self._hashes = HashIndex()
+
+        super().__init__()
+
+    def __len__(self) -> int:
+        return len(self._positions)
+
+    def __contains__(self, file_url: str) -> bool:
+        return file_url in self._positions
+
+    def count(self, *, nsfw: bool) -> int:
+        return len(self._entries[nsfw])
+
+    def load(self, records: Iterable[Record]) -> None:
+        """
+        Replace the contents of the index.
+
+        Parameters
+        ----------
+        records : Iterable[Record]
+            The rows of WaifuAPIEntries
+
+        """
+        self._entries = {False: [], True: []}
+        self._positions = {}
+        self._hashes = HashIndex()
+        for record in records:
+            dhash = record['dhash']
+            self.add(
+                CuratedEntry(
+                    file_url=record['file_url'],
+                    added_by=record['added_by'],
+                    nsfw=record['nsfw'],
+                    dhash=to_unsigned(dhash) if dhash is not None else None,
+                )
+            )
+
+    def add(self, entry: CuratedEntry) -> None:
+        if entry.file_url in self._positions:
+            self.remove(entry.file_url)
+
+        entries = self._entries[entry.nsfw]
+        self._positions[entry.file_url] = (entry.nsfw, len(entries))
+        entries.append(entry)
+        if entry.dhash is not None:
+            self._hashes.add(entry.file_url, entry.dhash)
+
+    def set_hash(self, file_url: str, dhash: int) -> None:
+        location = self._positions.get(file_url)
+        if location is None:
+            return
+
+        nsfw, position = location
+        self._entries[nsfw][position].dhash = dhash
+        self._hashes.add(file_url, dhash)
+
+    def unhashed(self) -> list[CuratedEntry]:
+        return [entry for entries in self._entries.values() for entry in entries if entry.dhash is None]
+
+    def find_duplicate(self, dhash: int, *, distance: int, exclude: str | None = None) -> CuratedEntry | None:
+        """
+        Find the closest entry whose image looks the same as another image.
+
+        Parameters
+        ----------
+        dhash : int
+            The perceptual hash of the image
+        distance : int
+            The maximum Hamming distance for images to count as the same
+        exclude : str | None, optional
+            An URL to ignore, by default None
+
+        Returns
+        -------
+        CuratedEntry | None
+            The closest entry, if any
+
+        """
+        for file_url, _ in self._hashes.search(dhash, distance=distance):
+            if file_url != exclude:
+                nsfw, position = self._positions[file_url]
+                return self._entries[nsfw][position]
+        return None
+
+    def remove(self, file_url: str) -> CuratedEntry | None:
+        location = self._positions.pop(file_url, None)
+        if location is None:
+            return None
+
+        nsfw, position = location
+        entries = self._entries[nsfw]
+        entry = entries[position]
+        self._hashes.remove(file_url)
+
+        last = entries.pop()
+        if last is not entry:
+            entries[position] = last
+            self._positions[last.file_url] = (nsfw, position)
+
+        return entry
+
+    def random(self, *, nsfw: bool) -> CuratedEntry | None:
+        entries = self._entries[nsfw]
+        if not entries:
+            return None
+        return entries[random.randrange(len(entries))]  # ruff: ignore[suspicious-non-cryptographic-random-usage]
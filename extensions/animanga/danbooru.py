@@ -0,0 +1,548 @@
+from __future__ import annotations
+
+import asyncio
+import dataclasses
+import datetime as dt
+import itertools
+import json
+import logging
+import random
+import time
+from pathlib import Path
+from typing import TYPE_CHECKING, Any
+from urllib.parse import urlencode
+
+import aiohttp
+import msgspec
+from cachetools import LRUCache
+
+from utilities.circuit import CircuitBreaker, CircuitState
+from utilities.errors import CircuitOpenError, WaifuNotFoundError
+from utilities.functions import fmt_str
+from utilities.http_cache import HTTPCache
+from utilities.ratelimit import TokenBucket
+from utilities.types import DanbooruPost, DanbooruTag, WaifuResult
+
+if TYPE_CHECKING:
+    from collections.abc import Iterable
+
+    from utilities.bases.bot import Cyrene
+    from utilities.http_cache import CachedResponse
+
+
+__all__ = ('DanbooruClient',)
+
+log = logging.getLogger(__name__)
+
+BASE_URL = 'https://danbooru.donmai.us'
+SAFE_BASE_URL = 'https://safebooru.donmai.us'
+
+TAG_ALLOWED_TYPES = [1, 3, 4]
+
+POST_CACHE_SIZE = 4096
+POST_CACHE_TTL = 60 * 60 * 6  # Post metadata barely changes, 6 hours is plenty
+POST_STORE_TTL = dt.timedelta(days=30)  # How long rows in DanbooruPosts are trusted without refetching
+AUTOCOMPLETE_TTL = 60 * 60 * 24
+BATCH_SIZE = 100  # Upper bound of ids we put in a single `id:a,b,c` search
+
+# Far below the session's timeout so a struggling Danbooru trips the circuit breaker quickly
+REQUEST_TIMEOUT = aiohttp.ClientTimeout(total=10)
+
+HTTP_CACHE_PATH = Path('.cache/danbooru.sqlite3')
+HTTP_CACHE_SIZE = 64 * 1024 * 1024
+
+# Well under Danbooru's own limit, background work only uses what is left above the reserve
+REQUEST_RATE = 5
+REQUEST_BURST = 10
+BACKGROUND_RESERVE = 5
+FAVOURITES_PAGE_SIZE = 200
+
+# Decoding straight from the response bytes skips building dicts of every field Danbooru sends
+POST_DECODER = msgspec.json.Decoder(DanbooruPost | list[DanbooruPost])  # Random searches without results give []
+POSTS_DECODER = msgspec.json.Decoder(list[DanbooruPost])
+TAGS_DECODER = msgspec.json.Decoder(list[DanbooruTag])
+
+SFW_RATINGS = ('g',)
+NSFW_RATINGS = ('s', 'q', 'e')
+
+
+class DanbooruClient:
+    """
+    A small wrapper around the Danbooru API.
+
+    Post metadata is kept in a LRU cache shared by every view and paginator so that
+    revisiting a post never costs another request. Every post seen is also stored in
+    the DanbooruPosts table which outlives the cache and allows searching favourites.
+
+    Requests go through a circuit breaker. While Danbooru is down, posts are served from the
+    cache and the database regardless of their age and are marked as stale.
+
+    Responses which are safe to reuse are also kept on disk and revalidated with conditional requests,
+    so restarts and reloads do not refetch everything.
+
+    Every request takes a token from a shared budget. Background requests leave a reserve of tokens
+    for interactive ones, so bulk work never makes commands wait.
+    """
+
+    def __init__(self, bot: Cyrene) -> None:
+        self.bot = bot
+
+        self._posts: LRUCache[int, tuple[float, WaifuResult]] = LRUCache(maxsize=POST_CACHE_SIZE)
+        self._prefetching: set[int] = set()
+        self._tasks: set[asyncio.Task[Any]] = set()
+
+        self.breaker = CircuitBreaker('Danbooru', failures=(aiohttp.ClientError, TimeoutError))
+        self.http_cache = HTTPCache(HTTP_CACHE_PATH, max_size=HTTP_CACHE_SIZE)
+        self.budget = TokenBucket(REQUEST_RATE, REQUEST_BURST)
+
+        super().__init__()
+
+    @property
+    def available(self) -> bool:
+        """
+        Whether requests to Danbooru are currently let through.
+
+        Returns
+        -------
+        bool
+            If the circuit breaker is not open
+
+        """
+        return self.breaker.state is not CircuitState.OPEN
+
+    async def _get[T](
+        self,
+        path: str,
+        *,
+        decoder: msgspec.json.Decoder[T],
+        params: dict[str, Any] | None = None,
+        base: str = BASE_URL,
+        coalesce: bool = True,
+        max_age: float | None = None,
+        background: bool = False,
+    ) -> T:
+        if coalesce is False:
+            # Waiting for the budget happens outside of the breaker so it never counts as latency
+            await self.budget.acquire(reserve=BACKGROUND_RESERVE if background else 0)
+            return await self.breaker.call(lambda: self._request(base + path, params, decoder=decoder))
+
+        key = ('danbooru' + path, base, tuple(sorted((params or {}).items())))
+        return await self.bot.singleflight.do(
+            key, lambda: self._cached_request(base + path, params, decoder=decoder, max_age=max_age)
+        )
+
+    async def _cached_request[T](
+        self,
+        url: str,
+        params: dict[str, Any] | None,
+        *,
+        decoder: msgspec.json.Decoder[T],
+        max_age: float | None,
+    ) -> T:
+        if max_age is None:
+            await self.budget.acquire()
+            return await self.breaker.call(lambda: self._request(url, params, decoder=decoder))
+
+        cache_key = url + '?' + urlencode(sorted((params or {}).items()))
+        cached = await self.http_cache.get(cache_key)
+        if cached and cached.age < max_age:
+            try:
+                return decoder.decode(cached.body)
+            except msgspec.MsgspecError as error:
+                # Stored before a change to the structs or to Danbooru's responses, it is fetched again
+                log.warning('Evicted an undecodable cached response for %s: %s', cache_key, error)
+                await self.http_cache.delete(cache_key)
+                cached = None
+
+        await self.budget.acquire()
+        return await self.breaker.call(
+            lambda: self._request(url, params, decoder=decoder, cache_key=cache_key, cached=cached)
+        )
+
+    async def _request[T](
+        self,
+        url: str,
+        params: dict[str, Any] | None,
+        *,
+        decoder: msgspec.json.Decoder[T],
+        cache_key: str | None = None,
+        cached: CachedResponse | None = None,
+    ) -> T:
+        headers = cached.validators() if cached else None
+        async with self.bot.session.get(url, params=params, headers=headers, timeout=REQUEST_TIMEOUT) as resp:
+            too_many_requests = 429
+            server_error = 500
+            if resp.status == too_many_requests or resp.status >= server_error:
+                # These count towards the circuit breaker, unlike a search which had no results
+                resp.raise_for_status()
+
+            not_modified = 304
+            if cache_key and cached and resp.status == not_modified:
+                try:
+                    data = decoder.decode(cached.body)
+                except msgspec.MsgspecError as error:
+                    log.warning('Evicted an undecodable cached response for %s: %s', cache_key, error)
+                    await self.http_cache.delete(cache_key)
+                else:
+                    await self.http_cache.touch(cache_key)
+                    return data
+
+            body = await resp.read()
+
+        if cache_key and cached and resp.status == not_modified:
+            # The cached body could not be decoded, so it is requested again without validators
+            return await self._request(url, params, decoder=decoder, cache_key=cache_key)
+
+        success = 200
+        if resp.status != success:
+            # Error pages from Danbooru or Cloudflare are not always JSON
+            try:
+                error = json.loads(body)
+            except ValueError:
+                error = {}
+            raise WaifuNotFoundError(json=error)
+
+        try:
+            data = decoder.decode(body)
+        except msgspec.MsgspecError as error:
+            # An HTML page served with a 200, or a field which changed type
+            log.warning('Could not decode the response from %s: %s', url, error)
+            raise WaifuNotFoundError from error
+
+        if cache_key:
+            await self.http_cache.put(
+                cache_key,
+                body,
+                etag=resp.headers.get('ETag'),
+                last_modified=resp.headers.get('Last-Modified'),
+            )
+
+        return data
+
+    def get_cached(self, post_id: int, *, allow_stale: bool = False) -> WaifuResult | None:
+        """
+        Get a post from the cache if it has not expired.
+
+        Parameters
+        ----------
+        post_id : int
+            The ID of the post
+        allow_stale : bool, optional
+            Whether an expired post should be returned, marked as stale, by default False
+
+        Returns
+        -------
+        WaifuResult | None
+            The cached post, if any
+
+        """
+        entry = self._posts.get(post_id)
+        if entry is None:
+            return None
+        if time.monotonic() - entry[0] > POST_CACHE_TTL:
+            return dataclasses.replace(entry[1], stale=True) if allow_stale else None
+        return entry[1]
+
+    def cache(self, posts: Iterable[WaifuResult]) -> None:
+        now = time.monotonic()
+        for post in posts:
+            self._posts[int(post.image_id)] = (now, post)
+
+    async def store(self, posts: list[WaifuResult]) -> None:
+        """
+        Store post metadata in the database.
+
+        Parameters
+        ----------
+        posts : list[WaifuResult]
+            The posts to be stored
+
+        """
+        if not posts:
+            return
+
+        now = dt.datetime.now()
+        await self.bot.pool.executemany(
+            """
+                INSERT INTO
+                    DanbooruPosts (id, file_url, characters, copyright, rating, source, preview_url, fetched_at)
+                VALUES
+                    ($1, $2, $3, $4, $5, $6, $7, $8)
+                ON CONFLICT (id) DO
+                UPDATE
+                SET
+                    file_url = EXCLUDED.file_url,
+                    characters = EXCLUDED.characters,
+                    copyright = EXCLUDED.copyright,
+                    rating = EXCLUDED.rating,
+                    source = EXCLUDED.source,
+                    preview_url = EXCLUDED.preview_url,
+                    fetched_at = EXCLUDED.fetched_at
+            """,
+            [
+                (
+                    int(post.image_id),
+                    post.url,
+                    post.characters.split(),
+                    post.copyright.split(),
+                    post.rating,
+                    post.source,
+                    post.preview_url,
+                    now,
+                )
+                for post in posts
+            ],
+        )
+
+    async def autocomplete(self, query: str) -> list[tuple[str, str]]:
+        """
+        Get character, copyright and general tags matching the query.
+
+        Parameters
+        ----------
+        query : str
+            The query being searched
+
+        Returns
+        -------
+        list[tuple[str, str]]
+            A list of the label and value of each tag
+
+        Raises
+        ------
+        WaifuNotFoundError
+            Raised when there are no tags matching the query
+
+        """
+        try:
+            data = await self._get(
+                '/autocomplete.json',
+                params={
+                    'search[query]': query,
+                    'search[type]': 'tag_query',
+                },
+                decoder=TAGS_DECODER,
+                base=SAFE_BASE_URL,
+                max_age=AUTOCOMPLETE_TTL,
+            )
+        except WaifuNotFoundError:
+            raise WaifuNotFoundError(query) from None
+
+        characters = [(tag.label, tag.value) for tag in data if tag.type == 'tag-word' and tag.category in TAG_ALLOWED_TYPES]
+        if not characters:
+            raise WaifuNotFoundError(query)
+        return characters
+
+    async def random_post(self, query: str | None, *, nsfw: bool) -> WaifuResult:
+        """
+        Get a random solo post of the query.
+
+        While Danbooru is unavailable, a matching post from the cache is returned instead.
+
+        Parameters
+        ----------
+        query : str | None
+            The tag to search for, defaults to 1girl
+        nsfw : bool
+            Whether the post should be NSFW
+
+        Returns
+        -------
+        WaifuResult
+            The post found
+
+        Raises
+        ------
+        WaifuNotFoundError
+            Raised when there are no results for the query
+        CircuitOpenError
+            Raised when Danbooru is unavailable and no cached post matches the query
+
+        """
+        rating = fmt_str(['explicit', 'questionable', 'sensitive'], seperator=',') if nsfw is True else 'general'
+        tags = fmt_str(['solo', query or '1girl', 'rating:' + rating], seperator=' ')
+
+        try:
+            # Identical searches should still give different posts, so these are never coalesced
+            data = await self._get('/posts/random.json', decoder=POST_DECODER, params={'tags': tags}, coalesce=False)
+        except CircuitOpenError:
+            if post := self._random_cached(query, nsfw=nsfw):
+                return post
+            raise
+
+        if isinstance(data, list) or not data.file_url:
+            raise WaifuNotFoundError(query)
+
+        post = WaifuResult.from_post(data, name=query)
+        self.cache([post])
+        await self.store([post])
+        return post
+
+    def _random_cached(self, query: str | None, *, nsfw: bool) -> WaifuResult | None:
+        ratings = NSFW_RATINGS if nsfw is True else SFW_RATINGS
+        candidates = [
+            post
+            for _, post in self._posts.values()
+            if post.rating in ratings
+            and (query is None or query in post.characters.split() or query in post.copyright.split())
+        ]
+        if not candidates:
+            return None
+        return dataclasses.replace(random.choice(candidates), name=query, stale=True)  # ruff: ignore[suspicious-non-cryptographic-random-usage]
+
+    async def fetch_post(self, post_id: int) -> WaifuResult | None:
+        """
+        Get a single post, preferring the cache.
+
+        Parameters
+        ----------
+        post_id : int
+            The ID of the post
+
+        Returns
+        -------
+        WaifuResult | None
+            The post, or None if it no longer exists on Danbooru
+
+        """
+        if post := self.get_cached(post_id):
+            return post
+        posts = await self.fetch_posts([post_id])
+        return posts.get(post_id)
+
+    async def fetch_posts(self, post_ids: Iterable[int]) -> dict[int, WaifuResult]:
+        """
+        Get multiple posts with as few requests as possible.
+
+        Cached posts are returned as is, then the database is checked and only then the rest are
+        fetched in batches with a single `id:a,b,c` search each. While Danbooru is unavailable,
+        expired posts from the cache and database are returned instead, marked as stale.
+
+        Parameters
+        ----------
+        post_ids : Iterable[int]
+            The IDs of the posts
+
+        Returns
+        -------
+        dict[int, WaifuResult]
+            A mapping of post IDs to their posts. Posts which no longer exist are left out.
+
+        """
+        results: dict[int, WaifuResult] = {}
+        missing: list[int] = []
+
+        for post_id in dict.fromkeys(post_ids):
+            if post := self.get_cached(post_id):
+                results[post_id] = post
+            else:
+                missing.append(post_id)
+
+        if missing:
+            records = await self.bot.pool.fetch(
+                """SELECT * FROM DanbooruPosts WHERE id = ANY($1::BIGINT[]) AND fetched_at > $2""",
+                missing,
+                dt.datetime.now() - POST_STORE_TTL,
+            )
+            stored = [WaifuResult.from_record(record) for record in records]
+            self.cache(stored)
+            results.update({int(post.image_id): post for post in stored})
+            missing = [_ for _ in missing if _ not in results]
+
+        for batch in itertools.batched(missing, BATCH_SIZE):
+            try:
+                data = await self._get(
+                    '/posts.json',
+                    decoder=POSTS_DECODER,
+                    params={'tags': 'id:' + ','.join(map(str, batch)), 'limit': len(batch)},
+                    max_age=POST_CACHE_TTL,
+                )
+            except CircuitOpenError:
+                results.update(await self._fetch_stale(missing))
+                break
+            # Posts which are restricted for anonymous users come without a file_url
+            posts = [WaifuResult.from_post(entry) for entry in data if entry.file_url]
+            self.cache(posts)
+            await self.store(posts)
+            results.update({int(post.image_id): post for post in posts})
+
+        return results
+
+    async def favourites_page(self, user: str, before: int | None = None) -> tuple[list[WaifuResult], int | None]:
+        """
+        Get a page of a Danbooru user's public favourites, newest posts first.
+
+        Pages are keyed on the post id rather than numbered, so favourites removed between two
+        pages do not shift the later ones. This is meant for bulk work, so it only uses the
+        background part of the budget.
+
+        Parameters
+        ----------
+        user : str
+            The name of the Danbooru user
+        before : int | None
+            Only get posts with an id below this one, from the start if not given
+
+        Returns
+        -------
+        tuple[list[WaifuResult], int | None]
+            The posts on the page, and the id to get the next page before, if there is one
+
+        """
+        params: dict[str, str | int] = {'tags': f'fav:{user}', 'limit': FAVOURITES_PAGE_SIZE}
+        if before is not None:
+            params['page'] = f'b{before}'
+
+        data = await self._get('/posts.json', decoder=POSTS_DECODER, params=params, coalesce=False, background=True)
+        posts = [WaifuResult.from_post(entry) for entry in data if entry.file_url]
+        self.cache(posts)
+        await self.store(posts)
+        # Posts without a file still count towards the page, the next one starts below all of them
+        cursor = min(entry.id for entry in data) if len(data) >= FAVOURITES_PAGE_SIZE else None
+        return posts, cursor
+
+    async def _fetch_stale(self, post_ids: list[int]) -> dict[int, WaifuResult]:
+        results: dict[int, WaifuResult] = {}
+        for post_id in post_ids:
+            if post := self.get_cached(post_id, allow_stale=True):
+                results[post_id] = post
+
+        if missing := [_ for _ in post_ids if _ not in results]:
+            records = await self.bot.pool.fetch(
+                """SELECT * FROM DanbooruPosts WHERE id = ANY($1::BIGINT[])""",
+                missing,
+            )
+            results.update({record['id']: WaifuResult.from_record(record, stale=True) for record in records})
+
+        return results
+
+    def prefetch(self, post_ids: Iterable[int]) -> None:
+        """
+        Fetch posts in the background so they are cached by the time they are needed.
+
+        Parameters
+        ----------
+        post_ids : Iterable[int]
+            The IDs of the posts
+
+        """
+        missing = [_ for _ in dict.fromkeys(post_ids) if _ not in self._prefetching and self.get_cached(_) is None]
+        if not missing or not self.available:
+            return
+
+        self._prefetching.update(missing)
+        task = asyncio.create_task(self.fetch_posts(missing))
+        self._tasks.add(task)
+        task.add_done_callback(lambda t: self._prefetch_done(t, missing))
+
+    def _prefetch_done(self, task: asyncio.Task[dict[int, WaifuResult]], post_ids: list[int]) -> None:
+        self._tasks.discard(task)
+        self._prefetching.difference_update(post_ids)
+
+        if not task.cancelled() and (exc := task.exception()):
+            log.warning('Failed to prefetch %s posts', len(post_ids), exc_info=exc)
+
+    def close(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        self.http_cache.close()
@@ -0,0 +1,233 @@
+from __future__ import annotations
+
+import asyncio
+import itertools
+import tempfile
+import zipfile
+from pathlib import PurePosixPath
+from typing import TYPE_CHECKING
+from urllib.parse import urlparse
+
+import aiohttp
+
+from utilities.imaging import ImageTooLargeError, download
+
+if TYPE_CHECKING:
+    from collections.abc import AsyncGenerator
+    from io import BufferedRandom
+
+    from utilities.bases.bot import Cyrene
+    from utilities.types import WaifuResult
+
+    from .danbooru import DanbooruClient
+
+
+__all__ = (
+    'FavouritesExport',
+    'ZipSplitter',
+)
+
+EXPORT_CONCURRENCY = 4
+EXPORT_BATCH_SIZE = 100
+# Room for the headers, central directory and end record around the files of an archive
+ARCHIVE_OVERHEAD = 64 * 1024
+LOCAL_HEADER_SIZE = 30
+CENTRAL_HEADER_SIZE = 46
+END_RECORD_SIZE = 22
+
+
+class ZipSplitter:
+    """
+    Writes files into zip archives on disk, starting a new archive before one would grow past `limit`.
+
+    Files are stored as is, since images are already compressed. The archives are temporary files, so
+    nothing but the file being written is held in memory.
+    """
+
+    def __init__(self, limit: int) -> None:
+        self.limit = limit
+
+        self._fp: BufferedRandom | None = None
+        self._archive: zipfile.ZipFile | None = None
+        self._directory_size = 0
+
+        super().__init__()
+
+    def _open(self) -> zipfile.ZipFile:
+        if self._archive is None:
+            self._fp = tempfile.TemporaryFile()  # ruff: ignore[open-file-with-context-handler]
+            self._archive = zipfile.ZipFile(self._fp, 'w', compression=zipfile.ZIP_STORED)
+            self._directory_size = 0
+        return self._archive
+
+    def add(self, name: str, data: bytes) -> BufferedRandom | None:
+        """
+        Add a file, finishing the current archive first if the file would not fit in it.
+
+        This does blocking I/O and is meant to be run in a thread.
+
+        Parameters
+        ----------
+        name : str
+            The name of the file in the archive
+        data : bytes
+            The file
+
+        Returns
+        -------
+        BufferedRandom | None
+            The archive which was finished, if any
+
+        """
+        finished: BufferedRandom | None = None
+        entry_size = LOCAL_HEADER_SIZE + CENTRAL_HEADER_SIZE + 2 * len(name.encode()) + len(data)
+
+        if self._fp is not None and self._archive is not None and self._archive.namelist():
+            projected = self._fp.tell() + self._directory_size + END_RECORD_SIZE + entry_size
+            if projected > self.limit:
+                finished = self.finish()
+
+        self._open().writestr(name, data)
+        self._directory_size += CENTRAL_HEADER_SIZE + len(name.encode())
+        return finished
+
+    def finish(self) -> BufferedRandom | None:
+        """
+        Finish the current archive.
+
+        Returns
+        -------
+        BufferedRandom | None
+            The archive rewound to the start, or None if there was nothing to finish
+
+        """
+        archive, fp = self._archive, self._fp
+        self._archive = self._fp = None
+        if archive is None or fp is None:
+            return None
+
+        archive.close()
+        fp.seek(0)
+        return fp
+
+    def close(self) -> None:
+        archive, fp = self._archive, self._fp
+        self._archive = self._fp = None
+        try:
+            if archive is not None:
+                archive.close()
+        finally:
+            # The temporary file is removed as soon as it is closed, even if the archive could not be
+            if fp is not None:
+                fp.close()
+
+
+class FavouritesExport:
+    """
+    Streams the images of favourites into zip archives no larger than `limit` bytes.
+
+    Metadata is fetched in batches while a bounded number of images are downloaded at once. Every
+    image holds a slot until it has been written to the archive, so at most a few images are held
+    in memory no matter how many favourites there are.
+    """
+
+    def __init__(self, bot: Cyrene, danbooru: DanbooruClient, post_ids: list[int], *, limit: int) -> None:
+        self.bot = bot
+        self.danbooru = danbooru
+        self.post_ids = post_ids
+        self.limit = limit
+
+        self.exported = 0
+        self.skipped = 0
+
+        super().__init__()
+
+    @property
+    def total(self) -> int:
+        """
+        The number of favourites being exported.
+
+        Returns
+        -------
+        int
+            The number of favourites
+
+        """
+        return len(self.post_ids)
+
+    @property
+    def processed(self) -> int:
+        """
+        The number of favourites which were exported or skipped so far.
+
+        Returns
+        -------
+        int
+            The number of favourites
+
+        """
+        return self.exported + self.skipped
+
+    async def _download(
+        self,
+        post: WaifuResult,
+        slots: asyncio.Semaphore,
+        queue: asyncio.Queue[tuple[str, bytes] | None],
+    ) -> None:
+        # A slot is held until the image has been written, which bounds both downloads and memory
+        await slots.acquire()
+        try:
+            data = await download(self.bot.session, post.url, limit=self.limit - ARCHIVE_OVERHEAD)
+        except (aiohttp.ClientError, TimeoutError, ImageTooLargeError):
+            self.skipped += 1
+            slots.release()
+            return
+
+        suffix = PurePosixPath(urlparse(post.url).path).suffix
+        queue.put_nowait((f'{post.image_id}{suffix}', data))
+
+    async def _download_all(self, slots: asyncio.Semaphore, queue: asyncio.Queue[tuple[str, bytes] | None]) -> None:
+        try:
+            for batch in itertools.batched(self.post_ids, EXPORT_BATCH_SIZE):
+                posts = await self.danbooru.fetch_posts(batch)
+                self.skipped += len(batch) - len(posts)
+
+                async with asyncio.TaskGroup() as group:
+                    for post in posts.values():
+                        group.create_task(self._download(post, slots, queue))
+        finally:
+            queue.put_nowait(None)
+
+    async def archives(self) -> AsyncGenerator[BufferedRandom]:
+        """
+        Export the favourites.
+
+        Yields
+        ------
+        BufferedRandom
+            Every finished archive, which the caller is responsible for closing. The generator
+            should be closed with `contextlib.aclosing` so stopping early cleans up right away
+
+        """
+        slots = asyncio.Semaphore(EXPORT_CONCURRENCY)
+        queue: asyncio.Queue[tuple[str, bytes] | None] = asyncio.Queue()
+        downloader = asyncio.create_task(self._download_all(slots, queue))
+        writer = ZipSplitter(self.limit)
+
+        try:
+            while (item := await queue.get()) is not None:
+                finished = await asyncio.to_thread(writer.add, *item)
+                slots.release()
+                self.exported += 1
+                if finished is not None:
+                    yield finished
+
+            if (finished := await asyncio.to_thread(writer.finish)) is not None:
+                yield finished
+
+            await downloader  # Surfaces any error from fetching the metadata
+        finally:
+            # Runs when the caller stops early too, as long as it closes the generator
+            downloader.cancel()
+            await asyncio.wait([downloader])
+            writer.close()
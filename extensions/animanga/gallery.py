@@ -0,0 +1,83 @@
+from __future__ import annotations
+
+import asyncio
+from typing import TYPE_CHECKING
+
+import aiohttp
+from cachetools import LRUCache
+
+from utilities.imaging import ImageTooLargeError, compose_grid
+
+if TYPE_CHECKING:
+    from utilities.bases.bot import Cyrene
+    from utilities.types import WaifuResult
+
+    from .danbooru import DanbooruClient
+
+
+__all__ = ('Gallery',)
+
+GRID_CACHE_SIZE = 128
+THUMBNAIL_CONCURRENCY = 8
+THUMBNAIL_LIMIT = 2 * 1024 * 1024
+TILE_SIZE = 180
+
+
+class Gallery:
+    """
+    Renders favourites into a collage of their thumbnails.
+
+    Thumbnails are downloaded concurrently through the bot's image cache, bounded by a semaphore
+    shared between every render, and composed in the bot's process pool. Rendered grids are cached
+    by the posts on them, so a grid is only rendered again once the favourites on it change.
+    """
+
+    def __init__(self, bot: Cyrene, danbooru: DanbooruClient) -> None:
+        self.bot = bot
+        self.danbooru = danbooru
+
+        self._grids: LRUCache[tuple[int, ...], bytes] = LRUCache(GRID_CACHE_SIZE)
+        self._semaphore = asyncio.Semaphore(THUMBNAIL_CONCURRENCY)
+
+        super().__init__()
+
+    async def _thumbnail(self, post: WaifuResult | None) -> bytes | None:
+        if post is None:
+            return None
+
+        async with self._semaphore:
+            try:
+                return await self.bot.image_cache.fetch(
+                    self.bot.session, post.preview_url or post.url, limit=THUMBNAIL_LIMIT
+                )
+            except (aiohttp.ClientError, TimeoutError, ImageTooLargeError):
+                return None
+
+    async def _render(self, post_ids: tuple[int, ...]) -> bytes:
+        posts = await self.danbooru.fetch_posts(post_ids)
+        thumbnails = await asyncio.gather(*(self._thumbnail(posts.get(post_id)) for post_id in post_ids))
+
+        tiles = [(f'#{post_id}', thumbnail) for post_id, thumbnail in zip(post_ids, thumbnails, strict=True)]
+        grid = await self.bot.run_in_process(compose_grid, tiles, TILE_SIZE)
+        self._grids[post_ids] = grid
+        return grid
+
+    async def render(self, post_ids: list[int]) -> bytes:
+        """
+        Render the posts into a grid.
+
+        Parameters
+        ----------
+        post_ids : list[int]
+            The IDs of the posts, in the order they are laid out
+
+        Returns
+        -------
+        bytes
+            The grid as a JPEG
+
+        """
+        key = tuple(post_ids)
+        if (grid := self._grids.get(key)) is not None:
+            return grid
+        return await self.bot.singleflight.do(('waifu-gallery', *key), lambda: self._render(key))
@@ -0,0 +1,157 @@
+from __future__ import annotations
+
+import datetime as dt
+from typing import TYPE_CHECKING
+
+from utilities.pagination import QueryPageSource
+
+from .danbooru import SFW_RATINGS
+
+if TYPE_CHECKING:
+    from utilities.bases.bot import Cyrene
+
+    from .danbooru import DanbooruClient
+
+
+__all__ = ('FavouritesImport',)
+
+
+class FavouritesImport:
+    """
+    Imports the public favourites of a Danbooru user into WaifuFavourites.
+
+    Every page is copied into a temporary table and merged with conflict handling, in the same
+    transaction that records the lowest post id of the page in FavouriteImports. A failed or
+    interrupted import picks up below that post when it is started again for the same Danbooru
+    user, so favourites removed upstream in the meantime do not make it skip any.
+    """
+
+    def __init__(self, bot: Cyrene, danbooru: DanbooruClient, user_id: int, danbooru_user: str) -> None:
+        self.bot = bot
+        self.danbooru = danbooru
+        self.user_id = user_id
+        self.danbooru_user = danbooru_user
+
+        self.last_id: int | None = None
+        self.imported = 0
+
+        super().__init__()
+
+    async def prepare(self) -> bool:
+        """
+        Load the progress of a previous import of the same Danbooru user, or start a new one.
+
+        Returns
+        -------
+        bool
+            Whether a previous import is being resumed
+
+        """
+        record = await self.bot.pool.fetchrow(
+            """
+                INSERT INTO
+                    FavouriteImports (user_id, danbooru_user, started_at)
+                VALUES
+                    ($1, $2, $3)
+                ON CONFLICT (user_id) DO
+                UPDATE
+                SET
+                    danbooru_user = EXCLUDED.danbooru_user,
+                    last_id = CASE
+                        WHEN FavouriteImports.danbooru_user = EXCLUDED.danbooru_user
+                        AND NOT FavouriteImports.finished THEN FavouriteImports.last_id
+                    END,
+                    imported = CASE
+                        WHEN FavouriteImports.danbooru_user = EXCLUDED.danbooru_user
+                        AND NOT FavouriteImports.finished THEN FavouriteImports.imported
+                        ELSE 0
+                    END,
+                    finished = FALSE,
+                    started_at = EXCLUDED.started_at
+                RETURNING
+                    last_id,
+                    imported
+            """,
+            self.user_id,
+            self.danbooru_user,
+            dt.datetime.now(),
+        )
+        if record is not None:
+            self.last_id = record['last_id']
+            self.imported = record['imported']
+        return self.last_id is not None
+
+    async def run(self) -> int:
+        """
+        Import every remaining page.
+
+        Returns
+        -------
+        int
+            The number of favourites imported by this and any previous run
+
+        """
+        while True:
+            posts, cursor = await self.danbooru.favourites_page(self.danbooru_user, self.last_id)
+            rows = [(int(post.image_id), post.rating not in SFW_RATINGS) for post in posts]
+            await self._merge(rows, cursor)
+            if cursor is None:
+                break
+
+        return self.imported
+
+    async def _merge(self, rows: list[tuple[int, bool]], cursor: int | None) -> None:
+        now = dt.datetime.now()
+        async with self.bot.pool.acquire() as conn, conn.transaction():
+            await conn.execute("""CREATE TEMPORARY TABLE FavouriteImportRows (id BIGINT, nsfw BOOLEAN) ON COMMIT DROP""")
+            await conn.copy_records_to_table('favouriteimportrows', records=rows, columns=('id', 'nsfw'))
+
+            await conn.execute(
+                """
+                    INSERT INTO
+                        Waifus (id, nsfw)
+                    SELECT
+                        id,
+                        nsfw
+                    FROM
+                        FavouriteImportRows
+                    ON CONFLICT (id) DO NOTHING
+                """
+            )
+            inserted = await conn.fetch(
+                """
+                    INSERT INTO
+                        WaifuFavourites (id, user_id, nsfw, tm)
+                    SELECT
+                        id,
+                        $1,
+                        nsfw,
+                        $2
+                    FROM
+                        FavouriteImportRows
+                    ON CONFLICT (id, user_id) DO NOTHING
+                    RETURNING
+                        id
+                """,
+                self.user_id,
+                now,
+            )
+            await conn.execute(
+                """
+                    UPDATE FavouriteImports
+                    SET
+                        last_id = $2,
+                        imported = imported + $3,
+                        finished = $2 IS NULL
+                    WHERE
+                        user_id = $1
+                """,
+                self.user_id,
+                cursor,
+                len(inserted),
+            )
+
+        if inserted:
+            QueryPageSource.invalidate('WaifuFavourites')
+        self.last_id = cursor
+        self.imported += len(inserted)
@@ -0,0 +1,237 @@
+from __future__ import annotations
+
+import enum
+import itertools
+from typing import TYPE_CHECKING
+
+from discord.ext import menus
+
+from utilities.embed import Embed
+from utilities.functions import fmt_str
+
+if TYPE_CHECKING:
+    from asyncpg import Pool, Record
+
+    from utilities.pagination import Paginator
+
+
+__all__ = (
+    'Board',
+    'Leaderboard',
+    'LeaderboardPageSource',
+    'TopK',
+)
+
+LEADERBOARD_SIZE = 100
+
+
+class Board(enum.Enum):
+    SMASHED = 'smashed'
+    PASSED = 'passed'
+    CONTROVERSIAL = 'controversial'
+
+    @property
+    def expression(self) -> str:
+        """
+        The SQL expression of the score of this board.
+
+        Returns
+        -------
+        str
+            The expression over the columns of Waifus
+
+        """
+        match self:
+            case Board.SMASHED:
+                return 'smashes'
+            case Board.PASSED:
+                return 'passes'
+            case Board.CONTROVERSIAL:
+                return 'LEAST(smashes, passes)'
+
+    @property
+    def unit(self) -> str:
+        """
+        What the score of this board counts.
+
+        Returns
+        -------
+        str
+            The unit of the score
+
+        """
+        match self:
+            case Board.SMASHED:
+                return 'smashes'
+            case Board.PASSED:
+                return 'passes'
+            case Board.CONTROVERSIAL:
+                return 'smashes and passes each'
+
+    def score(self, smashes: int, passes: int) -> int:
+        match self:
+            case Board.SMASHED:
+                return smashes
+            case Board.PASSED:
+                return passes
+            case Board.CONTROVERSIAL:
+                return min(smashes, passes)
+
+
+class TopK:
+    """
+    The `k` highest scoring keys, for scores which never decrease.
+
+    Since a score can only go up, a key outside of the top can only get in by beating the lowest score
+    in it, so every update is O(1) apart from finding a new lowest score after the top changes.
+    """
+
+    def __init__(self, k: int) -> None:
+        self.k = k
+
+        self._scores: dict[int, int] = {}
+        self._floor: tuple[int, int] | None = None
+        self._ranking: list[tuple[int, int]] | None = None
+
+        super().__init__()
+
+    def __len__(self) -> int:
+        return len(self._scores)
+
+    def __contains__(self, key: int) -> bool:
+        return key in self._scores
+
+    def _lowest(self) -> tuple[int, int]:
+        if self._floor is None:
+            self._floor = min((score, key) for key, score in self._scores.items())
+        return self._floor
+
+    def update(self, key: int, score: int) -> None:
+        """
+        Update the score of a key.
+
+        Parameters
+        ----------
+        key : int
+            The key
+        score : int
+            The new score of the key
+
+        """
+        current = self._scores.get(key)
+        if current is None:
+            if len(self._scores) >= self.k:
+                lowest_score, lowest_key = self._lowest()
+                if score <= lowest_score:
+                    return
+                del self._scores[lowest_key]
+            self._floor = None
+        elif score <= current:
+            return
+        elif self._floor is not None and self._floor[1] == key:
+            self._floor = None
+
+        self._scores[key] = score
+        self._ranking = None
+
+    def ranking(self) -> list[tuple[int, int]]:
+        """
+        Return the keys and their scores, highest first.
+
+        Returns
+        -------
+        list[tuple[int, int]]
+            The keys and scores
+
+        """
+        if self._ranking is None:
+            self._ranking = sorted(self._scores.items(), key=lambda item: (-item[1], item[0]))
+        return self._ranking
+
+
+class Leaderboard:
+    """
+    The top waifus of every board, kept up to date as votes come in.
+
+    Every vote carries the new totals of its post, so the boards are updated without touching the
+    database. `reconcile` reloads them from the Waifus table to pick up anything missed.
+    """
+
+    def __init__(self, *, size: int = LEADERBOARD_SIZE) -> None:
+        self.size = size
+        self._boards: dict[tuple[Board, bool], TopK] = {
+            (board, nsfw): TopK(size) for board, nsfw in itertools.product(Board, (False, True))
+        }
+
+        super().__init__()
+
+    def record(self, post_id: int, *, nsfw: bool, smashes: int, passes: int) -> None:
+        for board in Board:
+            score = board.score(smashes, passes)
+            if score:
+                self._boards[board, nsfw].update(post_id, score)
+
+    def top(self, board: Board, *, nsfw: bool) -> list[tuple[int, int]]:
+        return self._boards[board, nsfw].ranking()
+
+    async def reconcile(self, pool: Pool[Record]) -> None:
+        """
+        Reload every board from the Waifus table.
+
+        Votes which arrive while the table is being read are kept, since a score can only go up.
+
+        Parameters
+        ----------
+        pool : Pool[Record]
+            The pool to query with
+
+        """
+        for board, nsfw in itertools.product(Board, (False, True)):
+            # The expression indexes on Waifus make this an index scan of `size` rows
+            records = await pool.fetch(
+                f"""
+                    SELECT
+                        id,
+                        {board.expression} AS score
+                    FROM
+                        Waifus
+                    WHERE
+                        nsfw = $1
+                        AND {board.expression} > 0
+                    ORDER BY
+                        {board.expression} DESC
+                    LIMIT
+                        $2
+                """,
+                nsfw,
+                self.size,
+            )
+
+            fresh = TopK(self.size)
+            for record in records:
+                fresh.update(record['id'], record['score'])
+            for post_id, score in self._boards[board, nsfw].ranking():
+                fresh.update(post_id, score)
+            self._boards[board, nsfw] = fresh
+
+
+class LeaderboardPageSource(menus.ListPageSource):
+    def __init__(self, board: Board, entries: list[tuple[int, int]], *, nsfw: bool) -> None:
+        self.board = board
+        self.nsfw = nsfw
+        super().__init__(entries, per_page=10)
+
+    async def format_page(self, menu: Paginator, entries: list[tuple[int, int]]) -> Embed:
+        offset = menu.current_page * self.per_page
+        embed = Embed(
+            title=f'Most {self.board.value} {"NSFW " if self.nsfw else ""}waifus',
+            description=fmt_str(
+                [
+                    f'**{rank}.** [#{post_id}](https://danbooru.donmai.us/posts/{post_id}) - {score} {self.board.unit}'
+                    for rank, (post_id, score) in enumerate(entries, start=offset + 1)
+                ],
+                seperator='\n',
+            ),
+        )
+        embed.set_footer(text=f'Page {menu.current_page + 1}/{self.get_max_pages()}')
+        return embed
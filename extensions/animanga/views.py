@@ -1,28 +1,39 @@
 from __future__ import annotations
 
 import datetime
-from typing import TYPE_CHECKING, Self
+from io import BytesIO
+from typing import TYPE_CHECKING, Any, Self
 
 import discord
 from asyncpg.exceptions import UniqueViolationError
-from discord.ext import menus
 
 from utilities.constants import BotEmojis
 from utilities.embed import Embed
-from utilities.errors import WaifuNotFoundError
+from utilities.errors import CircuitOpenError
 from utilities.functions import fmt_str, timestamp_str
-from utilities.pagination import Paginator
-from utilities.types import WaifuFavouriteEntry, WaifuResult
+from utilities.pagination import Paginator, QueryPageSource
+from utilities.types import WaifuFavouriteEntry
 from utilities.view import BaseView
 
 if TYPE_CHECKING:
-    from aiohttp import ClientSession
+    from collections.abc import Sequence
+
+    from asyncpg import Record
 
     from utilities.bases.bot import Cyrene
     from utilities.bases.context import CyContext
+    from utilities.types import WaifuResult
+
+    from .curated import CuratedEntry, CuratedIndex
+    from .danbooru import DanbooruClient
+    from .gallery import Gallery
 
 __all__ = ('WaifuSearchView',)
 
+PREFETCH_PAGES = 10  # Fetched in a single batch when the paginator starts
+PREFETCH_RADIUS = 2  # Pages on either side of the current page fetched in the background
+GALLERY_PAGE_SIZE = 16  # Laid out as a 4x4 grid
+
 
 class WaifuBase(BaseView):
     ctx: CyContext
@@ -31,7 +42,7 @@ class WaifuBase(BaseView):
     def __init__(
         self,
         ctx: CyContext,
-        session: ClientSession,
+        danbooru: DanbooruClient,
         *,
         nsfw: bool,
         for_user: int,
@@ -39,7 +50,7 @@ class WaifuBase(BaseView):
     ) -> None:
         super().__init__()
         self.ctx = ctx
-        self.session = session
+        self.danbooru = danbooru
         self.nsfw = nsfw
         self.for_user = for_user
         self.query = query
@@ -51,10 +62,10 @@ class WaifuBase(BaseView):
         self.pass_emoji = self.passbutton.emoji = BotEmojis.PASS
 
     @classmethod
-    async def start(cls, ctx: CyContext, *, query: None | str = None) -> Self | None:
+    async def start(cls, ctx: CyContext, danbooru: DanbooruClient, *, query: None | str = None) -> Self | None:
         inst = cls(
             ctx,
-            ctx.bot.session,
+            danbooru,
             for_user=ctx.author.id,
             nsfw=(
                 ctx.channel.is_nsfw()
@@ -109,7 +120,9 @@ class WaifuBase(BaseView):
 
         embed.set_image(url=data.url)
 
-        if self.nsfw:
+        if data.stale:
+            embed.set_footer(text='Danbooru is unavailable right now, this is a previously seen result.')
+        elif self.nsfw:
             embed.set_footer(text='For SFW results, run this command in a SFW channel.')
 
         return embed
@@ -134,6 +147,7 @@ class WaifuBase(BaseView):
                     'You have already added this waifu in your favourites list',
                     ephemeral=True,
                 )
+            QueryPageSource.invalidate('WaifuFavourites')
             return await interaction.response.send_message(
                 (
                     f'Successfully added [#{self.current.image_id}]'
@@ -146,7 +160,7 @@ class WaifuBase(BaseView):
             self.passers.remove(interaction.user)
 
         self.smashers.add(interaction.user)
-        await interaction.client.pool.execute(
+        record = await interaction.client.pool.fetchrow(
             """
                 INSERT INTO
                     Waifus (id, smashes, nsfw)
@@ -156,10 +170,18 @@ class WaifuBase(BaseView):
                 UPDATE
                 SET
                     smashes = Waifus.smashes + 1
+                RETURNING
+                    smashes,
+                    passes,
+                    nsfw
             """,
             self.current.image_id,
             self.nsfw,
         )
+        if record is not None:
+            interaction.client.dispatch(
+                'waifu_vote', self.current.image_id, record['nsfw'], record['smashes'], record['passes']
+            )
         await interaction.response.edit_message(embed=self.embed(self.current))
         return None
 
@@ -176,6 +198,7 @@ class WaifuBase(BaseView):
                 interaction.user.id,
             )
             if results:
+                QueryPageSource.invalidate('WaifuFavourites')
                 return await interaction.response.send_message(
                     (
                         f'Successfully removed [#{self.current.image_id}]'
@@ -187,7 +210,7 @@ class WaifuBase(BaseView):
             self.smashers.remove(interaction.user)
 
         self.passers.add(interaction.user)
-        await interaction.client.pool.execute(
+        record = await interaction.client.pool.fetchrow(
             """
                 INSERT INTO
                     Waifus (id, passes, nsfw)
@@ -197,10 +220,18 @@ class WaifuBase(BaseView):
                 UPDATE
                 SET
                     passes = Waifus.passes + 1
+                RETURNING
+                    smashes,
+                    passes,
+                    nsfw
                 """,
             self.current.image_id,
             self.nsfw,
         )
+        if record is not None:
+            interaction.client.dispatch(
+                'waifu_vote', self.current.image_id, record['nsfw'], record['smashes'], record['passes']
+            )
         await interaction.response.edit_message(embed=self.embed(self.current))
         return None
 
@@ -213,6 +244,9 @@ class WaifuBase(BaseView):
         except KeyError:
             await interaction.response.send_message('Hey! Slow down.', ephemeral=True)
             return
+        except CircuitOpenError:
+            await interaction.response.send_message('Danbooru is unavailable right now, try again later.', ephemeral=True)
+            return
         await interaction.response.edit_message(embed=self.embed(data))
 
     async def interaction_check(self, interaction: discord.Interaction) -> bool:
@@ -236,56 +270,114 @@ class WaifuBase(BaseView):
 
 class WaifuSearchView(WaifuBase):
     async def request(self) -> WaifuResult:
-        rating = fmt_str(['explicit', 'questionable', 'sensitive'], seperator=',') if self.nsfw is True else 'general'
-        waifu = await self.session.get(
-            'https://danbooru.donmai.us/posts/random.json',
-            params={
-                'tags': fmt_str(
-                    [
-                        'solo',
-                        self.query or '1girl',
-                        'rating:' + rating,
-                    ],
-                    seperator=' ',
-                ),
-            },
-        )
-        data = await waifu.json()
-
-        success = 200
-        if waifu.status != success or not data:
-            raise WaifuNotFoundError(self.query, json=data)
-
-        current = WaifuResult(
-            name=self.query,
-            image_id=data['id'],
-            url=data['file_url'],
-            source=data['source'],
-            characters=data['tag_string_character'],
-            copyright=data['tag_string_copyright'],
-        )
+        current = await self.danbooru.random_post(self.query, nsfw=self.nsfw)
         self.current = current
 
         return self.current
 
 
-class WaifuPageSource(menus.ListPageSource):
-    def __init__(self, bot: Cyrene, entries: list[WaifuFavouriteEntry]) -> None:
-        self.bot = bot
-        super().__init__(entries, per_page=1)
+class CuratedWaifuView(BaseView):
+    def __init__(self, ctx: CyContext, index: CuratedIndex, *, nsfw: bool) -> None:
+        super().__init__()
+        self.ctx = ctx
+        self.index = index
+        self.nsfw = nsfw
 
-    async def format_page(self, _: Paginator, entry: WaifuFavouriteEntry) -> Embed:
-        post_url = f'https://danbooru.donmai.us/posts/{entry.id}.json'
-        post_res = await self.bot.session.get(post_url)
-        post_data = await post_res.json()
+    def embed(self, entry: CuratedEntry) -> Embed:
+        added_by = self.ctx.bot.get_user(entry.added_by)
 
-        post = WaifuResult(
-            image_id=post_data['id'],
-            url=post_data['file_url'],
-            characters=post_data['tag_string_character'],
-            copyright=post_data['tag_string_copyright'],
+        embed = Embed()
+        embed.set_image(url=entry.file_url)
+        embed.set_footer(text=f'Curated by {added_by or entry.added_by}')
+        return embed
+
+    @discord.ui.button(emoji='🔁', style=discord.ButtonStyle.grey)
+    async def _next(self, interaction: discord.Interaction[Cyrene], _: discord.ui.Button[Self]) -> None:
+        entry = self.index.random(nsfw=self.nsfw)
+        if entry is None:
+            await interaction.response.edit_message(content='There are no curated waifus left.', embed=None, view=None)
+            self.stop()
+            return
+        await interaction.response.edit_message(embed=self.embed(entry))
+
+    async def interaction_check(self, interaction: discord.Interaction) -> bool:
+        if interaction.user.id == self.ctx.author.id:
+            return True
+        await interaction.response.send_message(
+            'Only the command initiator can cycle through waifus in this message.',
+            ephemeral=True,
+        )
+        return False
+
+
+class FavouritesPageSource(QueryPageSource[WaifuFavouriteEntry]):
+    def __init__(
+        self,
+        bot: Cyrene,
+        user: discord.User,
+        *,
+        conditions: Sequence[str],
+        args: Sequence[Any],
+        per_page: int,
+        chunk: int = 1,
+    ) -> None:
+        self.user = user
+        super().__init__(
+            bot.pool,
+            select='f.*',
+            source='WaifuFavourites f LEFT JOIN DanbooruPosts p ON p.id = f.id',
+            conditions=conditions,
+            args=args,
+            key=('f.tm', 'f.id'),
+            per_page=per_page,
+            chunk=chunk,
         )
 
+    def convert(self, record: Record) -> WaifuFavouriteEntry:
+        return WaifuFavouriteEntry(id=record['id'], user_id=self.user, nsfw=record['nsfw'], tm=record['tm'])
+
+
+class WaifuPageSource(FavouritesPageSource):
+    def __init__(
+        self,
+        bot: Cyrene,
+        danbooru: DanbooruClient,
+        user: discord.User,
+        *,
+        conditions: Sequence[str],
+        args: Sequence[Any],
+    ) -> None:
+        self.danbooru = danbooru
+        # Favourites are loaded a prefetch batch at a time, so the posts around the current page are known
+        super().__init__(bot, user, conditions=conditions, args=args, per_page=1, chunk=PREFETCH_PAGES)
+
+    async def prepare(self) -> None:
+        await super().prepare()
+        if not self.count:
+            return
+
+        # A single search for the first few pages rather than a request for every page
+        await self.get_page(0)
+        await self.danbooru.fetch_posts(entry.id for entry in self.cached(range(PREFETCH_PAGES)))
+
+    async def format_page(self, menu: Paginator, entry: WaifuFavouriteEntry) -> Embed:
+        post_url = f'https://danbooru.donmai.us/posts/{entry.id}'
+        post = await self.danbooru.fetch_post(entry.id)
+
+        page = menu.current_page
+        self.danbooru.prefetch(_.id for _ in self.cached(range(max(page - PREFETCH_RADIUS, 0), page + PREFETCH_RADIUS + 1)))
+
+        if post is None:
+            return Embed(
+                title=f'#{entry.id} {"[NSFW]" if entry.nsfw is True else ""}',
+                url=post_url,
+                description=(
+                    'This post is no longer available on Danbooru.'
+                    if self.danbooru.available
+                    else 'Danbooru is unavailable right now and this post has not been seen before.'
+                ),
+            )
+
         # We have the post and user's favourite data, basically everything
 
         embed = Embed(
@@ -303,9 +395,44 @@ class WaifuPageSource(menus.ListPageSource):
         )
         embed.set_image(url=post.url)
         embed.set_thumbnail(url=entry.user_id.display_avatar.url)
+        if post.stale:
+            embed.set_footer(text='Danbooru is unavailable right now, this post may be outdated.')
         return embed
 
 
+class WaifuGalleryPageSource(FavouritesPageSource):
+    def __init__(
+        self,
+        bot: Cyrene,
+        gallery: Gallery,
+        user: discord.User,
+        *,
+        conditions: Sequence[str],
+        args: Sequence[Any],
+    ) -> None:
+        self.gallery = gallery
+        super().__init__(bot, user, conditions=conditions, args=args, per_page=GALLERY_PAGE_SIZE)
+
+    async def format_page(self, menu: Paginator, entries: list[WaifuFavouriteEntry]) -> dict[str, Any]:
+        grid = await self.gallery.render([entry.id for entry in entries])
+        user = entries[0].user_id
+
+        embed = Embed(
+            title=f"{user.display_name}'s favourites",
+            description=fmt_str(
+                [f'[#{entry.id}](https://danbooru.donmai.us/posts/{entry.id})' for entry in entries],
+                seperator=' • ',
+            ),
+        )
+        embed.set_image(url='attachment://favourites.jpg')
+        embed.set_footer(text=f'Page {menu.current_page + 1}/{self.get_max_pages()}')
+        return {
+            'content': None,
+            'embed': embed,
+            'attachments': [discord.File(BytesIO(grid), filename='favourites.jpg')],
+        }
+
+
 class RemoveFavButton(discord.ui.Button[Paginator]):
     view: Paginator
 
@@ -327,15 +454,17 @@ class RemoveFavButton(discord.ui.Button[Paginator]):
             item.id,  # pyright: ignore[reportUnknownMemberType]
             interaction.user.id,
         )
-        if hasattr(self.view.source, 'entries'):
-            self.view.source.entries.pop(self.view.current_page)  # pyright: ignore[reportUnknownMemberType,reportAttributeAccessIssue]
+        source = self.view.source
+        if isinstance(source, QueryPageSource):
+            await source.refresh(self.view.current_page)
 
-            if self.view.source.entries:  # pyright: ignore[reportUnknownMemberType,reportAttributeAccessIssue]
+            if source.count:
                 self.view.clear_items()
                 self.view.fill_items()
                 self.view.add_item(self)
 
-                await self.view.show_checked_page(interaction, self.view.current_page)
+                # The last page may be the one which was removed
+                await self.view.show_checked_page(interaction, min(self.view.current_page, source.get_max_pages() - 1))
                 return
         await interaction.response.edit_message(content='No waifu favourite entries', embed=None, view=None)
         self.view.stop()
@@ -1,61 +1,134 @@
 from __future__ import annotations
 
-from typing import TYPE_CHECKING
+import asyncio
+import contextlib
+import logging
+from typing import TYPE_CHECKING, Any, Literal
 
+import aiohttp
 import discord
 from discord import app_commands
-from discord.ext import commands
+from discord.ext import commands, tasks
 
 from utilities.bases.cog import CyCog
-from utilities.errors import WaifuNotFoundError
+from utilities.constants import BotEmojis
+from utilities.errors import CircuitOpenError, WaifuNotFoundError
+from utilities.functions import fmt_str
+from utilities.imaging import ImageTooLargeError, dhash, to_signed
 from utilities.pagination import Paginator
-from utilities.types import WaifuFavouriteEntry
 
-from .views import RemoveFavButton, WaifuPageSource, WaifuSearchView
+from .curated import CuratedEntry, CuratedIndex
+from .danbooru import DanbooruClient
+from .export import FavouritesExport
+from .gallery import Gallery
+from .importer import FavouritesImport
+from .leaderboard import Board, Leaderboard, LeaderboardPageSource
+from .views import CuratedWaifuView, RemoveFavButton, WaifuGalleryPageSource, WaifuPageSource, WaifuSearchView
 
 if TYPE_CHECKING:
-    import aiohttp
-
     from utilities.bases.bot import Cyrene
     from utilities.bases.context import CyContext
 
 
 __all__ = ('Waifu',)
 
-TAG_ALLOWED_TYPES = [1, 3, 4]
+log = logging.getLogger(__name__)
+
+# Images within this many differing bits of each other are treated as the same picture
+DUPLICATE_DISTANCE = 6
+IMAGE_ERRORS = (aiohttp.ClientError, TimeoutError, ImageTooLargeError, OSError)
+PROGRESS_INTERVAL = 3  # Seconds between edits of a progress message
+
+
+class FavouriteFlags(commands.FlagConverter, prefix='--', delimiter=' '):
+    character: str | None = commands.flag(description='Only show favourites of this character', default=None)
+    series: str | None = commands.flag(
+        description='Only show favourites from this series',
+        aliases=['copyright'],
+        default=None,
+    )
+    grid: bool = commands.flag(description='Show favourites as a gallery of thumbnails', default=False)
+
+
+def to_tag(name: str) -> str:
+    return name.strip().lower().replace(' ', '_')
 
 
-async def get_waifu(session: aiohttp.ClientSession, waifu: str) -> list[tuple[str, str]]:
-    req = await session.get(
-        'https://safebooru.donmai.us/autocomplete.json',
-        params={
-            'search[query]': waifu,
-            'search[type]': 'tag_query',
-        },
+def is_nsfw_channel(ctx: CyContext) -> bool:
+    return (
+        ctx.channel.is_nsfw()
+        if not isinstance(
+            ctx.channel,
+            discord.DMChannel | discord.GroupChannel | discord.PartialMessageable,
+        )
+        else False
     )
-    data = await req.json()
-    characters = [
-        (str(obj['label']), str(obj['value']))
-        for obj in data
-        if obj['type'] == 'tag-word' and obj.get('category') in TAG_ALLOWED_TYPES
-    ]
-    if req.status != 200 or not data or not characters:
-        raise WaifuNotFoundError(waifu)
-    return characters
-
-
-async def waifu_autocomplete(
-    interaction: discord.Interaction[Cyrene],
-    current: str,
-) -> list[app_commands.Choice[str]]:
-    try:
-        characters = await get_waifu(interaction.client.session, current)
-    except WaifuNotFoundError:
-        return []
-    return [app_commands.Choice(name=char[0].title(), value=char[1]) for char in characters]
 
 
 class Waifu(CyCog):
+    def __init__(self, bot: Cyrene) -> None:
+        self.danbooru = DanbooruClient(bot)
+        self.gallery = Gallery(bot, self.danbooru)
+        self.curated = CuratedIndex()
+        self.leaderboard = Leaderboard()
+        self._hash_task: asyncio.Task[None] | None = None
+        self._imports: dict[int, FavouritesImport] = {}
+        self._import_tasks: set[asyncio.Task[None]] = set()
+        super().__init__(bot)
+
+    async def cog_load(self) -> None:
+        # The only time this table is read, everything after this goes through the index
+        entries = await self.bot.pool.fetch("""SELECT * FROM WaifuAPIEntries""")
+        self.curated.load(entries)
+
+        unhashed = self.curated.unhashed()
+        if unhashed:
+            self._hash_task = asyncio.create_task(self._hash_entries(unhashed))
+
+        self.reconcile_leaderboard.start()
+        await super().cog_load()
+
+    async def cog_unload(self) -> None:
+        self.reconcile_leaderboard.cancel()
+        if self._hash_task is not None:
+            self._hash_task.cancel()
+        for task in self._import_tasks:
+            task.cancel()  # Imports resume below their last post when started again
+        self.danbooru.close()
+        await super().cog_unload()
+
+    @tasks.loop(minutes=30)
+    async def reconcile_leaderboard(self) -> None:
+        await self.leaderboard.reconcile(self.bot.pool)
+
+    @commands.Cog.listener('on_waifu_vote')
+    async def record_vote(self, post_id: int, nsfw: bool, smashes: int, passes: int) -> None:  # ruff: ignore[boolean-type-hint-positional-argument]
+        self.leaderboard.record(post_id, nsfw=nsfw, smashes=smashes, passes=passes)
+
+    async def _hash_image(self, url: str) -> int:
+        data = await self.bot.image_cache.fetch(self.bot.session, url)
+        return await self.bot.run_in_process(dhash, data)
+
+    async def _hash_entries(self, entries: list[CuratedEntry]) -> None:
+        # Backfills entries added before hashes were stored
+        for entry in entries:
+            try:
+                value = await self._hash_image(entry.file_url)
+                await self.bot.pool.execute(
+                    """UPDATE WaifuAPIEntries SET dhash = $2 WHERE file_url = $1""",
+                    entry.file_url,
+                    to_signed(value),
+                )
+            except IMAGE_ERRORS as error:
+                log.warning('Failed to hash curated waifu %s: %s', entry.file_url, error)
+                continue
+            except Exception:
+                # Nothing awaits this task, one entry failing must not stop the rest silently
+                log.exception('Failed to hash curated waifu %s', entry.file_url)
+                continue
+
+            self.curated.set_hash(entry.file_url, value)
+
     @commands.hybrid_group(
         name='waifu',
         help='Get waifu images with an option to smash or pass',
@@ -63,50 +136,275 @@ class Waifu(CyCog):
     )
     @app_commands.allowed_contexts(guilds=True, dms=True, private_channels=True)
     @app_commands.allowed_installs(guilds=True, users=True)
-    @app_commands.autocomplete(waifu=waifu_autocomplete)
     async def waifu(self, ctx: CyContext, *, waifu: str | None) -> None:
         if waifu:
             waifu = waifu.replace(' ', '_')
-            characters = await get_waifu(ctx.bot.session, waifu)
+            characters = await self.danbooru.autocomplete(waifu)
             waifu = characters[0][1]  # Points to the value of the first result
-        await WaifuSearchView.start(ctx, query=waifu)
+        await WaifuSearchView.start(ctx, self.danbooru, query=waifu)
 
-    @waifu.command(
+    @waifu.autocomplete('waifu')
+    async def waifu_autocomplete(
+        self,
+        _: discord.Interaction[Cyrene],
+        current: str,
+    ) -> list[app_commands.Choice[str]]:
+        try:
+            characters = await self.danbooru.autocomplete(current)
+        except (WaifuNotFoundError, CircuitOpenError):
+            return []
+        return [app_commands.Choice(name=char[0].title(), value=char[1]) for char in characters]
+
+    @waifu.group(
         name='favourites',
         help="Get your or user's favourited waifus",
         aliases=['fav'],
+        fallback='get',
         with_app_command=True,
     )
-    async def waifu_favourites(self, ctx: CyContext, user: discord.User = commands.Author) -> None:
-        show_nsfw = (
-            ctx.channel.is_nsfw()
-            if not isinstance(
-                ctx.channel,
-                discord.DMChannel | discord.GroupChannel | discord.PartialMessageable,
-            )
-            else False
-        )
+    async def waifu_favourites(
+        self,
+        ctx: CyContext,
+        user: discord.User = commands.Author,
+        *,
+        flags: FavouriteFlags,
+    ) -> None:
+        show_nsfw = is_nsfw_channel(ctx)
 
-        query = """SELECT * FROM WaifuFavourites WHERE user_id = $1""" + (' AND nsfw = $2' if show_nsfw is False else '')
-        args = [
-            user.id,
-        ]
+        params: list[str] = ['f.user_id = $1']
+        args: list[Any] = [user.id]
 
         if show_nsfw is False:
             args.append(show_nsfw)
-        fav_entries = await self.bot.pool.fetch(
-            query,
-            *args,
-        )
+            params.append(f'f.nsfw = ${len(args)}')
+
+        if flags.character or flags.series:
+            # The filters only see posts with stored metadata, so fill in whatever is missing first
+            await self._store_favourite_posts(user)
+
+        if flags.character:
+            args.append([to_tag(flags.character)])
+            params.append(f'p.characters @> ${len(args)}::TEXT[]')
+
+        if flags.series:
+            args.append([to_tag(flags.series)])
+            params.append(f'p.copyright @> ${len(args)}::TEXT[]')
+
+        if flags.grid:
+            source = WaifuGalleryPageSource(self.bot, self.gallery, user, conditions=params, args=args)
+        else:
+            source = WaifuPageSource(self.bot, self.danbooru, user, conditions=params, args=args)
 
-        if not fav_entries:
+        await source.prepare()
+        if not source.count:
             await ctx.reply(
                 'No waifu favourites entry found.\n-# You can favourite a waifu by pressing the smash button twice'
             )
             return
 
-        fav_parsed = [WaifuFavouriteEntry(id=e['id'], user_id=user, nsfw=e['nsfw'], tm=e['tm']) for e in fav_entries]
+        if isinstance(source, WaifuGalleryPageSource):
+            await ctx.defer()
+            await Paginator(source, ctx=ctx).start()
+            return
 
-        paginate = Paginator(WaifuPageSource(self.bot, entries=fav_parsed), ctx=ctx)
+        paginate = Paginator(source, ctx=ctx)
         paginate.add_item(RemoveFavButton())
         await paginate.start()
+
+    @waifu_favourites.command(name='export', help='Download your favourited waifus as zip archives')
+    @commands.max_concurrency(1, commands.BucketType.user)
+    async def waifu_favourites_export(self, ctx: CyContext) -> None:
+        records = await self.bot.pool.fetch(
+            """SELECT id FROM WaifuFavourites WHERE user_id = $1 AND (nsfw = FALSE OR $2) ORDER BY tm""",
+            ctx.author.id,
+            is_nsfw_channel(ctx),
+        )
+        if not records:
+            await ctx.reply('You have no favourites to export.')
+            return
+
+        await ctx.defer()
+        limit = ctx.guild.filesize_limit if ctx.guild else discord.utils.DEFAULT_FILE_SIZE_LIMIT_BYTES
+        export = FavouritesExport(self.bot, self.danbooru, [record['id'] for record in records], limit=limit)
+
+        message = await ctx.reply(f'Exporting {export.total} favourites...')
+        reporter = asyncio.create_task(self._report_export(message, export))
+        parts = 0
+        try:
+            async with contextlib.aclosing(export.archives()) as archives:
+                async for archive in archives:
+                    parts += 1
+                    with archive:
+                        await ctx.send(file=discord.File(archive, filename=f'favourites-{parts}.zip'))
+        finally:
+            reporter.cancel()
+
+        await message.edit(
+            content=fmt_str(
+                [
+                    f'{BotEmojis.GREEN_TICK} Exported {export.exported} favourites in {parts} archive(s).',
+                    f'-# {export.skipped} could not be downloaded.' if export.skipped else None,
+                ],
+                seperator='\n',
+            )
+        )
+
+    @waifu_favourites.command(name='import', help='Import the public favourites of a Danbooru user')
+    async def waifu_favourites_import(self, ctx: CyContext, danbooru_user: str) -> None:
+        if (running := self._imports.get(ctx.author.id)) is not None:
+            await ctx.reply(f'Your import of {running.danbooru_user} is still running, {running.imported} imported so far.')
+            return
+
+        job = FavouritesImport(self.bot, self.danbooru, ctx.author.id, to_tag(danbooru_user))
+        resumed = await job.prepare()
+        self._imports[ctx.author.id] = job
+
+        # Imports can take a while, so they run in the background rather than holding up the command
+        task = asyncio.create_task(self._run_import(ctx, job))
+        self._import_tasks.add(task)
+        task.add_done_callback(self._import_tasks.discard)
+
+        await ctx.reply(
+            f'Resuming your import of {job.danbooru_user} after {job.imported} favourites.'
+            if resumed
+            else f"Importing the favourites of {job.danbooru_user}, you'll be pinged once it's done."
+        )
+
+    async def _run_import(self, ctx: CyContext, job: FavouritesImport) -> None:
+        try:
+            imported = await job.run()
+        except (WaifuNotFoundError, CircuitOpenError, aiohttp.ClientError, TimeoutError):
+            imported = None
+        except Exception:
+            log.exception('Failed to import the favourites of %s', job.danbooru_user)
+            imported = None
+        finally:
+            self._imports.pop(ctx.author.id, None)
+
+        if imported is None:
+            content = f'Your import stopped after {job.imported} favourites, run the command again to resume it.'
+        elif imported:
+            content = f'{BotEmojis.GREEN_TICK} Imported {imported} favourites from {job.danbooru_user}.'
+        else:
+            content = f'No new public favourites were found for {job.danbooru_user}.'
+
+        with contextlib.suppress(discord.HTTPException):
+            await ctx.channel.send(f'{ctx.author.mention} {content}')
+
+    async def _report_export(self, message: discord.Message, export: FavouritesExport) -> None:
+        # Edits are throttled to one every few seconds, and only when something changed
+        reported = 0
+        while True:
+            await asyncio.sleep(PROGRESS_INTERVAL)
+            if export.processed != reported:
+                reported = export.processed
+                await message.edit(content=f'Exporting favourites... {reported}/{export.total}')
+
+    @waifu.command(
+        name='top',
+        help='Get the most smashed, passed or controversial waifus',
+        aliases=['leaderboard', 'lb'],
+        with_app_command=True,
+    )
+    async def waifu_top(
+        self,
+        ctx: CyContext,
+        board: Literal['smashed', 'passed', 'controversial'] = 'smashed',
+    ) -> None:
+        nsfw = is_nsfw_channel(ctx)
+        entries = self.leaderboard.top(Board(board), nsfw=nsfw)
+        if not entries:
+            await ctx.reply('Nobody has voted on any waifus yet.')
+            return
+
+        paginate = Paginator(LeaderboardPageSource(Board(board), entries, nsfw=nsfw), ctx=ctx)
+        await paginate.start()
+
+    @waifu.group(
+        name='curated',
+        help='Get waifu images hand picked by the bot team',
+        fallback='get',
+        with_app_command=True,
+    )
+    async def waifu_curated(self, ctx: CyContext) -> None:
+        nsfw = is_nsfw_channel(ctx)
+        entry = self.curated.random(nsfw=nsfw)
+        if entry is None:
+            await ctx.reply('There are no curated waifus yet.')
+            return
+
+        view = CuratedWaifuView(ctx, self.curated, nsfw=nsfw)
+        view.message = await ctx.reply(embed=view.embed(entry), view=view)
+
+    @waifu_curated.command(name='add', help='Add an image to the curated waifus', with_app_command=False)
+    @commands.is_owner()
+    async def waifu_curated_add(self, ctx: CyContext, url: str, nsfw: bool = False) -> None:  # ruff: ignore[boolean-type-hint-positional-argument, boolean-default-value-positional-argument]
+        if not url.startswith(('https://', 'http://')):
+            await ctx.reply('That is not a valid image URL.')
+            return
+
+        await ctx.defer()
+        try:
+            value = await self._hash_image(url)
+        except IMAGE_ERRORS:
+            await ctx.reply('Could not download that image.')
+            return
+
+        duplicate = self.curated.find_duplicate(value, distance=DUPLICATE_DISTANCE, exclude=url)
+        if duplicate is not None:
+            await ctx.reply(f'That image is already a curated waifu: <{duplicate.file_url}>')
+            return
+
+        await self.bot.pool.execute(
+            """
+                INSERT INTO
+                    WaifuAPIEntries (file_url, added_by, nsfw, dhash)
+                VALUES
+                    ($1, $2, $3, $4)
+                ON CONFLICT (file_url) DO
+                UPDATE
+                SET
+                    nsfw = EXCLUDED.nsfw,
+                    dhash = EXCLUDED.dhash
+            """,
+            url,
+            ctx.author.id,
+            nsfw,
+            to_signed(value),
+        )
+        self.curated.add(CuratedEntry(file_url=url, added_by=ctx.author.id, nsfw=nsfw, dhash=value))
+        await ctx.reply(f'{BotEmojis.GREEN_TICK} Added to the curated waifus.')
+
+    @waifu_curated.command(name='remove', help='Remove an image from the curated waifus', with_app_command=False)
+    @commands.is_owner()
+    async def waifu_curated_remove(self, ctx: CyContext, url: str) -> None:
+        if url not in self.curated:
+            await ctx.reply('That image is not a curated waifu.')
+            return
+
+        await self.bot.pool.execute("""DELETE FROM WaifuAPIEntries WHERE file_url = $1""", url)
+        self.curated.remove(url)
+        await ctx.reply(f'{BotEmojis.GREEN_TICK} Removed from the curated waifus.')
+
+    async def _store_favourite_posts(self, user: discord.User) -> None:
+        missing = await self.bot.pool.fetch(
+            """
+                SELECT
+                    f.id
+                FROM
+                    WaifuFavourites f
+                WHERE
+                    f.user_id = $1
+                    AND NOT EXISTS (
+                        SELECT
+                            1
+                        FROM
+                            DanbooruPosts p
+                        WHERE
+                            p.id = f.id
+                    )
+            """,
+            user.id,
+        )
+        if missing:
+            await self.danbooru.fetch_posts(record['id'] for record in missing)
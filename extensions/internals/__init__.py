@@ -10,6 +10,8 @@ import contextlib
 import discord
 from discord.ext import commands
 
+from utilities.help_command import static_check
+
 from .blacklist import Blacklist
 from .dev import Developer
 from .error_handler import ErrorHandler
@@ -17,6 +19,7 @@ from .guild import Guild
 
 
 class Internals(Blacklist, Developer, ErrorHandler, Guild, name='Developer'):
+    @static_check
     @discord.utils.copy_doc(commands.Cog.cog_check)
     async def cog_check(self, ctx: CyContext) -> bool:
         if await self.bot.is_owner(ctx.author):
@@ -218,7 +218,7 @@ class Blacklist(CyCog):
         self._command_attempts[user.id] += 1
 
         if attempt_check >= 10:
-            await user.send(content)
+            self.bot.dm_fanout.start([user.id], content)
             del self._command_attempts[user.id]
             return
 
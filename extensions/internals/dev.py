@@ -1,12 +1,17 @@
 from __future__ import annotations
 
+import io
 from typing import TYPE_CHECKING
 
+import discord
 from discord.ext import commands
 
 from utilities.bases.cog import CyCog
 from utilities.constants import BotEmojis
-from utilities.functions import format_tb
+from utilities.embed import Embed
+from utilities.functions import fmt_str, format_tb
+from utilities.imaging import render_sparklines
+from utilities.metrics import METRICS
 
 if TYPE_CHECKING:
     from discord import Message
@@ -28,3 +33,40 @@ class Developer(CyCog):
     async def maintenance(self, ctx: CyContext) -> None:
         self.bot.maintenance = not self.bot.maintenance
         return await ctx.message.add_reaction(BotEmojis.GREEN_TICK)
+
+    @commands.command(name='singleflight', aliases=['flights'], hidden=True)
+    async def singleflight_stats(self, ctx: CyContext) -> None:
+        flights = self.bot.singleflight
+        content = fmt_str(
+            [
+                f'- **{namespace}:** `{flights.deduplicated[namespace]}`/`{calls}` calls deduplicated'
+                for namespace, calls in flights.calls.most_common()
+            ],
+            seperator='\n',
+        )
+        await ctx.reply(content or 'No calls have gone through single-flight yet.')
+
+    @commands.command(name='metrics', aliases=['stats'], hidden=True)
+    async def metrics(self, ctx: CyContext) -> None:
+        sampler = self.bot.metrics
+        lines: list[str] = []
+        series: list[tuple[str, list[float]]] = []
+        for metric in METRICS:
+            values = sampler.samples[metric.key].values()
+            if not values:
+                continue
+            low, average, high = min(values), sum(values) / len(values), max(values)
+            lines.append(f'- **{metric.label} :** `{metric.fmt(low)}` / `{metric.fmt(average)}` / `{metric.fmt(high)}`')
+            series.append((f'{metric.label}\n{metric.fmt(values[-1])}', values))
+
+        if not series:
+            await ctx.reply('Nothing has been sampled yet.')
+            return
+
+        chart = await self.bot.run_in_process(render_sparklines, series)
+        embed = Embed(
+            title='Process metrics',
+            description=fmt_str(['-# Min / Avg / Max over the last hour', *lines], seperator='\n'),
+        )
+        embed.set_image(url='attachment://metrics.png')
+        await ctx.reply(embed=embed, file=discord.File(io.BytesIO(chart), filename='metrics.png'))
@@ -1,23 +1,37 @@
 from __future__ import annotations
 
+import asyncio
 import contextlib
 import datetime
-import difflib
 import inspect
+import itertools
 import logging
 import operator
+import time
+from collections import defaultdict
+from dataclasses import dataclass, field
 from typing import TYPE_CHECKING, Any, Self
 
 import discord
-from discord.ext import commands, menus
+from cachetools import TTLCache
+from discord.ext import commands, tasks
 
 from config import DEFAULT_WEBHOOK
 from utilities.bases.cog import CyCog
+from utilities.bktree import BKTree
 from utilities.constants import ERROR_COLOUR, BotEmojis
 from utilities.embed import Embed
-from utilities.errors import CyreneError, WaifuNotFoundError
-from utilities.functions import fmt_str, format_tb, get_command_signature
-from utilities.pagination import Paginator
+from utilities.errors import CircuitOpenError, CyreneError, WaifuNotFoundError
+from utilities.functions import (
+    compress_traceback,
+    decompress_traceback,
+    fingerprint_error,
+    fmt_str,
+    format_tb,
+    get_command_signature,
+)
+from utilities.pagination import Paginator, QueryPageSource
+from utilities.ringbuffer import RingCounter
 from utilities.view import BaseView
 
 if TYPE_CHECKING:
@@ -25,8 +39,76 @@ if TYPE_CHECKING:
 
     from utilities.bases.bot import Cyrene
     from utilities.bases.context import CyContext
+    from utilities.fanout import FanOutResult
 log = logging.getLogger(__name__)
 
+ERROR_QUEUE_SIZE = 500
+ERROR_BATCH_SIZE = 50
+ERROR_BATCH_DELAY = 2.0
+ERROR_REFERENCE_LENGTH = 8
+ERROR_RETENTION_MONTHS = 6
+MAX_SUGGESTION_DISTANCE = 3
+UNKNOWN_COMMAND_CACHE_SIZE = 1024
+UNKNOWN_COMMAND_CACHE_TTL = 30
+OCCURRENCE_PARTITIONS_AHEAD = 1
+RATE_RESOLUTION = 60  # Seconds per bucket
+RATE_BUCKETS = 60  # An hour of history, the baseline
+SPIKE_WINDOW = 300
+SPIKE_MIN_FAILURES = 5
+SPIKE_MIN_RATIO = 0.25
+SPIKE_FACTOR = 3
+
+
+def _add_months(month: datetime.date, months: int) -> datetime.date:
+    index = month.year * 12 + month.month - 1 + months
+    return datetime.date(index // 12, index % 12 + 1, 1)
+
+
+async def _fetch_traceback(bot: Cyrene, record: Record) -> str:
+    if record['traceback_hash'] is None:
+        return record['full_error'] or ''
+    body = await bot.pool.fetchval("""SELECT body FROM ErrorTracebacks WHERE hash = $1""", record['traceback_hash'])
+    return decompress_traceback(body) if body is not None else ''
+
+
+@dataclass(slots=True)
+class ErrorReport:
+    fingerprint: str
+    command: str
+    user_id: int
+    guild_id: int | None
+    error: str
+    full_error: str
+    message_url: str
+    occured_when: datetime.datetime
+
+
+@dataclass(slots=True)
+class CommandRates:
+    invocations: RingCounter = field(default_factory=lambda: RingCounter(RATE_BUCKETS, RATE_RESOLUTION))
+    failures: RingCounter = field(default_factory=lambda: RingCounter(RATE_BUCKETS, RATE_RESOLUTION))
+    alerting: bool = False
+
+    def ratios(self) -> tuple[float, float]:
+        """
+        Return the failure ratio of the recent window and of the rest of the history before it.
+
+        Returns
+        -------
+        tuple[float, float]
+            The recent ratio and the baseline ratio
+
+        """
+        now = time.monotonic()
+        recent_invocations = self.invocations.total(SPIKE_WINDOW, now=now)
+        recent_failures = self.failures.total(SPIKE_WINDOW, now=now)
+        baseline_invocations = self.invocations.total(now=now) - recent_invocations
+        baseline_failures = self.failures.total(now=now) - recent_failures
+        return (
+            recent_failures / recent_invocations if recent_invocations else 0.0,
+            baseline_failures / baseline_invocations if baseline_invocations else 0.0,
+        )
+
 
 class Argument:
     is_provided: bool = False
@@ -250,23 +332,38 @@ class MissingArgumentHandler(discord.ui.View):
 
 
 class ErrorView(BaseView):
-    def __init__(self, error_record: Record, ctx: CyContext) -> None:
-        self.error_record = error_record
+    def __init__(self, handler: ErrorHandler, fingerprint: str, ctx: CyContext) -> None:
+        self.handler = handler
+        self.fingerprint = fingerprint
         self.ctx = ctx
         super().__init__()
 
+    async def _resolve_record(self, interaction: discord.Interaction[Cyrene]) -> Record | None:
+        # The reply goes out before the error is logged, so the record may not exist yet
+        record = await self.handler.fetch_error(self.fingerprint)
+        if record is None:
+            await interaction.response.send_message(
+                'This error is still being logged, try again in a moment.',
+                ephemeral=True,
+            )
+        return record
+
     @discord.ui.button(label='Wanna know more?', style=discord.ButtonStyle.grey)
     async def inform_button(self, interaction: discord.Interaction[Cyrene], _: discord.ui.Button[Self]) -> None:
+        error_record = await self._resolve_record(interaction)
+        if error_record is None:
+            return
+
         embed = Embed(
-            description=f'```py\n{self.error_record["error"]}```',
+            description=f'```py\n{error_record["error"]}```',
             colour=ERROR_COLOUR,
         )
-        error_timestamp: datetime.datetime = self.error_record['occured_when']
-        is_fixed = 'is not' if self.error_record['fixed'] is False else 'is'
+        error_timestamp: datetime.datetime = error_record['occured_when']
+        is_fixed = 'is not' if error_record['fixed'] is False else 'is'
         embed.add_field(
             value=(
                 f'The error was discovered **{discord.utils.format_dt(error_timestamp, "R")}** '
-                f'in the **{self.error_record["command"]}** command and **{is_fixed}** fixed'
+                f'in the **{error_record["command"]}** command and **{is_fixed}** fixed'
             )
         )
         embed.set_footer(
@@ -274,7 +371,7 @@ class ErrorView(BaseView):
             icon_url=interaction.user.display_avatar.url,
         )
         embed.set_author(
-            name=f'Error #{self.error_record["id"]}',
+            name=f'Error #{error_record["id"]}',
             icon_url=BotEmojis.RED_CROSS.url,
         )
 
@@ -282,16 +379,20 @@ class ErrorView(BaseView):
 
     @discord.ui.button(label='Get notified', style=discord.ButtonStyle.green)
     async def notified_button(self, interaction: discord.Interaction[Cyrene], _: discord.ui.Button[Self]) -> None:
+        error_record = await self._resolve_record(interaction)
+        if error_record is None:
+            return
+
         is_user_present = await interaction.client.pool.fetchrow(
             """SELECT * FROM ErrorReminders WHERE id = $1 AND user_id = $2""",
-            self.error_record['id'],
+            error_record['id'],
             interaction.user.id,
         )
 
         if is_user_present:
             await interaction.client.pool.execute(
                 """DELETE FROM ErrorReminders WHERE id = $1 AND user_id = $2""",
-                self.error_record['id'],
+                error_record['id'],
                 interaction.user.id,
             )
             await interaction.response.send_message(
@@ -302,25 +403,33 @@ class ErrorView(BaseView):
 
         await interaction.client.pool.execute(
             """INSERT INTO ErrorReminders (id, user_id) VALUES ($1, $2)""",
-            self.error_record['id'],
+            error_record['id'],
             interaction.user.id,
         )
         await interaction.response.send_message('You will now be notified when this error is fixed', ephemeral=True)
 
 
-class ErrorPageSource(menus.ListPageSource):
-    def __init__(self, bot: Cyrene, entries: list[Record]) -> None:
+class ErrorPageSource(QueryPageSource['Record']):
+    def __init__(self, bot: Cyrene) -> None:
         self.bot = bot
-        entries = sorted(entries, key=operator.itemgetter('id'))
-        super().__init__(entries, per_page=1)
+        super().__init__(bot.pool, select='*', source='Errors', per_page=1)
 
     async def format_page(self, _: Paginator, entry: Record) -> Embed:
-        embed = await Embed.logger(self.bot, entry)
+        embed = await Embed.logger(self.bot, entry, full_error=await _fetch_traceback(self.bot, entry))
         embed.title = embed.title + f'/{self.get_max_pages()}' if embed.title else None
         return embed
 
 
 class ErrorHandler(CyCog):
+    _open_errors: dict[str, Record]
+    _error_queue: asyncio.Queue[ErrorReport]
+    _ingest_task: asyncio.Task[None] | None
+    _held_reports: list[ErrorReport]
+    _writing_task: asyncio.Task[None] | None
+    _command_index: BKTree[commands.Command[Any, ..., Any]]
+    _unknown_commands: TTLCache[tuple[int, str], bool]
+    _rates: defaultdict[str, CommandRates]
+
     default_errors = (
         commands.UserInputError,
         commands.DisabledCommand,
@@ -333,7 +442,29 @@ class ErrorHandler(CyCog):
         commands.TooManyArguments,
     )
 
+    def __init__(self, bot: Cyrene) -> None:
+        # Unfixed errors by fingerprint, so known errors are recognised without a query
+        self._open_errors = {}
+        self._error_queue = asyncio.Queue(maxsize=ERROR_QUEUE_SIZE)
+        self._ingest_task = None
+        # The batch the ingest task is waiting to write, written on unload if it never gets to
+        self._held_reports = []
+        self._writing_task = None
+        self._command_index = BKTree()
+        # Unknown commands which had no suggestion, so spamming one does not search again
+        self._unknown_commands = TTLCache[tuple[int, str], bool](
+            maxsize=UNKNOWN_COMMAND_CACHE_SIZE, ttl=UNKNOWN_COMMAND_CACHE_TTL
+        )
+        self._rates = defaultdict(CommandRates)
+
+        super().__init__(bot)
+
     async def cog_load(self) -> None:
+        # Rebuilt once every extension is loaded, this covers the commands which already are
+        self._build_command_index()
+
+        records = await self.bot.pool.fetch("""SELECT * FROM Errors WHERE NOT fixed AND fingerprint IS NOT NULL""")
+        self._open_errors = {record['fingerprint']: record for record in records}
 
         if self.bot.webhooks.get('ERROR') is None:
             await self.bot.pool.execute(
@@ -344,9 +475,34 @@ class ErrorHandler(CyCog):
                 'ERROR',
                 DEFAULT_WEBHOOK,
             )
-            await self.bot.refresh_vars()
+            await self.bot.refresh_vars(force=True)
+
+        await self._compress_legacy_tracebacks()
+        # The partitions have to exist before the first error is logged
+        await self._create_occurrence_partitions()
+        self._ingest_task = asyncio.create_task(self._ingest_errors())
+        self.maintain_errors.start()
         await super().cog_load()
 
+    async def cog_unload(self) -> None:
+        self.maintain_errors.cancel()
+        if self._ingest_task is not None:
+            self._ingest_task.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await self._ingest_task
+
+        # Reports are never dropped on a reload or shutdown, a batch being written is finished and
+        # whatever is held or still queued is written after it
+        if self._writing_task is not None:
+            await self._writing_task
+        reports, self._held_reports = self._held_reports, []
+        while not self._error_queue.empty():
+            reports.append(self._error_queue.get_nowait())
+        for batch in itertools.batched(reports, ERROR_BATCH_SIZE):
+            await self._write_reports(list(batch))
+
+        await super().cog_unload()
+
     def _cleanse_error_attrs(self, attrs: list[str] | str, *, seperator: str, prefix: str) -> str:
         return (
             fmt_str(
@@ -381,91 +537,340 @@ class ErrorHandler(CyCog):
 
         return m
 
-    async def _find_closest_command(self, ctx: CyContext, name: str) -> commands.Command[None, ..., Any] | None:
-        closest_cmd_name = difflib.get_close_matches(
-            name,
-            [_command.name for _command in self.bot.commands],
-            n=1,
+    def _build_command_index(self) -> None:
+        index: BKTree[commands.Command[Any, ..., Any]] = BKTree()
+        for command in self.bot.walk_commands():
+            if command.hidden or any(parent.hidden for parent in command.parents):
+                continue
+            for name in (command.name, *command.aliases):
+                index.add(f'{command.full_parent_name} {name}'.lstrip().lower(), command)
+
+        self._command_index = index
+        self._unknown_commands.clear()
+
+    @commands.Cog.listener('on_extensions_loaded')
+    async def rebuild_command_index(self) -> None:
+        self._build_command_index()
+
+    async def _find_closest_command(self, ctx: CyContext, name: str) -> commands.Command[Any, ..., Any] | None:
+        # The word after an unknown command may be a subcommand, so both are looked up together as well
+        queries = [name.lower()]
+        if following := ctx.view.buffer[ctx.view.index :].split(maxsplit=1):
+            queries.append(f'{queries[0]} {following[0].lower()}')
+
+        cache_key = (ctx.author.id, queries[-1])
+        if cache_key in self._unknown_commands:
+            return None
+
+        matches = sorted(
+            (
+                (distance, -len(query), command)
+                for query in queries
+                for distance, _, command in self._command_index.search(
+                    query, min(len(query) // 3 + 1, MAX_SUGGESTION_DISTANCE)
+                )
+            ),
+            key=operator.itemgetter(0, 1),
         )
-        if closest_cmd_name:
-            cmd = self.bot.get_command(closest_cmd_name[0])
-            if cmd:
-                try:
-                    can_run = await cmd.can_run(ctx)
-                except (commands.CheckAnyFailure, commands.CheckFailure):
-                    can_run = False
-                if can_run:
-                    return cmd
+
+        checked: set[commands.Command[Any, ..., Any]] = set()
+        for _, query_length, command in matches:
+            if command in checked:
+                continue
+            checked.add(command)
+
+            try:
+                can_run = await command.can_run(ctx)
+            except commands.CommandError:
+                can_run = False
+            if can_run:
+                if -query_length > len(queries[0]):
+                    # The subcommand was matched too, so it is not passed on as an argument
+                    ctx.view.skip_ws()
+                    ctx.view.get_word()
+                return command
+
+        self._unknown_commands[cache_key] = True
         return None
 
-    async def _log_error(
-        self,
-        error: commands.CommandError,
-        *,
-        name: str,
-        author: discord.User | discord.Member,
-        message: discord.Message,
-        guild: discord.Guild | None = None,
-    ) -> Record:
-        formatted_error = format_tb(error)
-        time_occured = datetime.datetime.now()
-
-        record = await self.bot.pool.fetchrow(
-            """
-                INSERT INTO
-                    Errors (
+    @commands.Cog.listener('on_command')
+    async def count_invocation(self, ctx: CyContext) -> None:
+        if ctx.command:
+            self._rates[ctx.command.qualified_name].invocations.add()
+
+    def _count_failure(self, command: str) -> None:
+        rates = self._rates[command]
+        rates.failures.add()
+
+        recent, baseline = rates.ratios()
+        threshold = max(baseline * SPIKE_FACTOR, SPIKE_MIN_RATIO)
+        if recent < threshold:
+            rates.alerting = False
+            return
+        if rates.alerting or rates.failures.total(SPIKE_WINDOW) < SPIKE_MIN_FAILURES:
+            return
+
+        # Only alerted once per spike, until the ratio drops back below the threshold
+        rates.alerting = True
+        embed = Embed(
+            title=f'Error rate spike in {command}',
+            description=fmt_str(
+                (
+                    f'- **Failures:** {rates.failures.total(SPIKE_WINDOW)} in the last {SPIKE_WINDOW // 60} minutes',
+                    f'- **Invocations:** {rates.invocations.total(SPIKE_WINDOW)} ({recent:.0%} failed)',
+                    f'- **Baseline:** {baseline:.0%} over the last {RATE_BUCKETS * RATE_RESOLUTION // 60} minutes',
+                ),
+                seperator='\n',
+            ),
+            colour=ERROR_COLOUR,
+        )
+        self.bot.webhook_delivery.send('ERROR', embed)
+
+    def _report_error(self, report: ErrorReport) -> None:
+        try:
+            self._error_queue.put_nowait(report)
+        except asyncio.QueueFull:
+            # Dropped rather than letting a burst of errors back up the event loop
+            log.warning('Error queue is full, dropped an error in %s', report.command)
+
+    async def _ingest_errors(self) -> None:
+        while True:
+            self._held_reports = [await self._error_queue.get()]
+            # Give a burst of errors a moment to pile up, so it is logged with a single query
+            await asyncio.sleep(ERROR_BATCH_DELAY)
+            while len(self._held_reports) < ERROR_BATCH_SIZE and not self._error_queue.empty():
+                self._held_reports.append(self._error_queue.get_nowait())
+
+            reports, self._held_reports = self._held_reports, []
+            # Shielded so cancelling the ingest task never aborts a batch halfway, unloading waits for it
+            self._writing_task = asyncio.create_task(self._write_reports(reports))
+            await asyncio.shield(self._writing_task)
+
+    async def _write_reports(self, reports: list[ErrorReport]) -> None:
+        try:
+            await self._log_errors(reports)
+        except Exception:
+            log.exception('Failed to log %s errors', len(reports))
+
+    async def _log_errors(self, reports: list[ErrorReport]) -> None:
+        grouped: dict[str, list[ErrorReport]] = {}
+        for report in reports:
+            grouped.setdefault(report.fingerprint, []).append(report)
+        # The first occurrence in the batch describes the error, the rest are only counted
+        first = {fingerprint: group[0] for fingerprint, group in grouped.items()}
+        tracebacks = {fingerprint: compress_traceback(report.full_error) for fingerprint, report in first.items()}
+
+        async with self.bot.pool.acquire() as conn, conn.transaction():
+            await conn.execute(
+                """
+                    INSERT INTO
+                        ErrorTracebacks (hash, body)
+                    SELECT
+                        *
+                    FROM
+                        UNNEST($1::BYTEA[], $2::BYTEA[])
+                    ON CONFLICT (hash) DO NOTHING
+                """,
+                [digest for digest, _ in tracebacks.values()],
+                [body for _, body in tracebacks.values()],
+            )
+
+            # An unfixed row for the fingerprint may already exist, in which case the batch is counted on it
+            records = await conn.fetch(
+                """
+                    INSERT INTO
+                        Errors (
+                            command,
+                            user_id,
+                            guild,
+                            error,
+                            traceback_hash,
+                            message_url,
+                            occured_when,
+                            fixed,
+                            fingerprint,
+                            occurrences,
+                            last_occured
+                        )
+                    SELECT
                         command,
                         user_id,
                         guild,
                         error,
-                        full_error,
+                        traceback_hash,
                         message_url,
                         occured_when,
-                        fixed
-                    )
-                VALUES
-                    ($1, $2, $3, $4, $5, $6, $7, $8)
-                RETURNING *
-        """,
-            name,
-            author.id,
-            guild.id if guild else None,
-            str(error),
-            formatted_error,
-            message.jump_url,
-            time_occured,
-            False,
-        )
+                        FALSE,
+                        fingerprint,
+                        occurrences,
+                        last_occured
+                    FROM
+                        UNNEST(
+                            $1::TEXT[],
+                            $2::BIGINT[],
+                            $3::BIGINT[],
+                            $4::TEXT[],
+                            $5::BYTEA[],
+                            $6::TEXT[],
+                            $7::TIMESTAMP[],
+                            $8::TEXT[],
+                            $9::INTEGER[],
+                            $10::TIMESTAMP[]
+                        ) AS r (
+                            command,
+                            user_id,
+                            guild,
+                            error,
+                            traceback_hash,
+                            message_url,
+                            occured_when,
+                            fingerprint,
+                            occurrences,
+                            last_occured
+                        )
+                    ON CONFLICT (fingerprint) WHERE NOT fixed DO
+                    UPDATE
+                    SET
+                        occurrences = Errors.occurrences + EXCLUDED.occurrences,
+                        last_occured = EXCLUDED.last_occured
+                    RETURNING
+                        *,
+                        xmax = 0 AS inserted
+                """,
+                [report.command for report in first.values()],
+                [report.user_id for report in first.values()],
+                [report.guild_id for report in first.values()],
+                [report.error for report in first.values()],
+                [digest for digest, _ in tracebacks.values()],
+                [report.message_url for report in first.values()],
+                [report.occured_when for report in first.values()],
+                list(grouped),
+                [len(group) for group in grouped.values()],
+                [group[-1].occured_when for group in grouped.values()],
+            )
 
-        if not record:
-            raise ValueError
+            ids = {record['fingerprint']: record['id'] for record in records}
+            await conn.copy_records_to_table(
+                'erroroccurrences',
+                records=[
+                    (ids[report.fingerprint], report.user_id, report.guild_id, report.message_url, report.occured_when)
+                    for report in reports
+                ],
+                columns=('error_id', 'user_id', 'guild', 'message_url', 'occured_when'),
+            )
 
-        embed = await Embed.logger(self.bot, record)
+        for record in records:
+            self._open_errors[record['fingerprint']] = record
+            # xmax is only zero for rows which were inserted rather than updated
+            if record['inserted']:
+                embed = await Embed.logger(self.bot, record, full_error=first[record['fingerprint']].full_error)
+                self.bot.webhook_delivery.send('ERROR', embed)
+
+    async def _compress_legacy_tracebacks(self) -> None:
+        # Rows from before tracebacks were compressed, moved over once
+        records = await self.bot.pool.fetch(
+            """SELECT id, full_error FROM Errors WHERE traceback_hash IS NULL AND full_error IS NOT NULL"""
+        )
+        if not records:
+            return
 
-        await self.bot.webhooks['ERROR'].send(embed=embed)
+        compressed = [(record['id'], *compress_traceback(record['full_error'])) for record in records]
+        async with self.bot.pool.acquire() as conn, conn.transaction():
+            await conn.executemany(
+                """INSERT INTO ErrorTracebacks (hash, body) VALUES ($1, $2) ON CONFLICT (hash) DO NOTHING""",
+                [(digest, body) for _, digest, body in compressed],
+            )
+            await conn.executemany(
+                """UPDATE Errors SET traceback_hash = $2, full_error = NULL WHERE id = $1""",
+                [(error_id, digest) for error_id, digest, _ in compressed],
+            )
+        log.info('Compressed the tracebacks of %s errors', len(compressed))
 
-        return record
+    async def _create_occurrence_partitions(self) -> None:
+        this_month = datetime.datetime.now().date().replace(day=1)
+        for offset in range(OCCURRENCE_PARTITIONS_AHEAD + 1):
+            start = _add_months(this_month, offset)
+            await self.bot.pool.execute(
+                f"""
+                    CREATE TABLE IF NOT EXISTS ErrorOccurrences_{start:%Y_%m} PARTITION OF ErrorOccurrences
+                    FOR VALUES FROM ('{start}') TO ('{_add_months(start, 1)}')
+                """
+            )
 
-    async def _is_known_error(
-        self,
-        error: commands.CommandError,
-        *,
-        command_name: str,
-    ) -> Record | None:
-        return await self.bot.pool.fetchrow(
+    @tasks.loop(hours=24)
+    async def maintain_errors(self) -> None:
+        await self._create_occurrence_partitions()
+
+        cutoff = _add_months(datetime.datetime.now().date().replace(day=1), -ERROR_RETENTION_MONTHS)
+        partitions = await self.bot.pool.fetch(
             """
                 SELECT
-                    *
+                    c.relname
                 FROM
-                    Errors
+                    pg_inherits i
+                    JOIN pg_class c ON c.oid = i.inhrelid
                 WHERE
-                    command = $1
-                    AND error = $2
-                    AND fixed = $3
-            """,
-            command_name,
-            str(error),
-            False,
+                    i.inhparent = 'erroroccurrences'::regclass
+            """
+        )
+        for partition in partitions:
+            year, month = partition['relname'].rsplit('_', 2)[1:]
+            if datetime.date(int(year), int(month), 1) < cutoff:
+                # Dropping a whole month is far cheaper than deleting its rows
+                await self.bot.pool.execute(f"""DROP TABLE IF EXISTS {partition['relname']}""")
+
+        oldest = datetime.datetime.combine(cutoff, datetime.time())
+        async with self.bot.pool.acquire() as conn, conn.transaction():
+            await conn.execute(
+                """
+                    DELETE FROM ErrorReminders r USING Errors e
+                    WHERE
+                        r.id = e.id
+                        AND e.fixed
+                        AND COALESCE(e.last_occured, e.occured_when) < $1
+                """,
+                oldest,
+            )
+            status = await conn.execute(
+                """DELETE FROM Errors WHERE fixed AND COALESCE(last_occured, occured_when) < $1""",
+                oldest,
+            )
+            await conn.execute(
+                """
+                    DELETE FROM ErrorTracebacks t
+                    WHERE
+                        NOT EXISTS (
+                            SELECT
+                                1
+                            FROM
+                                Errors e
+                            WHERE
+                                e.traceback_hash = t.hash
+                        )
+                """
+            )
+        log.info('Error retention removed %s fixed errors from before %s', status.split()[-1], cutoff)
+
+    async def fetch_error(self, fingerprint: str) -> Record | None:
+        """
+        Get the latest error logged under a fingerprint.
+
+        Parameters
+        ----------
+        fingerprint : str
+            The fingerprint of the error
+
+        Returns
+        -------
+        Record | None
+            The error, or None if it has not been logged yet
+
+        """
+        if record := self._open_errors.get(fingerprint):
+            return record
+        return await self.bot.pool.fetchrow(
+            """SELECT * FROM Errors WHERE fingerprint = $1 ORDER BY id DESC LIMIT 1""",
+            fingerprint,
         )
 
     @commands.Cog.listener('on_command_error')
@@ -493,7 +898,7 @@ class ErrorHandler(CyCog):
                 cmd_name = await commands.clean_content(escape_markdown=True).convert(ctx, cmd)
 
                 view.message = await ctx.reply(
-                    f"Couldn't find a command named `{cmd_name}`. Perhaps, you meant `{possible_commands.name}`?",
+                    f"Couldn't find a command named `{cmd_name}`. Perhaps, you meant `{possible_commands.qualified_name}`?",
                     view=view,
                 )
 
@@ -575,28 +980,32 @@ class ErrorHandler(CyCog):
             exc_info=error,
         )
 
-        record = await self._is_known_error(
-            error,
-            command_name=ctx.command.qualified_name,
-        )
-
-        if not record:
-            record = await self._log_error(
-                error,
-                name=ctx.command.qualified_name,
-                author=ctx.author,
-                message=ctx.message,
-                guild=ctx.guild,
+        self._count_failure(ctx.command.qualified_name)
+
+        fingerprint = fingerprint_error(error)
+        self._report_error(
+            ErrorReport(
+                fingerprint=fingerprint,
+                command=ctx.command.qualified_name,
+                user_id=ctx.author.id,
+                guild_id=ctx.guild.id if ctx.guild else None,
+                error=str(error),
+                full_error=format_tb(error),
+                message_url=ctx.message.jump_url,
+                occured_when=datetime.datetime.now(),
             )
+        )
 
-        view = ErrorView(record, ctx)
-        view.message = await ctx.reply(
-            embed=Embed.error(
-                title='Error occured',
-                description='The command borked.',
-            ),
-            view=view,
+        # Known errors already have an ID, new ones are referred to by their fingerprint until they are logged
+        record = self._open_errors.get(fingerprint)
+        embed = Embed.error(
+            title='Error occured',
+            description='The command borked.',
         )
+        embed.set_footer(text=f'Error #{record["id"]}' if record else f'Reference: {fingerprint[:ERROR_REFERENCE_LENGTH]}')
+
+        view = ErrorView(self, fingerprint, ctx)
+        view.message = await ctx.reply(embed=embed, view=view)
 
         return None
 
@@ -616,6 +1025,12 @@ class ErrorHandler(CyCog):
                     '-# You can only search for a **character** or **franchise/series**.'
                 )
             )
+
+        if isinstance(error, CircuitOpenError):
+            return await ctx.reply(
+                f'{error.name} is unavailable right now. Try again in {round(error.retry_after)} seconds.',
+                delete_after=max(error.retry_after, 10.0),
+            )
         return None
 
     @commands.group(
@@ -633,15 +1048,37 @@ class ErrorHandler(CyCog):
             if not error_record:
                 await ctx.reply('Error not found.')
                 return
-            embed = await Embed.logger(self.bot, error_record)
+            embed = await Embed.logger(self.bot, error_record, full_error=await _fetch_traceback(self.bot, error_record))
             await ctx.reply(embed=embed)
             return
-        errors = await self.bot.pool.fetch(
-            """SELECT * FROM Errors""",
-        )
-        paginate = Paginator(ErrorPageSource(self.bot, errors), ctx=ctx)
+        source = ErrorPageSource(self.bot)
+        await source.prepare()
+        if not source.count:
+            await ctx.reply('No errors have been logged.')
+            return
+        paginate = Paginator(source, ctx=ctx)
         await paginate.start()
 
+    @errorcmd_base.command(name='rates', description='Shows the failure rates of commands')
+    async def error_rates(self, ctx: CyContext) -> None:
+        rates = sorted(
+            ((command, rate) for command, rate in self._rates.items() if rate.failures.total()),
+            key=lambda item: item[1].failures.total(SPIKE_WINDOW),
+            reverse=True,
+        )
+        if not rates:
+            await ctx.reply('No command has failed in the last hour.')
+            return
+
+        lines: list[str] = []
+        for command, rate in rates:
+            recent, baseline = rate.ratios()
+            marker = '🔴 ' if rate.alerting else ''
+            recent_counts = f'`{rate.failures.total(SPIKE_WINDOW)}`/`{rate.invocations.total(SPIKE_WINDOW)}` ({recent:.0%})'
+            hour_counts = f'`{rate.failures.total()}`/`{rate.invocations.total()}` ({baseline:.0%} before)'
+            lines.append(f'- {marker}**{command}:** {recent_counts} recently, {hour_counts} in the last hour')
+        await ctx.reply(embed=Embed(title='Command failure rates', description=fmt_str(lines, seperator='\n')))
+
     @errorcmd_base.command(name='fix', description='Mark an error as fixed')
     async def error_fix(self, ctx: CyContext, error_id: int) -> None:
         data = await self.bot.pool.fetchrow("""SELECT * FROM Errors WHERE id = $1""", error_id)
@@ -649,14 +1086,20 @@ class ErrorHandler(CyCog):
             await ctx.reply(f'Cannot find an error with the ID: `{error_id}`')
             return
         await self.bot.pool.execute("""UPDATE Errors SET fixed = $1 WHERE id = $2""", True, error_id)
-        notifiers = await self.bot.pool.fetch("""SELECT user_id FROM ErrorReminders WHERE id = $1""", error_id)
+        self._open_errors.pop(data['fingerprint'], None)
+        notifiers = await self.bot.pool.fetch(
+            """DELETE FROM ErrorReminders WHERE id = $1 RETURNING user_id""",
+            error_id,
+        )
         if notifiers:
-            users = [_ for _ in [self.bot.get_user(user['user_id']) for user in notifiers] if _]
-            for user in users:
-                try:
-                    await user.send(f'Hey! Error `#{data["id"]}` in the `{data["command"]}` command has been fixed.')
-                except discord.errors.Forbidden:
-                    continue
-            # Assuming all goes fine
-            await self.bot.pool.execute("""DELETE FROM ErrorReminders WHERE id = $1""", error_id)
+
+            async def report(result: FanOutResult) -> None:
+                await ctx.reply(f'Notified the subscribers of error `#{error_id}`: {result.summary()}')
+
+            # Sent in the background, so a popular error does not hold up the command
+            self.bot.dm_fanout.start(
+                [notifier['user_id'] for notifier in notifiers],
+                f'Hey! Error `#{data["id"]}` in the `{data["command"]}` command has been fixed.',
+                done=report,
+            )
         await ctx.message.add_reaction(BotEmojis.GREEN_TICK)
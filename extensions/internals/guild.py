@@ -73,7 +73,7 @@ class Guild(CyCog):
                 'GUILD',
                 DEFAULT_WEBHOOK,
             )
-            await self.bot.refresh_vars()
+            await self.bot.refresh_vars(force=True)
         await super().cog_load()
 
     @commands.Cog.listener('on_guild_join')
@@ -88,7 +88,7 @@ class Guild(CyCog):
             is_bot_farm=is_bot_farm,
         )
 
-        await self.bot.webhooks['GUILD'].send(embed=embed)
+        self.bot.webhook_delivery.send('GUILD', embed)
 
         if not is_bot_farm:
             return
@@ -111,4 +111,4 @@ class Guild(CyCog):
             is_bot_farm=is_bot_farm,
         )
 
-        await self.bot.webhooks['GUILD'].send(embed=embed)
+        self.bot.webhook_delivery.send('GUILD', embed)
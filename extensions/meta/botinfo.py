@@ -1,13 +1,13 @@
 from __future__ import annotations
 
-import datetime
+import asyncio
+import logging
 import pathlib
 import platform
+from dataclasses import dataclass
 from typing import TYPE_CHECKING
 
 import discord
-import git
-import psutil
 from discord import app_commands
 from discord.ext import commands
 from jishaku.math import natural_size
@@ -15,26 +15,125 @@ from jishaku.math import natural_size
 from utilities.bases.cog import CyCog
 from utilities.embed import Embed
 from utilities.functions import fmt_str, timestamp_str
+from utilities.stats import BotStats
 
 if TYPE_CHECKING:
+    from utilities.bases.bot import Cyrene
     from utilities.bases.context import CyContext
 
 
-class BotInformation(CyCog):
-    def get_commits(self, count: int = 5) -> list[git.Commit]:
-        repo = git.Repo(pathlib.Path.cwd())
-        return list(repo.iter_commits(repo.active_branch, max_count=count))
+log = logging.getLogger(__name__)
+
+COMMIT_COUNT = 5
+
+
+@dataclass(slots=True, frozen=True)
+class CommitInfo:
+    hexsha: str
+    summary: str
+
+
+def read_commits(path: pathlib.Path, count: int) -> list[CommitInfo]:
+    """
+    Read the latest commits of the active branch.
 
-    def format_commit(self, commit: git.Commit) -> str:
-        sha1 = commit.hexsha[:7]
-        message = (
-            commit.message.split('\n')[0] if isinstance(commit.message, str) else 'No message found.'
-        )  # to stop ugly red line
-        time = datetime.datetime.fromtimestamp(commit.committed_date, tz=datetime.UTC)
+    GitPython spawns git subprocesses, so this is blocking and only run once per load of the cog.
 
-        time = round(time.timestamp())
+    Parameters
+    ----------
+    path : pathlib.Path
+        The path of the repository
+    count : int
+        The number of commits
 
-        return f'**[[`{sha1}`](https://github.com/Depreca1ed/Cyrene/commit/{commit.hexsha})]**: {message}'
+    Returns
+    -------
+    list[CommitInfo]
+        The commits, newest first
+
+    """
+    # Only needed here, and importing it is not free
+    import git  # ruff: ignore[import-outside-top-level]
+
+    repo = git.Repo(path)
+    try:
+        return [
+            CommitInfo(
+                hexsha=commit.hexsha,
+                summary=commit.summary if isinstance(commit.summary, str) else 'No message found.',
+            )
+            for commit in repo.iter_commits(repo.active_branch, max_count=count)
+        ]
+    finally:
+        repo.close()
+
+
+class BotInformation(CyCog):
+    stats: BotStats
+    commits: list[CommitInfo]
+
+    def __init__(self, bot: Cyrene) -> None:
+        self.stats = BotStats()
+        self.commits = []
+        super().__init__(bot)
+
+    async def cog_load(self) -> None:
+        # Events are missed while the cog is unloaded, so a reload counts again
+        self.stats.recount(self.bot.guilds)
+        # Resolved once, `reload` loads the cog again which picks up new commits
+        try:
+            self.commits = await asyncio.to_thread(read_commits, pathlib.Path.cwd(), COMMIT_COUNT)
+        except Exception:
+            log.exception('Could not read the commits of the repository')
+        await super().cog_load()
+
+    @commands.Cog.listener('on_ready')
+    async def recount_stats(self) -> None:
+        # A fresh session replaces the whole cache
+        self.stats.recount(self.bot.guilds)
+
+    @commands.Cog.listener('on_guild_join')
+    async def count_guild_join(self, guild: discord.Guild) -> None:
+        self.stats.add_guild(guild)
+
+    @commands.Cog.listener('on_guild_remove')
+    async def count_guild_remove(self, guild: discord.Guild) -> None:
+        self.stats.remove_guild(guild)
+
+    @commands.Cog.listener('on_guild_available')
+    async def count_guild_available(self, guild: discord.Guild) -> None:
+        self.stats.add_guild(guild)
+
+    @commands.Cog.listener('on_guild_unavailable')
+    async def count_guild_unavailable(self, guild: discord.Guild) -> None:
+        self.stats.remove_guild(guild)
+
+    @commands.Cog.listener('on_member_join')
+    async def count_member_join(self, member: discord.Member) -> None:
+        self.stats.add_member(member)
+
+    @commands.Cog.listener('on_member_remove')
+    async def count_member_remove(self, member: discord.Member) -> None:
+        self.stats.remove_member(member)
+
+    @commands.Cog.listener('on_guild_channel_create')
+    async def count_channel_create(self, channel: discord.abc.GuildChannel) -> None:
+        self.stats.add_channel(channel)
+
+    @commands.Cog.listener('on_guild_channel_delete')
+    async def count_channel_delete(self, channel: discord.abc.GuildChannel) -> None:
+        self.stats.remove_channel(channel)
+
+    @commands.Cog.listener('on_guild_channel_update')
+    async def count_channel_update(self, before: discord.abc.GuildChannel, after: discord.abc.GuildChannel) -> None:
+        if before.type != after.type:
+            self.stats.remove_channel(before)
+            self.stats.add_channel(after)
+
+    def format_commit(self, commit: CommitInfo) -> str:
+        return (
+            f'**[[`{commit.hexsha[:7]}`](https://github.com/Depreca1ed/Cyrene/commit/{commit.hexsha})]**: {commit.summary}'
+        )
 
     @commands.hybrid_command(
         name='about', aliases=['info', 'botinfo'], description='Get information about this bot', usage=''
@@ -47,17 +146,11 @@ class BotInformation(CyCog):
     ) -> None:
         bot = self.bot
 
-        channels = {'voice': 0, 'text': 0, 'total': 0}
-        for channel in bot.get_all_channels():
-            if channel.type in {discord.ChannelType.text, discord.ChannelType.news}:
-                channels['text'] += 1
-            elif channel.type in {discord.ChannelType.voice, discord.ChannelType.stage_voice}:
-                channels['voice'] += 1
-            channels['total'] += 1
+        stats = self.stats
 
         embed = Embed(
             title=str(bot.user.name),
-            description='\n'.join([self.format_commit(c) for c in self.get_commits()]),
+            description='\n'.join([self.format_commit(c) for c in self.commits]),
         )
 
         embed.set_author(
@@ -65,24 +158,25 @@ class BotInformation(CyCog):
             icon_url=bot.owner.display_avatar.url,
         )
 
-        proc = psutil.Process()
-        with proc.oneshot():
-            memory = proc.memory_info().rss
-            memory_usage = natural_size(memory)
+        # The sampler has read it within the last few seconds, only right after startup is it read here
+        metrics = bot.metrics
+        memory = metrics.latest('rss') or metrics.process.memory_info().rss
+        memory_usage = natural_size(int(memory))
 
         embed.add_field(
             name='Internal Statistics',
             value=fmt_str(
                 [
-                    f'- **Servers :** `{len(bot.guilds)}`',
-                    f'- **Users :** `{len(bot.users)}` (`{len([_ for _ in bot.users if _.bot is True])} bots`)',
+                    f'- **Servers :** `{stats.guilds}`',
+                    f'- **Channels :** `{stats.channels}` (`{stats.text_channels} text`, `{stats.voice_channels} voice`)',
+                    f'- **Users :** `{stats.users}` (`{stats.bot_users} bots`)',
                     (
                         f'  - **Installed by :** {self.bot.appinfo.approximate_user_install_count} users'
                         if self.bot.appinfo.approximate_user_install_count
                         else None
                     ),
                     f'- **Uptime since:** {timestamp_str(bot.start_time, with_time=True)}',
-                    f'- **Memory :** `{memory_usage}` (`{round(proc.memory_percent(), 2)}%`)',
+                    f'- **Memory :** `{memory_usage}` (`{round(memory / metrics.total_memory * 100, 2)}%`)',
                 ],
                 seperator='\n',
             ),
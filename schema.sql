@@ -1,16 +1,49 @@
 -- Error tables
+-- zlib compressed tracebacks keyed by their SHA-256, so identical tracebacks are stored once
+CREATE TABLE IF NOT EXISTS ErrorTracebacks (
+        hash BYTEA PRIMARY KEY,
+        body BYTEA NOT NULL
+);
+
 CREATE TABLE IF NOT EXISTS Errors (
         id SERIAL PRIMARY KEY,
         command TEXT NOT NULL,
         user_id BIGINT NOT NULL,
         guild BIGINT,
         error TEXT NOT NULL,
-        full_error TEXT NOT NULL,
+        full_error TEXT, -- Only set until the traceback is moved to ErrorTracebacks
         message_url TEXT NOT NULL,
         occured_when TIMESTAMP NOT NULL,
-        fixed BOOLEAN NOT NULL
+        fixed BOOLEAN NOT NULL,
+        fingerprint TEXT,
+        occurrences INTEGER NOT NULL DEFAULT 1,
+        last_occured TIMESTAMP,
+        traceback_hash BYTEA REFERENCES ErrorTracebacks (hash)
 );
 
+ALTER TABLE Errors ADD COLUMN IF NOT EXISTS fingerprint TEXT;
+ALTER TABLE Errors ADD COLUMN IF NOT EXISTS occurrences INTEGER NOT NULL DEFAULT 1;
+ALTER TABLE Errors ADD COLUMN IF NOT EXISTS last_occured TIMESTAMP;
+ALTER TABLE Errors ADD COLUMN IF NOT EXISTS traceback_hash BYTEA REFERENCES ErrorTracebacks (hash);
+ALTER TABLE Errors ALTER COLUMN full_error DROP NOT NULL;
+
+CREATE INDEX IF NOT EXISTS errors_traceback_hash_idx ON Errors (traceback_hash);
+
+-- At most one unfixed row per fingerprint, every occurrence after the first is counted on it
+CREATE UNIQUE INDEX IF NOT EXISTS errors_open_fingerprint_idx ON Errors (fingerprint) WHERE NOT fixed;
+
+-- Every occurrence of an error, partitioned by month so old months are dropped whole.
+-- The partitions are created and dropped by the error handler.
+CREATE TABLE IF NOT EXISTS ErrorOccurrences (
+        error_id INTEGER NOT NULL REFERENCES Errors (id) ON DELETE CASCADE,
+        user_id BIGINT NOT NULL,
+        guild BIGINT,
+        message_url TEXT NOT NULL,
+        occured_when TIMESTAMP NOT NULL
+) PARTITION BY RANGE (occured_when);
+
+CREATE INDEX IF NOT EXISTS erroroccurrences_error_idx ON ErrorOccurrences (error_id, occured_when);
+
 CREATE TABLE IF NOT EXISTS ErrorReminders (
         id BIGINT references Errors (id),
         user_id BIGINT NOT NULL,
@@ -44,6 +77,15 @@ CREATE TABLE IF NOT EXISTS Webhooks (
         LOG_ENDPOINT TEXT
 );
 
+-- Log embeds which did not fit in the in-memory queue of their webhook, delivered in id order
+CREATE TABLE IF NOT EXISTS WebhookSpill (
+        id BIGSERIAL PRIMARY KEY,
+        log_type TEXT NOT NULL,
+        embed JSONB NOT NULL
+);
+
+CREATE INDEX IF NOT EXISTS webhookspill_log_type_idx ON WebhookSpill (log_type, id);
+
 -- Waifus
 CREATE TABLE IF NOT EXISTS Waifus (
         id BIGINT PRIMARY KEY,
@@ -52,6 +94,10 @@ CREATE TABLE IF NOT EXISTS Waifus (
         nsfw BOOLEAN NOT NUll
 );
 
+CREATE INDEX IF NOT EXISTS waifus_smashes_idx ON Waifus (nsfw, smashes DESC);
+CREATE INDEX IF NOT EXISTS waifus_passes_idx ON Waifus (nsfw, passes DESC);
+CREATE INDEX IF NOT EXISTS waifus_controversial_idx ON Waifus (nsfw, LEAST(smashes, passes) DESC);
+
 CREATE TABLE IF NOT EXISTS WaifuFavourites (
         id BIGINT references Waifus (id),
         user_id BIGINT NOT NULL,
@@ -60,12 +106,46 @@ CREATE TABLE IF NOT EXISTS WaifuFavourites (
         PRIMARY KEY (id, user_id)
 );
 
+-- Favourites are paged through by (tm, id)
+CREATE INDEX IF NOT EXISTS waifufavourites_user_tm_idx ON WaifuFavourites (user_id, tm, id);
+
+CREATE TABLE IF NOT EXISTS FavouriteImports (
+        user_id BIGINT PRIMARY KEY,
+        danbooru_user TEXT NOT NULL,
+        last_id BIGINT,
+        imported INTEGER NOT NULL DEFAULT 0,
+        finished BOOLEAN NOT NULL DEFAULT FALSE,
+        started_at TIMESTAMP NOT NULL
+);
+
+ALTER TABLE FavouriteImports ADD COLUMN IF NOT EXISTS last_id BIGINT;
+ALTER TABLE FavouriteImports DROP COLUMN IF EXISTS page;
+
+CREATE TABLE IF NOT EXISTS DanbooruPosts (
+        id BIGINT PRIMARY KEY,
+        file_url TEXT NOT NULL,
+        characters TEXT[] NOT NULL,
+        copyright TEXT[] NOT NULL,
+        rating TEXT NOT NULL,
+        source TEXT,
+        preview_url TEXT,
+        fetched_at TIMESTAMP NOT NULL
+);
+
+ALTER TABLE DanbooruPosts ADD COLUMN IF NOT EXISTS preview_url TEXT;
+
+CREATE INDEX IF NOT EXISTS danbooruposts_characters_idx ON DanbooruPosts USING GIN (characters);
+CREATE INDEX IF NOT EXISTS danbooruposts_copyright_idx ON DanbooruPosts USING GIN (copyright);
+
 CREATE TABLE IF NOT EXISTS WaifuAPIEntries (
         file_url TEXT PRIMARY KEY,
         added_by BIGINT NOT NULL,
-        nsfw BOOLEAN NOT NULL
+        nsfw BOOLEAN NOT NULL,
+        dhash BIGINT
 );
 
+ALTER TABLE WaifuAPIEntries ADD COLUMN IF NOT EXISTS dhash BIGINT;
+
 CREATE TABLE IF NOT EXISTS FeatureOptIns (
         user_id BIGINT NOT NULL,
         feature INTEGER NOT NULL,
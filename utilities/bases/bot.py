@@ -1,9 +1,14 @@
 from __future__ import annotations
 
+import asyncio
+import contextlib
 import datetime
 import itertools
 import logging
-from typing import TYPE_CHECKING, Self
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import TYPE_CHECKING, Any, Self
 
 import discord
 import jishaku
@@ -11,7 +16,7 @@ import mystbin
 from discord.ext import commands
 
 if TYPE_CHECKING:
-    from collections.abc import Iterable
+    from collections.abc import Callable, Iterable
 
     from aiohttp import ClientSession
     from asyncpg import Pool, Record
@@ -22,10 +27,20 @@ if TYPE_CHECKING:
 from config import DEFAULT_PREFIX, OWNER_IDS
 from utilities.bases.context import CyContext
 from utilities.constants import BASE_COLOUR
+from utilities.fanout import DMFanOut
+from utilities.help_command import CyHelpCommand, HelpCache, static_check
+from utilities.image_cache import ImageCache
+from utilities.metrics import MetricsSampler
+from utilities.singleflight import SingleFlight
 from utilities.timers import TimerManager
+from utilities.webhooks import WebhookDelivery
 
 log = logging.getLogger('Cyrene')
 
+PROCESS_POOL_WORKERS = 2
+IMAGE_CACHE_PATH = Path('.cache/images')
+IMAGE_CACHE_SIZE = 256 * 1024 * 1024
+
 jishaku.Flags.FORCE_PAGINATOR = True
 jishaku.Flags.HIDE = True
 jishaku.Flags.NO_DM_TRACEBACK = True
@@ -54,7 +69,7 @@ class Cyrene(commands.AutoShardedBot):
             intents=intents,
             allowed_mentions=allowed_mentions,
             enable_debug_events=True,
-            help_command=commands.MinimalHelpCommand(),
+            help_command=CyHelpCommand(),
         )
 
         self.maintenance = maintenance
@@ -65,6 +80,19 @@ class Cyrene(commands.AutoShardedBot):
 
         self.session = session
         self.mystbin = mystbin.Client(session=self.session)
+        self.singleflight = SingleFlight()
+        self._vars_generation = 0
+        self._vars_applied = 0
+        # Workers are started lazily, forkserver avoids forking the running event loop and its threads
+        self.process_pool = ProcessPoolExecutor(
+            max_workers=PROCESS_POOL_WORKERS,
+            mp_context=multiprocessing.get_context('forkserver'),
+        )
+        self.image_cache = ImageCache(IMAGE_CACHE_PATH, max_size=IMAGE_CACHE_SIZE)
+        self.webhook_delivery = WebhookDelivery(self)
+        self.dm_fanout = DMFanOut(self)
+        self.help_cache = HelpCache(self)
+        self.metrics = MetricsSampler(self)
         self.start_time = datetime.datetime.now()
         self.colour = self.color = BASE_COLOUR
         self.initial_extensions = extensions
@@ -73,12 +101,34 @@ class Cyrene(commands.AutoShardedBot):
         self.timer_manager = TimerManager(self.loop, self)
 
         await self.refresh_vars()
+        await self.image_cache.load()
+        await self.webhook_delivery.start()
+        self.metrics.start()
 
         await self.load_extensions(self.initial_extensions)
         await self.load_extension('jishaku')
 
         self.add_check(self.maintenance_check)
 
+    async def run_in_process[T](self, func: Callable[..., T], *args: Any) -> T:
+        """
+        Run a CPU bound function in the process pool.
+
+        Parameters
+        ----------
+        func : Callable[..., T]
+            A picklable, module level function
+        *args : Any
+            The arguments to call the function with, which must be picklable too
+
+        Returns
+        -------
+        T
+            The result of the function
+
+        """
+        return await asyncio.get_running_loop().run_in_executor(self.process_pool, func, *args)
+
     async def get_context(
         self, origin: discord.Message | discord.Interaction, *, cls: type[CyContext] = CyContext
     ) -> CyContext:
@@ -89,7 +139,7 @@ class Cyrene(commands.AutoShardedBot):
 
     async def load_extensions(self, extensions: Iterable[str]) -> None:
         """
-        Load all extensions for the bot.
+        Load all extensions for the bot, then dispatch `extensions_loaded`.
 
         Parameters
         ----------
@@ -104,6 +154,10 @@ class Cyrene(commands.AutoShardedBot):
                 log.exception('An exception occured while loading extension: %s', extension, exc_info=exc)
             else:
                 log.info('Loaded %s', extension)
+        self.dispatch('extensions_loaded')
+
+    async def on_extensions_loaded(self) -> None:
+        self.help_cache.rebuild()
 
     async def unload_extensions(self, extensions: Iterable[str]) -> None:
         """
@@ -120,7 +174,7 @@ class Cyrene(commands.AutoShardedBot):
 
     async def reload_extensions(self, extensions: Iterable[str]) -> None:
         """
-        Reload all extensions for the bot.
+        Reload all extensions for the bot, then dispatch `extensions_loaded`.
 
         Parameters
         ----------
@@ -130,6 +184,7 @@ class Cyrene(commands.AutoShardedBot):
         """
         for extension in extensions:
             await self.reload_extension(extension)
+        self.dispatch('extensions_loaded')
 
     def get_prefixes(self, guild: discord.Guild | None) -> list[str]:
         """
@@ -176,6 +231,7 @@ class Cyrene(commands.AutoShardedBot):
         """
         return self.blacklists.get(snowflake if isinstance(snowflake, int) else snowflake.id, None)
 
+    @static_check
     async def maintenance_check(self, ctx: CyContext) -> bool:
         if self.maintenance is False or await self.is_owner(ctx.author) is True:
             return True
@@ -202,13 +258,37 @@ class Cyrene(commands.AutoShardedBot):
         file = mystbin.File(filename=filename, content=content)
         return await self.mystbin.create_paste(files=[file])
 
-    async def refresh_vars(self) -> None:
-        """Set values to some bot constants."""
-        self._support_invite = await self.fetch_invite('https://discord.gg/yaH2ND8jYB')
+    async def refresh_vars(self, *, force: bool = False) -> None:
+        """
+        Set values to some bot constants.
+
+        Concurrent calls share a single refresh, unless forced.
 
-        self.appinfo = await self.application_info()
+        Parameters
+        ----------
+        force : bool
+            Whether to start a new refresh instead of joining the one in flight. Callers that have
+            just written something the refresh reads have to force it, the refresh in flight may
+            have read before the write.
 
+        """
+        await self.singleflight.do(('refresh_vars',), self._refresh_vars, force=force)
+
+    async def _refresh_vars(self) -> None:
+        self._vars_generation += 1
+        generation = self._vars_generation
+
+        support_invite = await self.fetch_invite('https://discord.gg/yaH2ND8jYB')
+        appinfo = await self.application_info()
         webhooks = await self.pool.fetch("""SELECT * FROM Webhooks""")
+
+        # A refresh started later may have finished first, its values are newer
+        if generation < self._vars_applied:
+            return
+        self._vars_applied = generation
+
+        self._support_invite = support_invite
+        self.appinfo = appinfo
         self.webhooks = {entry[0]: discord.Webhook.from_url(entry[1], session=self.session) for entry in webhooks}
 
     @property
@@ -253,9 +333,18 @@ class Cyrene(commands.AutoShardedBot):
         )  # MISSING is handled by the library
 
     async def close(self) -> None:
+        # Unloaded before the pool closes, so cogs can still write what they hold while unloading
+        for extension in tuple(self.extensions):
+            with contextlib.suppress(Exception):
+                await self.unload_extension(extension)
         if hasattr(self, 'pool'):
+            await self.webhook_delivery.close()
             await self.pool.close()
         if hasattr(self, 'session'):
             await self.session.close()
         self.timer_manager.close()
+        self.process_pool.shutdown(wait=False, cancel_futures=True)
+        self.image_cache.close()
+        self.dm_fanout.close()
+        self.metrics.close()
         await super().close()
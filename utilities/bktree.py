@@ -0,0 +1,136 @@
+from __future__ import annotations
+
+import operator
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from collections.abc import Callable
+
+
+__all__ = (
+    'BKTree',
+    'levenshtein',
+)
+
+
+def levenshtein(first: str, second: str) -> int:
+    """
+    Return the edit distance between two strings.
+
+    Parameters
+    ----------
+    first : str
+        The first string
+    second : str
+        The second string
+
+    Returns
+    -------
+    int
+        The number of insertions, deletions and substitutions turning one string into the other
+
+    """
+    if len(first) < len(second):
+        first, second = second, first
+
+    previous = list(range(len(second) + 1))
+    for i, first_char in enumerate(first, start=1):
+        current = [i]
+        for j, second_char in enumerate(second, start=1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (first_char != second_char)))
+        previous = current
+    return previous[-1]
+
+
+class _Node[T]:
+    __slots__ = ('children', 'key', 'values')
+
+    def __init__(self, key: str, value: T) -> None:
+        self.key = key
+        self.values = [value]
+        self.children: dict[int, _Node[T]] = {}
+        super().__init__()
+
+
+class BKTree[T]:
+    """
+    A Burkhard-Keller tree of strings, for finding every key within an edit distance of a query.
+
+    Every child of a node is filed under its distance to the node, so by the triangle inequality a
+    search only has to visit the children whose distance is within the tolerance of the query's
+    distance to the node, instead of comparing the query against every key.
+    """
+
+    def __init__(self, distance: Callable[[str, str], int] = levenshtein) -> None:
+        self.distance = distance
+
+        self._root: _Node[T] | None = None
+        self._size = 0
+
+        super().__init__()
+
+    def __len__(self) -> int:
+        return self._size
+
+    def add(self, key: str, value: T) -> None:
+        """
+        Add a value under a key. A key can hold more than one value.
+
+        Parameters
+        ----------
+        key : str
+            The key
+        value : T
+            The value
+
+        """
+        self._size += 1
+        if self._root is None:
+            self._root = _Node(key, value)
+            return
+
+        node = self._root
+        while True:
+            distance = self.distance(key, node.key)
+            if distance == 0:
+                node.values.append(value)
+                return
+            child = node.children.get(distance)
+            if child is None:
+                node.children[distance] = _Node(key, value)
+                return
+            node = child
+
+    def search(self, query: str, tolerance: int) -> list[tuple[int, str, T]]:
+        """
+        Find every value whose key is within `tolerance` edits of the query.
+
+        Parameters
+        ----------
+        query : str
+            The string being searched for
+        tolerance : int
+            The maximum edit distance
+
+        Returns
+        -------
+        list[tuple[int, str, T]]
+            The distance, key and value of every match, closest first
+
+        """
+        matches: list[tuple[int, str, T]] = []
+        stack = [self._root] if self._root is not None else []
+
+        while stack:
+            node = stack.pop()
+            distance = self.distance(query, node.key)
+            if distance <= tolerance:
+                matches.extend((distance, node.key, value) for value in node.values)
+            stack.extend(
+                child
+                for child_distance, child in node.children.items()
+                if distance - tolerance <= child_distance <= distance + tolerance
+            )
+
+        matches.sort(key=operator.itemgetter(0, 1))
+        return matches
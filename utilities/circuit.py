@@ -0,0 +1,150 @@
+from __future__ import annotations
+
+import enum
+import logging
+import time
+from typing import TYPE_CHECKING, Any
+
+from utilities.errors import CircuitOpenError
+
+if TYPE_CHECKING:
+    from collections.abc import Callable, Coroutine
+
+
+__all__ = (
+    'CircuitBreaker',
+    'CircuitState',
+)
+
+log = logging.getLogger(__name__)
+
+
+class CircuitState(enum.Enum):
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half-open'
+
+
+class CircuitBreaker:
+    """
+    Fail fast when a service keeps failing.
+
+    The circuit opens after `failure_threshold` consecutive failures, where a call which took longer
+    than `latency_threshold` also counts as a failure. While open every call raises CircuitOpenError
+    right away. Once `reset_timeout` has passed, a single call is let through as a probe which
+    closes the circuit if it succeeds and opens it again otherwise.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        *,
+        failures: tuple[type[BaseException], ...],
+        failure_threshold: int = 5,
+        latency_threshold: float = 5.0,
+        reset_timeout: float = 30.0,
+    ) -> None:
+        self.name = name
+        self.failures = failures
+        self.failure_threshold = failure_threshold
+        self.latency_threshold = latency_threshold
+        self.reset_timeout = reset_timeout
+
+        self._state = CircuitState.CLOSED
+        self._consecutive_failures = 0
+        self._opened_at = 0.0
+        self._probing = False
+
+        super().__init__()
+
+    @property
+    def state(self) -> CircuitState:
+        """
+        The current state of the circuit.
+
+        Returns
+        -------
+        CircuitState
+            The state of the circuit
+
+        """
+        if self._state is CircuitState.OPEN and time.monotonic() - self._opened_at >= self.reset_timeout:
+            return CircuitState.HALF_OPEN
+        return self._state
+
+    @property
+    def retry_after(self) -> float:
+        """
+        The seconds until the circuit lets a probe through.
+
+        Returns
+        -------
+        float
+            The seconds left, 0 when the circuit is not open
+
+        """
+        if self._state is not CircuitState.OPEN:
+            return 0.0
+        return max(self.reset_timeout - (time.monotonic() - self._opened_at), 0.0)
+
+    async def call[T](self, func: Callable[[], Coroutine[Any, Any, T]]) -> T:
+        """
+        Make a call through the circuit.
+
+        Parameters
+        ----------
+        func : Callable[[], Coroutine[Any, Any, T]]
+            The function making the call
+
+        Returns
+        -------
+        T
+            The result of the call
+
+        Raises
+        ------
+        CircuitOpenError
+            Raised when the circuit is open, or a probe is already in flight
+
+        """
+        state = self.state
+        if state is CircuitState.OPEN or (state is CircuitState.HALF_OPEN and self._probing):
+            raise CircuitOpenError(self.name, retry_after=self.retry_after)
+
+        probe = state is CircuitState.HALF_OPEN
+        if probe:
+            self._probing = True
+
+        start = time.monotonic()
+        try:
+            result = await func()
+        except self.failures:
+            self._record_failure()
+            raise
+        finally:
+            if probe:
+                self._probing = False
+
+        if time.monotonic() - start > self.latency_threshold:
+            self._record_failure()
+        else:
+            self._record_success()
+
+        return result
+
+    def _record_success(self) -> None:
+        if self._state is not CircuitState.CLOSED:
+            log.info('Circuit %s closed', self.name)
+
+        self._state = CircuitState.CLOSED
+        self._consecutive_failures = 0
+
+    def _record_failure(self) -> None:
+        self._consecutive_failures += 1
+
+        if self._state is CircuitState.OPEN or self._consecutive_failures >= self.failure_threshold:
+            if self._state is CircuitState.CLOSED:
+                log.warning('Circuit %s opened after %s failures', self.name, self._consecutive_failures)
+
+            self._state = CircuitState.OPEN
+            self._opened_at = time.monotonic()
@@ -8,11 +8,80 @@ from utilities.constants import BASE_COLOUR, ERROR_COLOUR, BotEmojis
 from utilities.functions import fmt_str
 
 if TYPE_CHECKING:
+    from collections.abc import Iterable, Iterator
+
     import asyncpg
 
     from utilities.bases.bot import Cyrene
 
-__all__ = ('Embed',)
+__all__ = (
+    'MESSAGE_EMBED_CHARACTERS',
+    'MESSAGE_EMBED_LIMIT',
+    'Embed',
+    'batch_embeds',
+    'fit_embed',
+)
+
+MESSAGE_EMBED_LIMIT = 10
+MESSAGE_EMBED_CHARACTERS = 6000  # Shared by every embed of a message
+
+
+def batch_embeds[E: discord.Embed](embeds: Iterable[E]) -> Iterator[list[E]]:
+    """
+    Group embeds into batches which each fit in a single message.
+
+    A batch ends once another embed would go over 10 embeds or 6000 characters in total. An embed
+    which is too large on its own still gets a batch of its own, so it is not silently skipped.
+
+    Parameters
+    ----------
+    embeds : Iterable[E]
+        The embeds, in the order they are sent
+
+    Yields
+    ------
+    list[E]
+        The embeds of each message
+
+    """
+    batch: list[E] = []
+    characters = 0
+    for embed in embeds:
+        size = len(embed)
+        if batch and (len(batch) >= MESSAGE_EMBED_LIMIT or characters + size > MESSAGE_EMBED_CHARACTERS):
+            yield batch
+            batch, characters = [], 0
+        batch.append(embed)
+        characters += size
+    if batch:
+        yield batch
+
+
+def fit_embed[E: discord.Embed](embed: E) -> E:
+    """
+    Truncate an embed in place until it fits in a message on its own.
+
+    The description is cut short first, then fields are removed from the end.
+
+    Parameters
+    ----------
+    embed : E
+        The embed
+
+    Returns
+    -------
+    E
+        The same embed
+
+    """
+    excess = len(embed) - MESSAGE_EMBED_CHARACTERS
+    if excess > 0 and embed.description:
+        embed.description = embed.description[: max(len(embed.description) - excess - 1, 0)] + '…'
+    while len(embed) > MESSAGE_EMBED_CHARACTERS and embed.fields:
+        embed.remove_field(-1)
+    if len(embed) > MESSAGE_EMBED_CHARACTERS and embed.title:
+        embed.title = embed.title[: max(len(embed.title) - (len(embed) - MESSAGE_EMBED_CHARACTERS), 0)]
+    return embed
 
 
 class Embed(discord.Embed):
@@ -61,7 +130,7 @@ class Embed(discord.Embed):
         return cls(title=title, description=description, colour=ERROR_COLOUR)
 
     @classmethod
-    async def logger(cls, bot: Cyrene, record: asyncpg.Record) -> Self:
+    async def logger(cls, bot: Cyrene, record: asyncpg.Record, *, full_error: str) -> Self:
         """
         Generate an embed logged to the error logger.
 
@@ -73,6 +142,8 @@ class Embed(discord.Embed):
             The bot this embed belongs to
         record : asyncpg.Record
             The record of the error
+        full_error : str
+            The formatted traceback of the error
 
         Returns
         -------
@@ -83,9 +154,7 @@ class Embed(discord.Embed):
         logger_embed = cls(
             title=f'Error #{record["id"]}',
             description=(
-                f"""```prolog\n{record['full_error']}```"""
-                if len(record['full_error']) < 1900
-                else 'Error message was too long to be shown'
+                f"""```prolog\n{full_error}```""" if len(full_error) < 1900 else 'Error message was too long to be shown'
             ),
             colour=0xFF0000 if record['fixed'] is False else 0x00FF00,
         )
@@ -98,6 +167,12 @@ class Embed(discord.Embed):
                     f'- **Guild:** {bot.get_guild(record["guild"]) if record["guild"] else "N/A"}',
                     f'- **URL: ** [Jump to message]({record["message_url"]})',
                     f'- **Occured: ** {discord.utils.format_dt(record["occured_when"], "f")}',
+                    (
+                        f'- **Occurrences: ** {record["occurrences"]}, '
+                        f'last {discord.utils.format_dt(record["last_occured"], "R")}'
+                    )
+                    if record['occurrences'] > 1 and record['last_occured']
+                    else None,
                 ),
                 seperator='\n',
             )
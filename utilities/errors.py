@@ -11,6 +11,7 @@ if TYPE_CHECKING:
 
 __all__ = (
     'AlreadyBlacklistedError',
+    'CircuitOpenError',
     'CyreneError',
     'FeatureDisabledError',
     'NotBlacklistedError',
@@ -71,6 +72,13 @@ class UnderMaintenanceError(commands.CheckFailure, CyreneError):
         super().__init__('The bot is currently under maintenance.')
 
 
+class CircuitOpenError(commands.CommandError, CyreneError):
+    def __init__(self, name: str, *, retry_after: float) -> None:
+        self.name = name
+        self.retry_after = retry_after
+        super().__init__(f'{name} is currently unavailable, retry after {retry_after:.0f} seconds')
+
+
 class WaifuNotFoundError(commands.CommandError, CyreneError):
     def __init__(self, waifu: str | None = None, json: dict[Any, Any] | str | None = None) -> None:
         waifu = waifu.replace('@everyone', '@\u200beveryone').replace('@here', '@\u200bhere') if waifu else None
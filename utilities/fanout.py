@@ -0,0 +1,172 @@
+from __future__ import annotations
+
+import asyncio
+import enum
+import logging
+from collections import Counter
+from dataclasses import dataclass, field
+from typing import TYPE_CHECKING
+
+import discord
+
+from utilities.functions import fmt_str
+from utilities.ratelimit import TokenBucket
+
+if TYPE_CHECKING:
+    from collections.abc import Awaitable, Callable, Iterable
+
+    from utilities.bases.bot import Cyrene
+
+
+__all__ = (
+    'DMFanOut',
+    'FanOutOutcome',
+    'FanOutResult',
+)
+
+log = logging.getLogger(__name__)
+
+DM_CONCURRENCY = 5
+DM_RATE = 2  # Messages a second, DMing quickly is what gets bots flagged for spam
+DM_BURST = 5
+
+
+class FanOutOutcome(enum.Enum):
+    SENT = 'sent'
+    CLOSED = 'DMs closed'
+    NOT_FOUND = 'user not found'
+    FAILED = 'failed'
+
+
+@dataclass(slots=True)
+class FanOutResult:
+    outcomes: dict[int, FanOutOutcome] = field(default_factory=dict)
+
+    @property
+    def sent(self) -> int:
+        """
+        The number of recipients the message was sent to.
+
+        Returns
+        -------
+        int
+            The number of recipients
+
+        """
+        return sum(outcome is FanOutOutcome.SENT for outcome in self.outcomes.values())
+
+    def summary(self) -> str:
+        """
+        Return a line counting the recipients by outcome.
+
+        Returns
+        -------
+        str
+            The summary
+
+        """
+        counts = Counter(self.outcomes.values())
+        return fmt_str(
+            (f'{count} {outcome.value}' for outcome, count in counts.most_common()),
+            seperator=', ',
+        )
+
+
+class DMFanOut:
+    """
+    Sends a message to many users with bounded concurrency.
+
+    Every message waits for a token from a bucket shared by all fan-outs, so several running at once
+    still stay under the DM rate. A recipient failing never stops the rest, its outcome is recorded
+    in the result instead.
+    """
+
+    def __init__(self, bot: Cyrene, *, concurrency: int = DM_CONCURRENCY) -> None:
+        self.bot = bot
+        self.concurrency = concurrency
+
+        self.budget = TokenBucket(DM_RATE, DM_BURST)
+        self._tasks: set[asyncio.Task[FanOutResult]] = set()
+
+        super().__init__()
+
+    async def _send_one(self, user_id: int, content: str, result: FanOutResult, slots: asyncio.Semaphore) -> None:
+        async with slots:
+            await self.budget.acquire()
+            try:
+                user = self.bot.get_user(user_id) or await self.bot.fetch_user(user_id)
+                await user.send(content)
+            except discord.NotFound:
+                result.outcomes[user_id] = FanOutOutcome.NOT_FOUND
+            except discord.Forbidden:
+                result.outcomes[user_id] = FanOutOutcome.CLOSED
+            except discord.HTTPException:
+                log.exception('Failed to DM %s', user_id)
+                result.outcomes[user_id] = FanOutOutcome.FAILED
+            else:
+                result.outcomes[user_id] = FanOutOutcome.SENT
+
+    async def send(self, user_ids: Iterable[int], content: str) -> FanOutResult:
+        """
+        DM a message to every user.
+
+        Parameters
+        ----------
+        user_ids : Iterable[int]
+            The IDs of the users
+        content : str
+            The message
+
+        Returns
+        -------
+        FanOutResult
+            The outcome for every user
+
+        """
+        result = FanOutResult()
+        slots = asyncio.Semaphore(self.concurrency)
+        async with asyncio.TaskGroup() as group:
+            for user_id in dict.fromkeys(user_ids):
+                group.create_task(self._send_one(user_id, content, result, slots))
+        return result
+
+    def start(
+        self,
+        user_ids: Iterable[int],
+        content: str,
+        *,
+        done: Callable[[FanOutResult], Awaitable[object]] | None = None,
+    ) -> asyncio.Task[FanOutResult]:
+        """
+        DM a message to every user in the background.
+
+        Parameters
+        ----------
+        user_ids : Iterable[int]
+            The IDs of the users
+        content : str
+            The message
+        done : Callable[[FanOutResult], Awaitable[object]] | None, optional
+            Called with the result once every message is sent, by default None
+
+        Returns
+        -------
+        asyncio.Task[FanOutResult]
+            The task sending the messages
+
+        """
+
+        async def run() -> FanOutResult:
+            result = await self.send(user_ids, content)
+            if done is not None:
+                await done(result)
+            return result
+
+        task = asyncio.create_task(run())
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return task
+
+    def close(self) -> None:
+        for task in self._tasks:
+            task.cancel()
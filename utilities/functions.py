@@ -1,6 +1,9 @@
 from __future__ import annotations
 
+import hashlib
 import traceback
+import zlib
+from pathlib import Path, PurePath
 from typing import TYPE_CHECKING, Any
 
 import discord
@@ -15,6 +18,10 @@ if TYPE_CHECKING:
 
 
 __all__ = (
+    'command_usage',
+    'compress_traceback',
+    'decompress_traceback',
+    'fingerprint_error',
     'fmt_str',
     'format_tb',
     'get_command_signature',
@@ -50,16 +57,90 @@ def format_tb(error: Exception) -> str:
     return ''.join(traceback.format_exception(type(error), error, error.__traceback__))
 
 
-def get_command_signature(ctx: CyContext, command: commands.Command[Any, ..., Any], /) -> str:
+PROJECT_ROOT = Path(__file__).parents[1]
+TRACEBACK_COMPRESSION_LEVEL = 9
+
+
+def _frame_path(filename: str) -> str:
+    # Install locations differ between machines, so only the path inside the package or project is kept
+    path = PurePath(filename)
+    if 'site-packages' in path.parts:
+        return '/'.join(path.parts[path.parts.index('site-packages') + 1 :])
+    if path.is_relative_to(PROJECT_ROOT):
+        return path.relative_to(PROJECT_ROOT).as_posix()
+    return path.name
+
+
+def fingerprint_error(error: BaseException) -> str:
     """
-    Retrieve the signature portion of the help page.
+    Fingerprint an error by its type and the frames of its traceback.
+
+    Line numbers and the message are left out, so the same bug gets the same fingerprint even when
+    the message contains IDs or values, or the code around it moved.
+
+    Parameters
+    ----------
+    error : BaseException
+        The error being fingerprinted
+
+    Returns
+    -------
+    str
+        The fingerprint
+
+    """
+    digest = hashlib.sha1(usedforsecurity=False)
+    digest.update(f'{type(error).__module__}.{type(error).__qualname__}'.encode())
+    for frame in traceback.extract_tb(error.__traceback__):
+        digest.update(f'\n{_frame_path(frame.filename)}:{frame.name}:{(frame.line or "").strip()}'.encode())
+    return digest.hexdigest()
+
+
+def compress_traceback(formatted: str) -> tuple[bytes, bytes]:
+    """
+    Compress a formatted traceback for storage.
+
+    Parameters
+    ----------
+    formatted : str
+        The formatted traceback
+
+    Returns
+    -------
+    tuple[bytes, bytes]
+        The SHA-256 of the traceback, which identical tracebacks share, and the compressed traceback
+
+    """
+    data = formatted.encode()
+    return hashlib.sha256(data).digest(), zlib.compress(data, TRACEBACK_COMPRESSION_LEVEL)
+
+
+def decompress_traceback(body: bytes) -> str:
+    """
+    Decompress a traceback compressed with `compress_traceback`.
+
+    Parameters
+    ----------
+    body : bytes
+        The compressed traceback
+
+    Returns
+    -------
+    str
+        The formatted traceback
+
+    """
+    return zlib.decompress(body).decode()
+
+
+def command_usage(command: commands.Command[Any, ..., Any], /) -> str:
+    """
+    Retrieve the signature portion of the help page, without the prefix.
 
     This is a modified copy of commands.HelpCommand.get_command_signature
 
     Parameters
     ----------
-    ctx: :class:`Context`
-        The context for this fetch.
     command: :class:`Command`
         The command to get the signature of.
 
@@ -81,4 +162,24 @@ def get_command_signature(ctx: CyContext, command: commands.Command[Any, ..., An
 
     alias = command.name if not parent_sig else parent_sig + ' ' + command.name
 
-    return f'{ctx.clean_prefix}{alias} {command.signature}'
+    return f'{alias} {command.signature}'.rstrip()
+
+
+def get_command_signature(ctx: CyContext, command: commands.Command[Any, ..., Any], /) -> str:
+    """
+    Retrieve the signature portion of the help page.
+
+    Parameters
+    ----------
+    ctx: :class:`Context`
+        The context for this fetch.
+    command: :class:`Command`
+        The command to get the signature of.
+
+    Returns
+    -------
+    :class:`str`
+        The signature for the command.
+
+    """
+    return f'{ctx.clean_prefix}{command_usage(command)}'
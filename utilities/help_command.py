@@ -1 +1,432 @@
-# TODO(Depreca1ed): Kms
+from __future__ import annotations
+
+import itertools
+import logging
+import operator
+import re
+from dataclasses import dataclass
+from typing import TYPE_CHECKING, Any, cast
+
+from cachetools import LRUCache
+from discord.ext import commands, menus
+
+from utilities.bktree import BKTree
+from utilities.embed import Embed
+from utilities.functions import command_usage, fmt_str
+from utilities.pagination import Paginator
+
+if TYPE_CHECKING:
+    from collections.abc import Callable, Mapping
+
+    from utilities.bases.bot import Cyrene
+    from utilities.bases.context import CyContext
+
+
+__all__ = (
+    'CyHelpCommand',
+    'HelpCache',
+    'HelpEntry',
+    'static_check',
+)
+
+log = logging.getLogger(__name__)
+
+HELP_PAGE_SIZE = 8
+HELP_RENDER_CACHE_SIZE = 64
+SEARCH_LIMIT = 10
+SEARCH_MIN_WORD = 3
+SEARCH_MAX_TOLERANCE = 2
+NO_CATEGORY = 'Other'
+# discord.py checks whose result only depends on the permission class
+STATIC_CHECKS = frozenset({'dm_only', 'guild_only', 'is_owner'})
+
+_WORD = re.compile(r'[a-z0-9]+')
+
+type PermissionClass = tuple[bool, bool, bool]
+
+
+def static_check[F: Callable[..., Any]](func: F) -> F:
+    """
+    Mark a check as only depending on the permission class, so the help command can cache its result.
+
+    Parameters
+    ----------
+    func : F
+        The check, a cog check or a global check
+
+    Returns
+    -------
+    F
+        The same check
+
+    """
+    setattr(func, '__help_static__', True)  # ruff: ignore[set-attr-with-constant]
+    return func
+
+
+def _is_static_check(check: Callable[..., Any]) -> bool:
+    if getattr(check, '__help_static__', False):
+        return True
+    return check.__module__ == 'discord.ext.commands.core' and check.__qualname__.split('.')[0] in STATIC_CHECKS
+
+
+@dataclass(slots=True)
+class HelpEntry:
+    command: commands.Command[Any, ..., Any]
+    category: str
+    usage: str
+    summary: str
+    search_text: str
+    static: bool
+
+    @property
+    def name(self) -> str:
+        """
+        The qualified name of the command.
+
+        Returns
+        -------
+        str
+            The qualified name
+
+        """
+        return self.command.qualified_name
+
+    def line(self, prefix: str) -> str:
+        """
+        Return the line listing the command on a help page.
+
+        Parameters
+        ----------
+        prefix : str
+            The prefix the command is invoked with
+
+        Returns
+        -------
+        str
+            The line
+
+        """
+        return f'- `{prefix}{self.usage}`\n  -# {self.summary}'
+
+
+class HelpPageSource(menus.ListPageSource):
+    def __init__(self, embeds: list[Embed]) -> None:
+        super().__init__(embeds, per_page=1)
+
+    async def format_page(self, menu: Paginator, embed: Embed) -> Embed:
+        embed.set_footer(text=f'Page {menu.current_page + 1}/{self.get_max_pages()}')
+        return embed
+
+
+class HelpCache:
+    """
+    Precomputed help for every command, shared by every invocation of the help command.
+
+    The usage, summary and searchable text of each command are worked out once whenever the
+    extensions are (re)loaded. Commands whose checks only depend on the permission class, whether
+    the invoker owns the bot, whether it is used in a guild and whether the bot is under maintenance,
+    are checked once per class. That is only assumed of the checks in `STATIC_CHECKS` and of the cog
+    and global checks marked with `static_check`, every other command is checked against the
+    invoker's context each time. The rendered pages are cached per class, prefix and the set of
+    those other commands the invoker can run.
+    """
+
+    def __init__(self, bot: Cyrene) -> None:
+        self.bot = bot
+
+        self.entries: dict[str, HelpEntry] = {}
+        self.categories: dict[str, list[HelpEntry]] = {}
+        self._words = BKTree[HelpEntry]()
+        self._runnable: dict[PermissionClass, set[str]] = {}
+        self._pages = LRUCache[tuple[PermissionClass, str, frozenset[str]], dict[str, list[Embed]]](
+            maxsize=HELP_RENDER_CACHE_SIZE
+        )
+
+        super().__init__()
+
+    def rebuild(self) -> None:
+        """Recompute the entries from the bot's commands and forget every rendering."""
+        self.entries.clear()
+        self.categories.clear()
+        self._words = BKTree[HelpEntry]()
+        self._runnable.clear()
+        self._pages.clear()
+
+        global_static = all(_is_static_check(check) for check in getattr(self.bot, '_checks', ()))
+        commands_ = sorted(
+            (command for command in self.bot.walk_commands() if not command.hidden),
+            key=lambda command: command.qualified_name,
+        )
+        for command in commands_:
+            summary = command.description or command.short_doc or 'No description provided.'
+            entry = HelpEntry(
+                command=command,
+                category=command.cog.qualified_name if command.cog else NO_CATEGORY,
+                usage=command_usage(command),
+                summary=summary,
+                search_text=fmt_str([command.qualified_name, *command.aliases, summary], seperator=' ').lower(),
+                static=global_static and self._has_static_checks(command),
+            )
+            self.entries[entry.name] = entry
+            self.categories.setdefault(entry.category, []).append(entry)
+            for word in set(_WORD.findall(entry.search_text)):
+                if len(word) >= SEARCH_MIN_WORD:
+                    self._words.add(word, entry)
+
+        log.debug('Built help for %s commands in %s categories', len(self.entries), len(self.categories))
+
+    @staticmethod
+    def _has_static_checks(command: commands.Command[Any, ..., Any]) -> bool:
+        cog: commands.Cog | None = command.cog
+        if cog is not None and type(cog).cog_check is not commands.Cog.cog_check and not _is_static_check(cog.cog_check):
+            return False
+        return all(_is_static_check(check) for check in command.checks)
+
+    async def permission_class(self, ctx: CyContext) -> PermissionClass:
+        """
+        Return the permission class of the invoker.
+
+        Parameters
+        ----------
+        ctx : CyContext
+            The context of the help command
+
+        Returns
+        -------
+        PermissionClass
+            Whether they own the bot, whether it is used in a guild and whether the bot is under maintenance
+
+        """
+        return (await self.bot.is_owner(ctx.author), ctx.guild is not None, self.bot.maintenance)
+
+    async def runnable(self, ctx: CyContext) -> set[str]:
+        """
+        Return the qualified names of the commands the invoker can run.
+
+        Parameters
+        ----------
+        ctx : CyContext
+            The context of the help command
+
+        Returns
+        -------
+        set[str]
+            The qualified names
+
+        """
+        return await self._static_runnable(ctx) | await self._dynamic_runnable(ctx)
+
+    @staticmethod
+    async def _can_run(entry: HelpEntry, ctx: CyContext) -> bool:
+        try:
+            return await entry.command.can_run(ctx)
+        except commands.CommandError:
+            return False
+
+    async def _static_runnable(self, ctx: CyContext) -> set[str]:
+        key = await self.permission_class(ctx)
+        names = self._runnable.get(key)
+        if names is None:
+            names = {name for name, entry in self.entries.items() if entry.static and await self._can_run(entry, ctx)}
+            self._runnable[key] = names
+        return names
+
+    async def _dynamic_runnable(self, ctx: CyContext) -> frozenset[str]:
+        return frozenset([
+            name for name, entry in self.entries.items() if not entry.static and await self._can_run(entry, ctx)
+        ])
+
+    def _render(self, entries: list[HelpEntry], category: str, prefix: str) -> list[Embed]:
+        cog = self.bot.get_cog(category)
+        embeds: list[Embed] = []
+        for chunk in itertools.batched(entries, HELP_PAGE_SIZE):
+            embed = Embed(
+                title=category,
+                description=fmt_str(
+                    [cog.description if cog else None, *(entry.line(prefix) for entry in chunk)],
+                    seperator='\n',
+                ),
+            )
+            embeds.append(embed)
+        return embeds
+
+    async def pages(self, ctx: CyContext) -> dict[str, list[Embed]]:
+        """
+        Return the help pages of every category the invoker can run a command from.
+
+        Parameters
+        ----------
+        ctx : CyContext
+            The context of the help command
+
+        Returns
+        -------
+        dict[str, list[Embed]]
+            The pages of each category
+
+        """
+        dynamic = await self._dynamic_runnable(ctx)
+        key = (await self.permission_class(ctx), ctx.clean_prefix, dynamic)
+        pages = self._pages.get(key)
+        if pages is None:
+            runnable = await self._static_runnable(ctx) | dynamic
+            pages = {}
+            for category, entries in self.categories.items():
+                allowed = [entry for entry in entries if entry.name in runnable]
+                if allowed:
+                    pages[category] = self._render(allowed, category, ctx.clean_prefix)
+            self._pages[key] = pages
+        # The paginator sets footers on the embeds, copies keep the cached ones untouched
+        return {category: [embed.copy() for embed in embeds] for category, embeds in pages.items()}
+
+    async def search(self, ctx: CyContext, query: str) -> list[HelpEntry]:
+        """
+        Search the commands the invoker can run.
+
+        Commands whose name, aliases or description contain the query come first, followed by the
+        commands with words close to the words of the query.
+
+        Parameters
+        ----------
+        ctx : CyContext
+            The context of the help command
+        query : str
+            The search query
+
+        Returns
+        -------
+        list[HelpEntry]
+            The best matches, best first
+
+        """
+        runnable = await self.runnable(ctx)
+        query = query.lower().strip()
+
+        scores: dict[str, int] = {}
+        for name, entry in self.entries.items():
+            if name in runnable and query in entry.search_text:
+                scores[name] = 0
+
+        for word in set(_WORD.findall(query)):
+            if len(word) < SEARCH_MIN_WORD:
+                continue
+            tolerance = min(len(word) // 4, SEARCH_MAX_TOLERANCE)
+            for distance, _, entry in self._words.search(word, tolerance):
+                if entry.name in runnable and entry.name not in scores:
+                    scores[entry.name] = distance + 1
+
+        ranked = sorted(scores.items(), key=operator.itemgetter(1, 0))
+        return [self.entries[name] for name, _ in ranked[:SEARCH_LIMIT]]
+
+
+class CyHelpCommand(commands.HelpCommand):
+    """
+    The help command, rendered from the bot's `HelpCache`.
+
+    discord.py copies the help command for every invocation, so nothing is cached on the instance.
+    """
+
+    def __init__(self) -> None:
+        super().__init__(
+            command_attrs={
+                'help': 'Shows help about the bot, a category or a command, or searches the commands',
+                'aliases': ['h'],
+            }
+        )
+
+    @property
+    def ctx(self) -> CyContext:
+        """
+        The context of the invocation.
+
+        Returns
+        -------
+        CyContext
+            The context
+
+        """
+        return cast('CyContext', self.context)
+
+    @property
+    def cache(self) -> HelpCache:
+        """
+        The bot's help cache.
+
+        Returns
+        -------
+        HelpCache
+            The help cache
+
+        """
+        return self.ctx.bot.help_cache
+
+    async def _entry_embed(self, command: commands.Command[Any, ..., Any]) -> Embed:
+        entry = self.cache.entries.get(command.qualified_name)
+        usage = entry.usage if entry else command_usage(command)
+        embed = Embed(
+            title=f'{self.ctx.clean_prefix}{usage}',
+            description=command.help or (entry.summary if entry else None),
+        )
+        if command.aliases:
+            embed.add_field(name='Aliases', value=fmt_str((f'`{alias}`' for alias in command.aliases), seperator=', '))
+        return embed
+
+    async def command_callback(self, ctx: CyContext, /, *, command: str | None = None) -> None:
+        if command is None or ctx.bot.get_cog(command) is not None or ctx.bot.get_command(command) is not None:
+            await super().command_callback(ctx, command=command)
+            return
+
+        await self.prepare_help_command(ctx, command)
+        query = self.remove_mentions(command)
+        matches = await self.cache.search(ctx, command)
+        if not matches:
+            await self.send_error_message(f'No command matching "{query}" was found.')
+            return
+
+        embed = Embed(
+            title=f'Commands matching "{query}"',
+            description=fmt_str((entry.line(ctx.clean_prefix) for entry in matches), seperator='\n'),
+        )
+        await self.get_destination().send(embed=embed)
+
+    async def send_bot_help(
+        self,
+        mapping: Mapping[commands.Cog | None, list[commands.Command[Any, ..., Any]]],  # ruff: ignore[unused-method-argument]
+        /,
+    ) -> None:
+        pages = await self.cache.pages(self.ctx)
+        await Paginator(HelpPageSource([embed for embeds in pages.values() for embed in embeds]), ctx=self.ctx).start()
+
+    async def send_cog_help(self, cog: commands.Cog, /) -> None:
+        pages = await self.cache.pages(self.ctx)
+        embeds = pages.get(cog.qualified_name)
+        if not embeds:
+            await self.send_error_message(self.command_not_found(cog.qualified_name))
+            return
+        await Paginator(HelpPageSource(embeds), ctx=self.ctx).start()
+
+    async def send_command_help(self, command: commands.Command[Any, ..., Any], /) -> None:
+        if command.qualified_name not in await self.cache.runnable(self.ctx):
+            await self.send_error_message(self.command_not_found(command.qualified_name))
+            return
+        await self.get_destination().send(embed=await self._entry_embed(command))
+
+    async def send_group_help(self, group: commands.Group[Any, ..., Any], /) -> None:
+        runnable = await self.cache.runnable(self.ctx)
+        if group.qualified_name not in runnable:
+            await self.send_error_message(self.command_not_found(group.qualified_name))
+            return
+
+        embed = await self._entry_embed(group)
+        subcommands = [
+            self.cache.entries[command.qualified_name].line(self.ctx.clean_prefix)
+            for command in sorted(group.commands, key=lambda command: command.name)
+            if command.qualified_name in runnable
+        ]
+        if subcommands:
+            embed.add_field(name='Subcommands', value=fmt_str(subcommands, seperator='\n'))
+        await self.get_destination().send(embed=embed)
+
+    async def send_error_message(self, error: str, /) -> None:
+        await self.ctx.reply(error)
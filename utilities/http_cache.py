@@ -0,0 +1,240 @@
+from __future__ import annotations
+
+import asyncio
+import contextlib
+import logging
+import sqlite3
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import TYPE_CHECKING, Any
+
+if TYPE_CHECKING:
+    from collections.abc import Callable
+    from pathlib import Path
+
+
+__all__ = (
+    'CachedResponse',
+    'HTTPCache',
+)
+
+log = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS responses (
+        key TEXT PRIMARY KEY,
+        body BLOB NOT NULL,
+        etag TEXT,
+        last_modified TEXT,
+        stored_at REAL NOT NULL,
+        accessed_at REAL NOT NULL,
+        size INTEGER NOT NULL
+);
+
+CREATE INDEX IF NOT EXISTS responses_accessed_at_idx ON responses (accessed_at);
+"""
+
+
+@dataclass
+class CachedResponse:
+    body: bytes
+    etag: str | None
+    last_modified: str | None
+    stored_at: float
+
+    @property
+    def age(self) -> float:
+        """
+        The seconds since this response was stored or last revalidated.
+
+        Returns
+        -------
+        float
+            The age of the response
+
+        """
+        return time.time() - self.stored_at
+
+    def validators(self) -> dict[str, str]:
+        """
+        Return the headers to revalidate this response with.
+
+        Returns
+        -------
+        dict[str, str]
+            The conditional request headers
+
+        """
+        headers: dict[str, str] = {}
+        if self.etag:
+            headers['If-None-Match'] = self.etag
+        if self.last_modified:
+            headers['If-Modified-Since'] = self.last_modified
+        return headers
+
+
+class HTTPCache:
+    """
+    A bounded on-disk cache of HTTP response bodies, backed by SQLite.
+
+    Entries keep their ETag and Last-Modified headers so they can be revalidated with a conditional
+    request. Once the bodies grow past `max_size` bytes, the least recently accessed ones are evicted.
+
+    SQLite calls are blocking, so they all run in a single worker thread which also serialises them.
+    The cache is only an optimisation, so a locked, full or corrupt database is logged and treated as
+    a miss instead of failing the request.
+    """
+
+    def __init__(self, path: Path, *, max_size: int = 64 * 1024 * 1024) -> None:
+        self.path = path
+        self.max_size = max_size
+
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='http-cache')
+        self._conn: sqlite3.Connection | None = None
+        self._size = 0
+        self._failing = False
+
+        super().__init__()
+
+    async def _run[T](self, func: Callable[..., T], *args: Any) -> T:
+        return await asyncio.get_running_loop().run_in_executor(self._executor, func, *args)
+
+    def _rollback(self) -> None:
+        if self._conn is not None:
+            with contextlib.suppress(sqlite3.Error):
+                self._conn.rollback()
+
+    async def _run_safely[T, D](self, func: Callable[..., T], *args: Any, default: D) -> T | D:
+        try:
+            result = await self._run(func, *args)
+        except sqlite3.Error:
+            # Logged once until the cache works again, a broken file would fail every request otherwise
+            if not self._failing:
+                log.exception('The HTTP cache at %s failed, requests skip it until it recovers', self.path)
+            self._failing = True
+            await self._run(self._rollback)
+            return default
+        self._failing = False
+        return result
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            self._conn = sqlite3.connect(self.path, check_same_thread=False)
+            self._conn.execute('PRAGMA journal_mode = WAL')
+            self._conn.executescript(SCHEMA)
+            self._size = self._conn.execute('SELECT COALESCE(SUM(size), 0) FROM responses').fetchone()[0]
+        return self._conn
+
+    def _get(self, key: str) -> CachedResponse | None:
+        conn = self._connect()
+        row = conn.execute(
+            'SELECT body, etag, last_modified, stored_at FROM responses WHERE key = ?',
+            (key,),
+        ).fetchone()
+        if row is None:
+            return None
+
+        conn.execute('UPDATE responses SET accessed_at = ? WHERE key = ?', (time.time(), key))
+        conn.commit()
+        return CachedResponse(body=row[0], etag=row[1], last_modified=row[2], stored_at=row[3])
+
+    def _put(self, key: str, body: bytes, etag: str | None, last_modified: str | None) -> None:
+        conn = self._connect()
+        now = time.time()
+
+        previous = conn.execute('SELECT size FROM responses WHERE key = ?', (key,)).fetchone()
+        conn.execute(
+            'INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?, ?)',
+            (key, body, etag, last_modified, now, now, len(body)),
+        )
+        self._size += len(body) - (previous[0] if previous else 0)
+
+        if self._size > self.max_size:
+            evicted: list[tuple[str]] = []
+            for evict_key, size in conn.execute('SELECT key, size FROM responses ORDER BY accessed_at'):
+                if self._size <= self.max_size:
+                    break
+                evicted.append((evict_key,))
+                self._size -= size
+            conn.executemany('DELETE FROM responses WHERE key = ?', evicted)
+
+        conn.commit()
+
+    def _delete(self, key: str) -> None:
+        conn = self._connect()
+        row = conn.execute('DELETE FROM responses WHERE key = ? RETURNING size', (key,)).fetchone()
+        if row is not None:
+            self._size -= row[0]
+        conn.commit()
+
+    def _touch(self, key: str) -> None:
+        conn = self._connect()
+        now = time.time()
+        conn.execute('UPDATE responses SET stored_at = ?, accessed_at = ? WHERE key = ?', (now, now, key))
+        conn.commit()
+
+    async def get(self, key: str) -> CachedResponse | None:
+        """
+        Get a cached response.
+
+        Parameters
+        ----------
+        key : str
+            The key of the response, usually the URL
+
+        Returns
+        -------
+        CachedResponse | None
+            The cached response, if any
+
+        """
+        return await self._run_safely(self._get, key, default=None)
+
+    async def put(self, key: str, body: bytes, *, etag: str | None = None, last_modified: str | None = None) -> None:
+        """
+        Store a response, evicting the least recently accessed ones if the cache is full.
+
+        Parameters
+        ----------
+        key : str
+            The key of the response, usually the URL
+        body : bytes
+            The body of the response
+        etag : str | None, optional
+            The ETag header of the response, by default None
+        last_modified : str | None, optional
+            The Last-Modified header of the response, by default None
+
+        """
+        await self._run_safely(self._put, key, body, etag, last_modified, default=None)
+
+    async def touch(self, key: str) -> None:
+        """
+        Mark a response as fresh after it has been revalidated.
+
+        Parameters
+        ----------
+        key : str
+            The key of the response, usually the URL
+
+        """
+        await self._run_safely(self._touch, key, default=None)
+
+    async def delete(self, key: str) -> None:
+        """
+        Remove a response, such as one which can no longer be decoded.
+
+        Parameters
+        ----------
+        key : str
+            The key of the response, usually the URL
+
+        """
+        await self._run_safely(self._delete, key, default=None)
+
+    def close(self) -> None:
+        if self._conn is not None:
+            self._executor.submit(self._conn.close)
+        self._executor.shutdown(wait=False)
@@ -0,0 +1,194 @@
+from __future__ import annotations
+
+import asyncio
+import contextlib
+import hashlib
+import logging
+import os
+import tempfile
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import TYPE_CHECKING, Any
+
+from utilities.imaging import download
+
+if TYPE_CHECKING:
+    from collections.abc import Callable
+
+    import aiohttp
+
+
+__all__ = ('ImageCache',)
+
+log = logging.getLogger(__name__)
+
+
+class ImageCache:
+    """
+    A content addressed on-disk cache of downloaded images.
+
+    Files are named after the SHA-256 of their URL and sharded into two levels of directories by the
+    first bytes of the hash, so no directory grows too large. The index keeps only the raw digests and
+    sizes in least recently used order, and evicts from the front once the files grow past `max_size`
+    bytes. It is rebuilt on startup from the modification times of the files, which every hit bumps.
+    """
+
+    def __init__(self, path: Path, *, max_size: int = 256 * 1024 * 1024) -> None:
+        self.path = path
+        self.max_size = max_size
+
+        self._index: OrderedDict[bytes, int] = OrderedDict()
+        self._size = 0
+        self._executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix='image-cache')
+
+        super().__init__()
+
+    def __len__(self) -> int:
+        return len(self._index)
+
+    @property
+    def size(self) -> int:
+        """
+        The total size of the cached files.
+
+        Returns
+        -------
+        int
+            The size in bytes
+
+        """
+        return self._size
+
+    async def _run[T](self, func: Callable[..., T], *args: Any) -> T:
+        return await asyncio.get_running_loop().run_in_executor(self._executor, func, *args)
+
+    def _file(self, digest: bytes) -> Path:
+        name = digest.hex()
+        return self.path / name[:2] / name[2:4] / name
+
+    def _scan(self) -> list[tuple[float, bytes, int]]:
+        entries: list[tuple[float, bytes, int]] = []
+        for file in self.path.glob('*/*/*'):
+            try:
+                digest = bytes.fromhex(file.name)
+                stat = file.stat()
+            except (ValueError, OSError):
+                continue  # Leftover temporary files or files removed mid-scan
+            entries.append((stat.st_mtime, digest, stat.st_size))
+        return sorted(entries)
+
+    async def load(self) -> None:
+        """Rebuild the index from the files on disk."""
+        entries = await self._run(self._scan)
+        self._index = OrderedDict((digest, size) for _, digest, size in entries)
+        self._size = sum(self._index.values())
+        log.info('Loaded %s cached images, %s bytes', len(self._index), self._size)
+
+    def _read(self, file: Path) -> bytes | None:
+        try:
+            data = file.read_bytes()
+            os.utime(file)
+        except FileNotFoundError:
+            return None
+        return data
+
+    def _write(self, file: Path, data: bytes) -> None:
+        file.parent.mkdir(parents=True, exist_ok=True)
+        # Written to a temporary file first so a crash never leaves a partial image behind
+        fd, temp = tempfile.mkstemp(dir=file.parent, suffix='.tmp')
+        with os.fdopen(fd, 'wb') as fp:
+            fp.write(data)
+        Path(temp).replace(file)
+
+    def _delete(self, files: list[Path]) -> None:
+        for file in files:
+            with contextlib.suppress(FileNotFoundError):
+                file.unlink()
+
+    async def get(self, url: str) -> bytes | None:
+        """
+        Get a cached image.
+
+        Parameters
+        ----------
+        url : str
+            The URL of the image
+
+        Returns
+        -------
+        bytes | None
+            The image, if it is cached
+
+        """
+        digest = hashlib.sha256(url.encode()).digest()
+        if digest not in self._index:
+            return None
+
+        data = await self._run(self._read, self._file(digest))
+        if data is None:
+            # Removed from outside, forget about it
+            self._size -= self._index.pop(digest, 0)
+            return None
+
+        if digest in self._index:
+            self._index.move_to_end(digest)
+        return data
+
+    async def put(self, url: str, data: bytes) -> None:
+        """
+        Cache an image, evicting the least recently used ones if the cache is full.
+
+        Parameters
+        ----------
+        url : str
+            The URL of the image
+        data : bytes
+            The image
+
+        """
+        if len(data) > self.max_size:
+            return
+
+        digest = hashlib.sha256(url.encode()).digest()
+        await self._run(self._write, self._file(digest), data)
+
+        self._size += len(data) - self._index.pop(digest, 0)
+        self._index[digest] = len(data)
+
+        evicted: list[Path] = []
+        while self._size > self.max_size:
+            evicted_digest, size = self._index.popitem(last=False)
+            self._size -= size
+            evicted.append(self._file(evicted_digest))
+        if evicted:
+            await self._run(self._delete, evicted)
+
+    async def fetch(self, session: aiohttp.ClientSession, url: str, *, limit: int = 20 * 1024 * 1024) -> bytes:
+        """
+        Get an image from the cache, downloading and caching it on a miss.
+
+        Parameters
+        ----------
+        session : aiohttp.ClientSession
+            The session to download with
+        url : str
+            The URL of the image
+        limit : int, optional
+            The maximum size of the image in bytes, by default 20MiB
+
+        Returns
+        -------
+        bytes
+            The image
+
+        """
+        if (data := await self.get(url)) is not None:
+            return data
+
+        data = await download(session, url, limit=limit)
+        await self.put(url, data)
+        return data
+
+    def close(self) -> None:
+        self._executor.shutdown(wait=False)
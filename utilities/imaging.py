@@ -0,0 +1,230 @@
+from __future__ import annotations
+
+import math
+from io import BytesIO
+from pathlib import Path
+from typing import TYPE_CHECKING
+
+import numpy as np
+from PIL import Image, ImageDraw, ImageFont, ImageOps
+
+if TYPE_CHECKING:
+    import aiohttp
+
+
+__all__ = (
+    'HASH_BITS',
+    'ImageTooLargeError',
+    'compose_grid',
+    'dhash',
+    'download',
+    'hamming',
+    'render_sparklines',
+    'to_signed',
+    'to_unsigned',
+)
+
+HASH_SIZE = 8
+HASH_BITS = HASH_SIZE * HASH_SIZE
+DOWNSCALE_SIZE = 256  # Decoding a thumbnail first keeps resizing huge images cheap
+
+FONTS_PATH = Path(__file__).parents[1] / 'assets' / 'fonts'
+LABEL_FONT = FONTS_PATH / 'DejaVuSans-Bold.ttf'
+GRID_BACKGROUND = (30, 31, 34)
+GRID_GAP = 4
+
+SPARKLINE_WIDTH = 600
+SPARKLINE_HEIGHT = 56
+SPARKLINE_LABEL_WIDTH = 200
+SPARKLINE_PADDING = 8
+SPARKLINE_COLOUR = (130, 170, 255)
+SPARKLINE_FILL = (130, 170, 255, 48)
+
+
+class ImageTooLargeError(ValueError):
+    def __init__(self, url: str, limit: int) -> None:
+        super().__init__(f'{url} is larger than {limit} bytes')
+
+
+async def download(session: aiohttp.ClientSession, url: str, *, limit: int = 20 * 1024 * 1024) -> bytes:
+    """
+    Download an image, refusing to read more than `limit` bytes.
+
+    Parameters
+    ----------
+    session : aiohttp.ClientSession
+        The session to download with
+    url : str
+        The URL of the image
+    limit : int, optional
+        The maximum size of the image in bytes, by default 20MiB
+
+    Returns
+    -------
+    bytes
+        The image
+
+    Raises
+    ------
+    ImageTooLargeError
+        Raised when the image is larger than the limit
+
+    """
+    async with session.get(url) as resp:
+        resp.raise_for_status()
+        if resp.content_length and resp.content_length > limit:
+            raise ImageTooLargeError(url, limit)
+
+        buffer = bytearray()
+        async for chunk in resp.content.iter_chunked(64 * 1024):
+            buffer.extend(chunk)
+            if len(buffer) > limit:
+                raise ImageTooLargeError(url, limit)
+
+    return bytes(buffer)
+
+
+def dhash(data: bytes) -> int:
+    """
+    Compute the difference hash of an image.
+
+    This is CPU bound and meant to be run in a process pool.
+
+    Parameters
+    ----------
+    data : bytes
+        The image
+
+    Returns
+    -------
+    int
+        The unsigned 64 bit hash
+
+    """
+    with Image.open(BytesIO(data)) as image:
+        image.draft('L', (DOWNSCALE_SIZE, DOWNSCALE_SIZE))
+        grey = image.convert('L').resize((HASH_SIZE + 1, HASH_SIZE), Image.Resampling.LANCZOS)
+
+    pixels = np.asarray(grey, dtype=np.int16)
+    bits = pixels[:, 1:] > pixels[:, :-1]
+    return int.from_bytes(np.packbits(bits).tobytes(), 'big')
+
+
+def compose_grid(tiles: list[tuple[str, bytes | None]], tile_size: int) -> bytes:
+    """
+    Compose images into a square collage with a label on every tile.
+
+    This is CPU bound and meant to be run in a process pool.
+
+    Parameters
+    ----------
+    tiles : list[tuple[str, bytes | None]]
+        The labels and images of the tiles, a tile without an image is left blank
+    tile_size : int
+        The width and height of every tile
+
+    Returns
+    -------
+    bytes
+        The collage as a JPEG
+
+    """
+    columns = math.ceil(math.sqrt(len(tiles))) or 1
+    rows = math.ceil(len(tiles) / columns) or 1
+    step = tile_size + GRID_GAP
+
+    canvas = Image.new('RGB', (columns * step + GRID_GAP, rows * step + GRID_GAP), GRID_BACKGROUND)
+    draw = ImageDraw.Draw(canvas, 'RGBA')
+    font = ImageFont.truetype(LABEL_FONT, size=max(tile_size // 10, 10))
+
+    for index, (label, data) in enumerate(tiles):
+        x = GRID_GAP + (index % columns) * step
+        y = GRID_GAP + (index // columns) * step
+
+        if data is not None:
+            try:
+                with Image.open(BytesIO(data)) as image:
+                    image.draft('RGB', (tile_size, tile_size))
+                    canvas.paste(ImageOps.fit(image.convert('RGB'), (tile_size, tile_size)), (x, y))
+            except OSError:
+                pass  # Undecodable images are left blank like missing ones
+
+        left, top, right, bottom = draw.textbbox((0, 0), label, font=font)
+        padding = 3
+        bar_height = bottom - top + padding * 2
+        draw.rectangle((x, y + tile_size - bar_height, x + tile_size, y + tile_size), fill=(0, 0, 0, 160))
+        draw.text(
+            (x + (tile_size - (right - left)) // 2, y + tile_size - bar_height + padding - top),
+            label,
+            font=font,
+            fill=(255, 255, 255),
+        )
+
+    buffer = BytesIO()
+    canvas.save(buffer, 'JPEG', quality=85)
+    return buffer.getvalue()
+
+
+def render_sparklines(series: list[tuple[str, list[float]]]) -> bytes:
+    """
+    Draw every series as a sparkline on its own row, each scaled between its own minimum and maximum.
+
+    This is CPU bound and meant to be run in a process pool.
+
+    Parameters
+    ----------
+    series : list[tuple[str, list[float]]]
+        The label and values of every row, oldest value first
+
+    Returns
+    -------
+    bytes
+        The chart as a PNG
+
+    """
+    row_height = SPARKLINE_HEIGHT + SPARKLINE_PADDING
+    width = SPARKLINE_LABEL_WIDTH + SPARKLINE_WIDTH + SPARKLINE_PADDING * 2
+    canvas = Image.new('RGB', (width, len(series) * row_height + SPARKLINE_PADDING), GRID_BACKGROUND)
+    draw = ImageDraw.Draw(canvas, 'RGBA')
+    font = ImageFont.truetype(LABEL_FONT, size=13)
+
+    for row, (label, values) in enumerate(series):
+        top = SPARKLINE_PADDING + row * row_height
+        bottom = top + SPARKLINE_HEIGHT
+        left = SPARKLINE_LABEL_WIDTH + SPARKLINE_PADDING
+        right = left + SPARKLINE_WIDTH
+
+        draw.multiline_text((SPARKLINE_PADDING, top), label, font=font, fill=(255, 255, 255))
+        draw.rectangle((left, top, right, bottom), outline=(60, 62, 68))
+        if not values:
+            continue
+
+        low, high = min(values), max(values)
+        spread = (high - low) or 1
+        step = SPARKLINE_WIDTH / max(len(values) - 1, 1)
+        points = [
+            (left + index * step, bottom - (value - low) / spread * (SPARKLINE_HEIGHT - 2) - 1)
+            for index, value in enumerate(values)
+        ]
+        if len(points) == 1:
+            points.append((right, points[0][1]))
+
+        draw.polygon([(points[0][0], bottom), *points, (points[-1][0], bottom)], fill=SPARKLINE_FILL)
+        draw.line(points, fill=SPARKLINE_COLOUR, width=2)
+
+    buffer = BytesIO()
+    canvas.save(buffer, 'PNG', optimize=True)
+    return buffer.getvalue()
+
+
+def hamming(a: int, b: int) -> int:
+    return (a ^ b).bit_count()
+
+
+# Postgres has no unsigned 64 bit integer, so hashes are stored as a signed BIGINT
+def to_signed(value: int) -> int:
+    return value - (1 << HASH_BITS) if value >= 1 << (HASH_BITS - 1) else value
+
+
+def to_unsigned(value: int) -> int:
+    return value & ((1 << HASH_BITS) - 1)
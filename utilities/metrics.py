@@ -0,0 +1,118 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+from dataclasses import dataclass
+from typing import TYPE_CHECKING
+
+import psutil
+from jishaku.math import natural_size
+
+from utilities.ringbuffer import RingBuffer
+
+if TYPE_CHECKING:
+    from collections.abc import Callable
+
+    from utilities.bases.bot import Cyrene
+
+
+__all__ = (
+    'METRICS',
+    'Metric',
+    'MetricsSampler',
+)
+
+log = logging.getLogger(__name__)
+
+SAMPLE_INTERVAL = 5.0
+HISTORY_SECONDS = 60 * 60
+
+
+@dataclass(slots=True, frozen=True)
+class Metric:
+    key: str
+    label: str
+    fmt: Callable[[float], str]
+
+
+METRICS = (
+    Metric('rss', 'Memory', lambda value: natural_size(int(value))),
+    Metric('cpu', 'CPU', lambda value: f'{value:.1f}%'),
+    Metric('fds', 'Open files', lambda value: f'{value:.0f}'),
+    Metric('lag', 'Event loop lag', lambda value: f'{value:.1f}ms'),
+    Metric('tasks', 'Tasks', lambda value: f'{value:.0f}'),
+    Metric('pool', 'Pool connections', lambda value: f'{value:.0f}'),
+)
+
+
+class MetricsSampler:
+    """
+    Samples the bot's process every few seconds into fixed-size ring buffers.
+
+    Enough samples are kept to cover the last hour. The event loop lag is how late the sampler
+    wakes up from its sleep, so it also reflects anything blocking the loop.
+    """
+
+    def __init__(self, bot: Cyrene, *, interval: float = SAMPLE_INTERVAL, history: float = HISTORY_SECONDS) -> None:
+        self.bot = bot
+        self.interval = interval
+
+        self.process = psutil.Process()
+        self.total_memory = psutil.virtual_memory().total
+        self.samples = {metric.key: RingBuffer(int(history // interval)) for metric in METRICS}
+        self._task: asyncio.Task[None] | None = None
+
+        super().__init__()
+
+    def start(self) -> None:
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    def close(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+
+    def latest(self, key: str) -> float | None:
+        """
+        Return the latest sample of a metric.
+
+        Parameters
+        ----------
+        key : str
+            The key of the metric
+
+        Returns
+        -------
+        float | None
+            The sample, if anything has been sampled yet
+
+        """
+        values = self.samples[key].values(1)
+        return values[0] if values else None
+
+    def _sample(self, lag: float) -> None:
+        with self.process.oneshot():
+            rss = self.process.memory_info().rss
+            cpu = self.process.cpu_percent()
+            fds = self.process.num_fds()
+
+        pool = getattr(self.bot, 'pool', None)
+        in_use = pool.get_size() - pool.get_idle_size() if pool is not None else 0
+
+        self.samples['rss'].append(rss)
+        self.samples['cpu'].append(cpu)
+        self.samples['fds'].append(fds)
+        self.samples['lag'].append(lag * 1000)
+        self.samples['tasks'].append(len(asyncio.all_tasks()))
+        self.samples['pool'].append(in_use)
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        self.process.cpu_percent()  # The first call only starts measuring
+        while True:
+            started = loop.time()
+            await asyncio.sleep(self.interval)
+            try:
+                self._sample(max(loop.time() - started - self.interval, 0))
+            except psutil.Error:
+                log.exception('Failed to sample the process')
@@ -1,17 +1,31 @@
 from __future__ import annotations
 
-from typing import TYPE_CHECKING, Any, Self
+import math
+import re
+from collections import OrderedDict
+from typing import TYPE_CHECKING, Any, ClassVar, Self, cast
 
 import discord
+from cachetools import TTLCache
+from discord.ext import menus
 
 from .view import BaseView
 
 if TYPE_CHECKING:
-    from discord.ext import menus
+    from collections.abc import Iterable, Sequence
+
+    from asyncpg import Pool, Record
 
     from utilities.bases.context import CyContext
 
-__all__ = ('Paginator',)
+__all__ = (
+    'Paginator',
+    'QueryPageSource',
+)
+
+COUNT_CACHE_SIZE = 256
+COUNT_CACHE_TTL = 60
+WINDOW_PAGES = 5
 
 
 class SkipToModal(discord.ui.Modal, title='Skip to page...'):
@@ -31,6 +45,210 @@ class SkipToModal(discord.ui.Modal, title='Skip to page...'):
         self.value = self.page.value
 
 
+class QueryPageSource[T](menus.PageSource):
+    """
+    A page source which pages through the results of a query with keyset pagination.
+
+    A page is fetched with `WHERE (key) > (key of the last row before it)`, so it costs the same no
+    matter how deep into the results it is. Only the last `window` pages are kept in memory, along with
+    the key each reached page starts after, and jumping past the reached pages only skips over keys.
+    The results are counted once and the count is cached briefly, since counting is the expensive part.
+
+    `key` has to be unique and ordered by an index for the pages to be cheap, and its columns have to
+    be part of `select`. Subclasses override `convert` to page through something other than records.
+    """
+
+    _counts: ClassVar[TTLCache[tuple[str, ...], int]] = TTLCache[tuple[str, ...], int](
+        maxsize=COUNT_CACHE_SIZE, ttl=COUNT_CACHE_TTL
+    )
+
+    def __init__(
+        self,
+        pool: Pool[Record],
+        *,
+        select: str,
+        source: str,
+        conditions: Sequence[str] = (),
+        args: Sequence[Any] = (),
+        key: Sequence[str] = ('id',),
+        per_page: int,
+        chunk: int = 1,
+        window: int = WINDOW_PAGES,
+    ) -> None:
+        self.pool = pool
+        self.select = select
+        self.source = source
+        self.conditions = list(conditions)
+        self.args = list(args)
+        self.key = tuple(key)
+        self.per_page = per_page
+        self.chunk = chunk
+        self.window = max(window, chunk)
+
+        self._count = 0
+        self._pages: OrderedDict[int, list[T]] = OrderedDict()
+        self._starts: dict[int, tuple[Any, ...] | None] = {0: None}
+
+        super().__init__()
+
+    @property
+    def count(self) -> int:
+        """
+        The number of results.
+
+        Returns
+        -------
+        int
+            The number of results
+
+        """
+        return self._count
+
+    def convert(self, record: Record) -> T:
+        """
+        Convert a row into an entry.
+
+        Parameters
+        ----------
+        record : Record
+            The row
+
+        Returns
+        -------
+        T
+            The entry
+
+        """
+        return cast('T', record)
+
+    def _where(self, start: tuple[Any, ...] | None) -> tuple[str, list[Any]]:
+        conditions = self.conditions.copy()
+        args = self.args.copy()
+        if start is not None:
+            placeholders: list[str] = []
+            for value in start:
+                args.append(value)
+                placeholders.append(f'${len(args)}')
+            conditions.append(f'({", ".join(self.key)}) > ({", ".join(placeholders)})')
+        return (f'WHERE {" AND ".join(conditions)}' if conditions else ''), args
+
+    def _key_of(self, record: Record) -> tuple[Any, ...]:
+        return tuple(record[column.rpartition('.')[2]] for column in self.key)
+
+    async def _fetch_count(self, *, cached: bool = True) -> int:
+        where, args = self._where(None)
+        cache_key = (self.source, where, repr(args))
+        if cached and (cached_count := self._counts.get(cache_key)) is not None:
+            return cached_count
+
+        count: int = await self.pool.fetchval(f"""SELECT COUNT(*) FROM {self.source} {where}""", *args)
+        self._counts[cache_key] = count
+        return count
+
+    async def _start_of(self, page_number: int) -> tuple[Any, ...] | None:
+        if page_number in self._starts:
+            return self._starts[page_number]
+
+        # Rows between the furthest page reached before this one and this page are skipped by their keys alone
+        known = max(page for page in self._starts if page < page_number)
+        where, args = self._where(self._starts[known])
+        args.append((page_number - known) * self.per_page - 1)
+        key = ', '.join(self.key)
+        record = await self.pool.fetchrow(
+            f"""SELECT {key} FROM {self.source} {where} ORDER BY {key} LIMIT 1 OFFSET ${len(args)}""",
+            *args,
+        )
+        if record is None:
+            raise IndexError(page_number)
+
+        self._starts[page_number] = start = self._key_of(record)
+        return start
+
+    async def _fetch_pages(self, page_number: int) -> None:
+        where, args = self._where(await self._start_of(page_number))
+        args.append(self.per_page * self.chunk)
+        records = await self.pool.fetch(
+            f"""SELECT {self.select} FROM {self.source} {where} ORDER BY {', '.join(self.key)} LIMIT ${len(args)}""",
+            *args,
+        )
+
+        for offset in range(0, len(records), self.per_page):
+            page = records[offset : offset + self.per_page]
+            self._pages[page_number] = [self.convert(record) for record in page]
+            self._pages.move_to_end(page_number)
+            page_number += 1
+            self._starts[page_number] = self._key_of(page[-1])
+
+        while len(self._pages) > self.window:
+            self._pages.popitem(last=False)
+
+    def cached(self, pages: Iterable[int]) -> list[T]:
+        """
+        Get the entries of pages which are in memory, without fetching anything.
+
+        Parameters
+        ----------
+        pages : Iterable[int]
+            The page numbers
+
+        Returns
+        -------
+        list[T]
+            The entries of the pages which are in memory, in order
+
+        """
+        return [entry for page in pages for entry in self._pages.get(page, [])]
+
+    async def refresh(self, page_number: int) -> None:
+        """
+        Forget everything from `page_number` onwards after rows were added or removed there.
+
+        Parameters
+        ----------
+        page_number : int
+            The first page which changed
+
+        """
+        self._pages.clear()
+        self._starts = {page: start for page, start in self._starts.items() if page <= page_number}
+        self._count = await self._fetch_count(cached=False)
+
+    @classmethod
+    def invalidate(cls, table: str) -> None:
+        """
+        Forget the cached counts of every query reading from a table, after rows were written to it.
+
+        Parameters
+        ----------
+        table : str
+            The name of the table
+
+        """
+        mentions = re.compile(rf'\b{re.escape(table)}\b', re.IGNORECASE)
+        for key in [key for key in cls._counts if mentions.search(key[0])]:
+            cls._counts.pop(key, None)
+
+    async def prepare(self) -> None:
+        self._count = await self._fetch_count()
+
+    def is_paginating(self) -> bool:
+        return self._count > self.per_page
+
+    def get_max_pages(self) -> int:
+        return max(math.ceil(self._count / self.per_page), 1)
+
+    async def get_page(self, page_number: int) -> Any:  # ruff: ignore[any-type]
+        if page_number not in self._pages:
+            await self._fetch_pages(page_number)
+        else:
+            self._pages.move_to_end(page_number)
+
+        entries = self._pages.get(page_number)
+        if not entries:
+            raise IndexError(page_number)
+        return entries[0] if self.per_page == 1 else entries
+
+
 class Paginator(BaseView):
     # This Source Code Form is subject to the terms of the Mozilla Public
     # License, v. 2.0. If a copy of the MPL was not distributed with this
@@ -74,6 +292,8 @@ class Paginator(BaseView):
     async def _get_kwargs_from_page(self, page: int) -> dict[str, Any]:
         value: str | discord.Embed | Any = await discord.utils.maybe_coroutine(self.source.format_page, self, page)  # pyright: ignore[reportUnknownMemberType]
 
+        if isinstance(value, dict):
+            return value
         if isinstance(value, str):
             return {'content': value, 'embed': None}
         if isinstance(value, discord.Embed):
@@ -81,7 +301,23 @@ class Paginator(BaseView):
         return {}
 
     async def show_page(self, interaction: discord.Interaction, page_number: int) -> None:
-        page: Any = await self.source.get_page(page_number)  # pyright: ignore[reportUnknownMemberType]
+        try:
+            page: Any = await self.source.get_page(page_number)  # pyright: ignore[reportUnknownMemberType]
+        except IndexError:
+            source: menus.PageSource = self.source
+            if not isinstance(source, QueryPageSource):
+                raise
+            # Rows were removed since they were counted, so the page asked for may not exist anymore
+            await source.refresh(0)
+            if not source.count:
+                self.stop()
+                if not interaction.response.is_done():
+                    await interaction.response.edit_message(content='There is nothing left to show.', embed=None, view=None)
+                elif self.message:
+                    await self.message.edit(content='There is nothing left to show.', embed=None, view=None)
+                return
+            page_number = min(page_number, source.get_max_pages() - 1)
+            page = await self.source.get_page(page_number)  # pyright: ignore[reportUnknownMemberType]
 
         self.current_page = page_number
         kwargs = await self._get_kwargs_from_page(page)
@@ -145,6 +381,9 @@ class Paginator(BaseView):
         self._update_labels(0)
 
         if message is None:
+            if 'attachments' in kwargs:
+                # Messages are sent with files but edited with attachments
+                kwargs['files'] = kwargs.pop('attachments')
             self.message = await self.ctx.send(**kwargs, view=self, ephemeral=ephemeral)
             return
 
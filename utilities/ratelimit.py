@@ -0,0 +1,61 @@
+from __future__ import annotations
+
+import asyncio
+import time
+
+__all__ = ('TokenBucket',)
+
+
+class TokenBucket:
+    """
+    A token bucket holding at most `capacity` tokens, refilled at `rate` tokens a second.
+
+    Background work can ask to leave a reserve of tokens untouched, so it only ever uses the part of
+    the budget which interactive requests are not using.
+    """
+
+    def __init__(self, rate: float, capacity: int) -> None:
+        self.rate = rate
+        self.capacity = capacity
+
+        self._tokens = float(capacity)
+        self._updated = time.monotonic()
+
+        super().__init__()
+
+    @property
+    def tokens(self) -> float:
+        """
+        The tokens currently in the bucket.
+
+        Returns
+        -------
+        float
+            The number of tokens
+
+        """
+        self._refill()
+        return self._tokens
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self._tokens = min(self._tokens + (now - self._updated) * self.rate, self.capacity)
+        self._updated = now
+
+    async def acquire(self, *, reserve: float = 0) -> None:
+        """
+        Take a token, waiting until one is available.
+
+        Parameters
+        ----------
+        reserve : float, optional
+            Tokens which have to be left in the bucket, by default 0
+
+        """
+        needed = 1 + min(reserve, self.capacity - 1)
+        while True:
+            self._refill()
+            if self._tokens >= needed:
+                self._tokens -= 1
+                return
+            await asyncio.sleep((needed - self._tokens) / self.rate)
@@ -0,0 +1,131 @@
+from __future__ import annotations
+
+import math
+import time
+
+__all__ = (
+    'RingBuffer',
+    'RingCounter',
+)
+
+
+class RingCounter:
+    """
+    Counts events over a sliding window of `size` buckets, each `resolution` seconds wide.
+
+    The buckets live in a fixed-size ring and are reset lazily when the ring comes back around to
+    them, so counting is O(1) and the memory used never grows.
+    """
+
+    __slots__ = ('_counts', '_epochs', 'resolution', 'size')
+
+    def __init__(self, size: int, resolution: float) -> None:
+        self.size = size
+        self.resolution = resolution
+
+        self._counts = [0] * size
+        # The bucket number each slot currently holds, a slot from a previous lap is stale
+        self._epochs = [-1] * size
+
+        super().__init__()
+
+    def _slot(self, now: float) -> int:
+        epoch = int(now // self.resolution)
+        slot = epoch % self.size
+        if self._epochs[slot] != epoch:
+            self._epochs[slot] = epoch
+            self._counts[slot] = 0
+        return slot
+
+    def add(self, amount: int = 1, *, now: float | None = None) -> None:
+        """
+        Count events.
+
+        Parameters
+        ----------
+        amount : int, optional
+            The number of events, by default 1
+        now : float | None, optional
+            The monotonic time of the events, by default now
+
+        """
+        self._counts[self._slot(time.monotonic() if now is None else now)] += amount
+
+    def total(self, window: float | None = None, *, now: float | None = None) -> int:
+        """
+        Count the events within a window.
+
+        Parameters
+        ----------
+        window : float | None, optional
+            The number of seconds to look back, by default the whole ring
+        now : float | None, optional
+            The monotonic time the window ends at, by default now
+
+        Returns
+        -------
+        int
+            The number of events
+
+        """
+        current = int((time.monotonic() if now is None else now) // self.resolution)
+        buckets = self.size if window is None else min(math.ceil(window / self.resolution), self.size)
+        oldest = current - buckets + 1
+        return sum(count for count, epoch in zip(self._counts, self._epochs, strict=True) if oldest <= epoch <= current)
+
+
+class RingBuffer:
+    """
+    Keeps the last `size` values in a fixed-size ring, overwriting the oldest once it is full.
+
+    Appending is O(1) and the memory used never grows.
+    """
+
+    __slots__ = ('_length', '_start', '_values', 'size')
+
+    def __init__(self, size: int) -> None:
+        self.size = size
+
+        self._values = [0.0] * size
+        self._start = 0
+        self._length = 0
+
+        super().__init__()
+
+    def __len__(self) -> int:
+        return self._length
+
+    def append(self, value: float) -> None:
+        """
+        Add a value, dropping the oldest one if the ring is full.
+
+        Parameters
+        ----------
+        value : float
+            The value
+
+        """
+        self._values[(self._start + self._length) % self.size] = value
+        if self._length < self.size:
+            self._length += 1
+        else:
+            self._start = (self._start + 1) % self.size
+
+    def values(self, count: int | None = None) -> list[float]:
+        """
+        Return the latest values.
+
+        Parameters
+        ----------
+        count : int | None, optional
+            The number of values, by default all of them
+
+        Returns
+        -------
+        list[float]
+            The values, oldest first
+
+        """
+        count = self._length if count is None else min(count, self._length)
+        first = self._start + self._length - count
+        return [self._values[index % self.size] for index in range(first, first + count)]
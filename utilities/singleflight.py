@@ -0,0 +1,93 @@
+from __future__ import annotations
+
+import asyncio
+from collections import Counter
+from typing import TYPE_CHECKING, Any
+
+if TYPE_CHECKING:
+    from collections.abc import Callable, Coroutine, Hashable
+
+
+__all__ = ('SingleFlight',)
+
+
+class SingleFlight:
+    """
+    Coalesce identical concurrent calls into a single call.
+
+    Calls are identified by a key whose first element is the namespace used for the counters.
+    While a call is in flight, every other call with the same key waits for and shares its result
+    instead of being made again.
+    """
+
+    def __init__(self) -> None:
+        self._flights: dict[tuple[Hashable, ...], asyncio.Task[Any]] = {}
+
+        self.calls: Counter[str] = Counter()
+        self.deduplicated: Counter[str] = Counter()
+
+        super().__init__()
+
+    async def do[T](
+        self,
+        key: tuple[Hashable, ...],
+        func: Callable[[], Coroutine[Any, Any, T]],
+        *,
+        force: bool = False,
+    ) -> T:
+        """
+        Run a call, or join the identical call already in flight.
+
+        The call runs in its own task so cancelling one of the callers does not cancel it for the rest.
+        A forced call always starts anew and takes the place of the call in flight, so callers that
+        come after it join it instead.
+
+        Parameters
+        ----------
+        key : tuple[Hashable, ...]
+            The identity of the call. The first element is used as the namespace for the counters.
+        func : Callable[[], Coroutine[Any, Any, T]]
+            The function making the call
+        force : bool
+            Whether to start a new call even if one is in flight, for callers that must see
+            state written after that call started
+
+        Returns
+        -------
+        T
+            The result of the call
+
+        """
+        namespace = str(key[0])
+        self.calls[namespace] += 1
+
+        flight: asyncio.Task[T] | None = self._flights.get(key)
+        if flight is not None and not force:
+            self.deduplicated[namespace] += 1
+        else:
+            flight = asyncio.create_task(func())
+            self._flights[key] = flight
+            flight.add_done_callback(lambda t: self._done(key, t))
+
+        return await asyncio.shield(flight)
+
+    def _done(self, key: tuple[Hashable, ...], task: asyncio.Task[Any]) -> None:
+        if self._flights.get(key) is task:
+            del self._flights[key]
+
+        if not task.cancelled():
+            # Retrieve it so the loop does not complain when every caller has gone away
+            task.exception()
+
+    @property
+    def in_flight(self) -> int:
+        """
+        The amount of calls currently in flight.
+
+        Returns
+        -------
+        int
+            The amount of calls in flight
+
+        """
+        return len(self._flights)
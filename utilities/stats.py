@@ -0,0 +1,150 @@
+from __future__ import annotations
+
+from collections import Counter
+from typing import TYPE_CHECKING
+
+import discord
+
+if TYPE_CHECKING:
+    from collections.abc import Iterable
+
+
+__all__ = ('BotStats',)
+
+TEXT_CHANNEL_TYPES = frozenset({discord.ChannelType.text, discord.ChannelType.news})
+VOICE_CHANNEL_TYPES = frozenset({discord.ChannelType.voice, discord.ChannelType.stage_voice})
+
+
+class BotStats:
+    """
+    Counts of the bot's guilds, channels and users, kept up to date from gateway events.
+
+    Every user is counted once no matter how many guilds they share with the bot, by keeping the
+    number of guilds each of them is in. Guilds are only counted while they are available, and the
+    IDs of counted guilds are kept so adding or removing one twice does nothing. Reading any count
+    is O(1), only `recount` walks the cache.
+    """
+
+    def __init__(self) -> None:  # pyright: ignore[reportMissingSuperCall]
+        self.text_channels = 0
+        self.voice_channels = 0
+        self.channels = 0
+
+        self._guild_ids: set[int] = set()
+        self._memberships: Counter[int] = Counter()
+        self._bots: set[int] = set()
+
+    @property
+    def guilds(self) -> int:
+        """
+        The number of available guilds the bot is in.
+
+        Returns
+        -------
+        int
+            The number of guilds
+
+        """
+        return len(self._guild_ids)
+
+    @property
+    def users(self) -> int:
+        """
+        The number of unique users in the bot's guilds.
+
+        Returns
+        -------
+        int
+            The number of users
+
+        """
+        return len(self._memberships)
+
+    @property
+    def bot_users(self) -> int:
+        """
+        The number of unique bots in the bot's guilds.
+
+        Returns
+        -------
+        int
+            The number of bots
+
+        """
+        return len(self._bots)
+
+    def _count_channel(self, channel: discord.abc.GuildChannel, amount: int) -> None:
+        self.channels += amount
+        if channel.type in TEXT_CHANNEL_TYPES:
+            self.text_channels += amount
+        elif channel.type in VOICE_CHANNEL_TYPES:
+            self.voice_channels += amount
+
+    def _add_member(self, user: discord.abc.User) -> None:
+        self._memberships[user.id] += 1
+        if user.bot:
+            self._bots.add(user.id)
+
+    def _remove_member(self, user: discord.abc.User) -> None:
+        count = self._memberships.get(user.id)
+        if count is None:
+            return
+        if count > 1:
+            self._memberships[user.id] = count - 1
+        else:
+            del self._memberships[user.id]
+            self._bots.discard(user.id)
+
+    # Events of guilds which are not counted are dropped, the guild's counts are added with it
+
+    def add_channel(self, channel: discord.abc.GuildChannel) -> None:
+        if channel.guild.id in self._guild_ids:
+            self._count_channel(channel, 1)
+
+    def remove_channel(self, channel: discord.abc.GuildChannel) -> None:
+        if channel.guild.id in self._guild_ids:
+            self._count_channel(channel, -1)
+
+    def add_member(self, member: discord.Member) -> None:
+        if member.guild.id in self._guild_ids:
+            self._add_member(member)
+
+    def remove_member(self, member: discord.Member) -> None:
+        if member.guild.id in self._guild_ids:
+            self._remove_member(member)
+
+    def add_guild(self, guild: discord.Guild) -> None:
+        # An unavailable guild is a stub without channels or members, it is counted once it is available
+        if guild.unavailable or guild.id in self._guild_ids:
+            return
+        self._guild_ids.add(guild.id)
+        for channel in guild.channels:
+            self._count_channel(channel, 1)
+        for member in guild.members:
+            self._add_member(member)
+
+    def remove_guild(self, guild: discord.Guild) -> None:
+        if guild.id not in self._guild_ids:
+            return
+        self._guild_ids.remove(guild.id)
+        for channel in guild.channels:
+            self._count_channel(channel, -1)
+        for member in guild.members:
+            self._remove_member(member)
+
+    def recount(self, guilds: Iterable[discord.Guild]) -> None:
+        """
+        Count everything again from scratch.
+
+        Parameters
+        ----------
+        guilds : Iterable[discord.Guild]
+            Every guild the bot is in
+
+        """
+        self.text_channels = self.voice_channels = self.channels = 0
+        self._guild_ids.clear()
+        self._memberships.clear()
+        self._bots.clear()
+        for guild in guilds:
+            self.add_guild(guild)
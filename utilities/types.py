@@ -2,17 +2,38 @@ from __future__ import annotations
 
 import enum
 from dataclasses import dataclass
-from typing import TYPE_CHECKING
+from typing import TYPE_CHECKING, Self
+
+import msgspec
 
 if TYPE_CHECKING:
     from datetime import datetime
 
     import discord
+    from asyncpg import Record
 
-__all__ = ('WaifuFavouriteEntry', 'WaifuResult')
+__all__ = ('DanbooruPost', 'DanbooruTag', 'WaifuFavouriteEntry', 'WaifuResult')
 
 
-@dataclass
+# Only the fields we use are declared, everything else in the response is skipped while decoding
+class DanbooruPost(msgspec.Struct, gc=False):
+    id: int
+    rating: str
+    file_url: str | None = None
+    preview_file_url: str | None = None
+    source: str | None = None
+    tag_string_character: str = ''
+    tag_string_copyright: str = ''
+
+
+class DanbooruTag(msgspec.Struct, gc=False):
+    type: str
+    label: str
+    value: str
+    category: int | None = None
+
+
+@dataclass(slots=True)
 class WaifuResult:
     image_id: str | int
     url: str
@@ -20,6 +41,35 @@ class WaifuResult:
     copyright: str
     name: str | None = None
     source: str | None = None
+    rating: str | None = None
+    preview_url: str | None = None
+    stale: bool = False
+
+    @classmethod
+    def from_post(cls, post: DanbooruPost, *, name: str | None = None) -> Self:
+        return cls(
+            name=name,
+            image_id=post.id,
+            url=post.file_url or '',
+            source=post.source,
+            characters=post.tag_string_character,
+            copyright=post.tag_string_copyright,
+            rating=post.rating,
+            preview_url=post.preview_file_url,
+        )
+
+    @classmethod
+    def from_record(cls, record: Record, *, stale: bool = False) -> Self:
+        return cls(
+            image_id=record['id'],
+            url=record['file_url'],
+            source=record['source'],
+            characters=' '.join(record['characters']),
+            copyright=' '.join(record['copyright']),
+            rating=record['rating'],
+            preview_url=record['preview_url'],
+            stale=stale,
+        )
 
     def parse_string_lists(self, lists: str) -> list[str]:
         objs = lists.split(' ')
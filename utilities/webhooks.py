@@ -0,0 +1,214 @@
+from __future__ import annotations
+
+import asyncio
+import contextlib
+import json
+import logging
+from collections import Counter, deque
+from typing import TYPE_CHECKING
+
+import aiohttp
+import discord
+
+from utilities.embed import MESSAGE_EMBED_LIMIT, batch_embeds, fit_embed
+
+if TYPE_CHECKING:
+    from utilities.bases.bot import Cyrene
+
+
+__all__ = ('WebhookDelivery',)
+
+log = logging.getLogger(__name__)
+
+WEBHOOK_QUEUE_SIZE = 100
+INITIAL_BACKOFF = 1.0
+MAX_BACKOFF = 300.0
+
+
+class WebhookDelivery:
+    """
+    Delivers log embeds to the bot's webhooks in the background.
+
+    Every log type has its own queue and worker, which packs as many embeds into each message as
+    fit in 10 embeds and 6000 characters. A rate limit or outage only holds up the worker: it waits
+    out the `Retry-After` of a 429, or backs off exponentially on server and connection errors, and
+    retries the same batch.
+
+    Once a queue is full, embeds for that log type are spilled to the WebhookSpill table until the
+    worker catches up, so nothing piles up in memory and nothing is lost across restarts. Spilled
+    embeds are delivered after the queue, in the order they were spilled.
+    """
+
+    def __init__(self, bot: Cyrene) -> None:
+        self.bot = bot
+
+        self._queues: dict[str, deque[discord.Embed]] = {}
+        self._wakeups: dict[str, asyncio.Event] = {}
+        self._workers: dict[str, asyncio.Task[None]] = {}
+        # Log types with embeds in the table, new embeds for them are spilled too so they stay in order
+        self._spilling: set[str] = set()
+        self._spill_buffer: list[tuple[str, str]] = []
+        self._spill_task: asyncio.Task[None] | None = None
+        self._closed = False
+
+        self.sent: Counter[str] = Counter()
+        self.spilled: Counter[str] = Counter()
+
+        super().__init__()
+
+    async def start(self) -> None:
+        """Start delivering the embeds spilled before the last shutdown."""
+        records = await self.bot.pool.fetch("""SELECT DISTINCT log_type FROM WebhookSpill""")
+        for record in records:
+            self._spilling.add(record['log_type'])
+            self._wake(record['log_type'])
+
+    def send(self, log_type: str, embed: discord.Embed) -> None:
+        """
+        Queue an embed for a webhook without waiting for it to be sent.
+
+        Parameters
+        ----------
+        log_type : str
+            The log type of the webhook, as in `Cyrene.webhooks`
+        embed : discord.Embed
+            The embed
+
+        """
+        if self._closed:
+            # The pool may already be closed, so it cannot be spilled either
+            log.warning('Dropped a %s webhook embed sent after delivery stopped', log_type)
+            return
+
+        # An embed too large for a message on its own would get its whole batch rejected
+        embed = fit_embed(embed)
+        queue = self._queues.setdefault(log_type, deque())
+        if log_type in self._spilling or len(queue) >= WEBHOOK_QUEUE_SIZE:
+            self._spill(log_type, [embed])
+        else:
+            queue.append(embed)
+        self._wake(log_type)
+
+    def _wake(self, log_type: str) -> None:
+        if self._closed:
+            return
+        self._wakeups.setdefault(log_type, asyncio.Event()).set()
+        worker = self._workers.get(log_type)
+        if worker is None or worker.done():
+            self._workers[log_type] = asyncio.create_task(self._deliver(log_type))
+
+    def _spill(self, log_type: str, embeds: list[discord.Embed]) -> None:
+        self._spilling.add(log_type)
+        self._spill_buffer.extend((log_type, json.dumps(embed.to_dict())) for embed in embeds)
+        self.spilled[log_type] += len(embeds)
+        if self._spill_task is None or self._spill_task.done():
+            self._spill_task = asyncio.create_task(self._flush_spill())
+
+    async def _flush_spill(self) -> None:
+        while self._spill_buffer:
+            rows, self._spill_buffer = self._spill_buffer, []
+            try:
+                await self.bot.pool.executemany(
+                    """INSERT INTO WebhookSpill (log_type, embed) VALUES ($1, $2::JSONB)""",
+                    rows,
+                )
+            except Exception:
+                log.exception('Failed to spill %s webhook embeds, they are lost', len(rows))
+                continue
+
+            # A worker may have found the table empty before these made it in
+            for log_type in {log_type for log_type, _ in rows}:
+                self._wake(log_type)
+
+    async def _next_batch(self, log_type: str) -> tuple[list[discord.Embed], list[int]]:
+        queue = self._queues.setdefault(log_type, deque())
+        if queue:
+            return next(batch_embeds(queue)), []
+        if log_type not in self._spilling:
+            return [], []
+
+        records = await self.bot.pool.fetch(
+            """SELECT id, embed FROM WebhookSpill WHERE log_type = $1 ORDER BY id LIMIT $2""",
+            log_type,
+            MESSAGE_EMBED_LIMIT,
+        )
+        if not records and not any(spilled_type == log_type for spilled_type, _ in self._spill_buffer):
+            self._spilling.discard(log_type)
+        embeds = next(
+            batch_embeds(fit_embed(discord.Embed.from_dict(json.loads(record['embed']))) for record in records), []
+        )
+        # Only the rows which fit in this message are deleted once it is sent
+        return embeds, [record['id'] for record in records[: len(embeds)]]
+
+    async def _done(self, log_type: str, embeds: list[discord.Embed], spilled_ids: list[int]) -> None:
+        if spilled_ids:
+            await self.bot.pool.execute("""DELETE FROM WebhookSpill WHERE id = ANY($1::BIGINT[])""", spilled_ids)
+        else:
+            queue = self._queues[log_type]
+            for _ in embeds:
+                queue.popleft()
+
+    async def _deliver(self, log_type: str) -> None:
+        wakeup = self._wakeups.setdefault(log_type, asyncio.Event())
+        backoff = INITIAL_BACKOFF
+
+        while True:
+            try:
+                backoff = await self._deliver_batch(log_type, wakeup, backoff)
+            except Exception:
+                # Reading or deleting spilled rows failed, the worker has to outlive that or its log type stalls
+                delay, backoff = backoff, min(backoff * 2, MAX_BACKOFF)
+                log.exception('Delivery to the %s webhook failed, retrying in %.1f seconds', log_type, delay)
+                await asyncio.sleep(delay)
+
+    async def _deliver_batch(self, log_type: str, wakeup: asyncio.Event, backoff: float) -> float:
+        wakeup.clear()
+        embeds, spilled_ids = await self._next_batch(log_type)
+        if not embeds:
+            await wakeup.wait()
+            return backoff
+
+        webhook = self.bot.webhooks.get(log_type)
+        if webhook is None:
+            log.warning('No webhook for %s, dropped %s embeds', log_type, len(embeds))
+            await self._done(log_type, embeds, spilled_ids)
+            return backoff
+
+        try:
+            await webhook.send(embeds=embeds)
+        except discord.HTTPException as error:
+            if error.status == 429:
+                # discord.py retries rate limits itself, this is only reached once it gives up
+                delay = float(error.response.headers.get('Retry-After', backoff))
+            elif error.status >= 500:
+                delay, backoff = backoff, min(backoff * 2, MAX_BACKOFF)
+            else:
+                # The request itself is bad, retrying it would not help
+                log.exception('Dropped %s embeds which %s rejected', len(embeds), log_type, exc_info=error)
+                await self._done(log_type, embeds, spilled_ids)
+                return backoff
+        except (aiohttp.ClientError, TimeoutError):
+            delay, backoff = backoff, min(backoff * 2, MAX_BACKOFF)
+        else:
+            await self._done(log_type, embeds, spilled_ids)
+            self.sent[log_type] += len(embeds)
+            return INITIAL_BACKOFF
+
+        log.warning('Delivery to the %s webhook failed, retrying in %.1f seconds', log_type, delay)
+        await asyncio.sleep(delay)
+        return backoff
+
+    async def close(self) -> None:
+        """Stop delivering and spill whatever is still queued, so it is delivered after a restart."""
+        self._closed = True
+        for worker in self._workers.values():
+            worker.cancel()
+
+        for log_type, queue in self._queues.items():
+            if queue:
+                self._spill(log_type, list(queue))
+                queue.clear()
+
+        if self._spill_task is not None:
+            with contextlib.suppress(Exception):
+                await self._spill_task